@@ -1,5 +1,16 @@
-from django.contrib import admin
+import io
+import zlib
+
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.contrib.admin.views.main import ChangeList
 from django.db import models
+from django.db.models import OuterRef, Subquery
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 import datetime
 from django.utils import timezone
@@ -18,7 +29,23 @@ from .models import (
     AppTrackerChange,
     AppUserProfile,
     AppUserSubscription,
+    AppProductOffer,
+    AppSiteFeed,
+    AppTrackerProfile,
+)
+from .constants import PROFILE_NEXT_RUNS, TRACKER_STALE_RUNS
+from .utils.categories import category_subtree
+from .utils.bulk import (
+    export_trackers,
+    import_trackers,
+    read_trackers,
+    set_trackers_active,
 )
+from .utils.breaker import CLOSED, get_breaker_state, get_breakers, record_success
+from .utils.profiling import profile_next_runs
+from .utils.health import get_health
+from .utils.stats import STAGES, get_many_run_percentiles, get_run_percentiles
+from .utils.tracker import get_auto_methods
 
 
 # class AppItemAdmin(admin.ModelAdmin):
@@ -27,9 +54,264 @@ from .models import (
 #     }
 
 
+class CategorySubtreeFilter(admin.SimpleListFilter):
+    """Filter by a category including all its subcategories"""
+
+    title = "category"
+    parameter_name = "category"
+    field = "category"
+
+    def lookups(self, request, model_admin):
+        return [(c.id, c.name) for c in AppCategory.objects.order_by("name")]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(
+                **{f"{self.field}__in": category_subtree(self.value())}
+            )
+
+
+class TrackerCategoryFilter(CategorySubtreeFilter):
+    field = "product__category"
+
+
+class TrackerChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # Run stats of the whole page in one Redis round trip, not one per row
+        try:
+            rollups = get_many_run_percentiles([t.id for t in self.result_list])
+        except Exception as e:
+            print(type(e).__name__, "reading the tracker run stats")
+            rollups = {}
+        auto_methods = get_auto_methods(
+            [t.id for t in self.result_list if t.method == "auto"]
+        )
+        for tracker in self.result_list:
+            tracker._run_percentiles = rollups.get(tracker.id, {})
+            tracker._auto_method = auto_methods.get(tracker.id)
+
+
+class SiteChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # Circuit breakers of the whole page in one Redis round trip
+        try:
+            breakers = get_breakers([s.id for s in self.result_list])
+        except Exception as e:
+            print(type(e).__name__, "reading the circuit breakers")
+            breakers = {}
+        for site in self.result_list:
+            site._breaker = breakers.get(site.id)
+
+
 @admin.register(AppTracker)
 class AppTrackerAdmin(admin.ModelAdmin):
-    list_display = ["id", "site", "name", "active", "url_field"]
+    list_display = [
+        "id",
+        "site",
+        "name",
+        "active",
+        "fetch_method",
+        "last_run",
+        "last_change",
+        "error_rate",
+        "run_p50",
+        "run_p95",
+        "slowest_stages",
+        "url_field",
+    ]
+    list_filter = [TrackerCategoryFilter]
+    # AppTracker.__str__ shows the site name
+    list_select_related = ["site"]
+    actions = ["activate", "deactivate", "profile_runs", "export_csv"]
+
+    def get_queryset(self, request):
+        latest = AppTrackerChange.objects.filter(tracker=OuterRef("pk")).order_by("-id")
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(_last_change=Subquery(latest.values("created_at")[:1]))
+        )
+
+    def get_changelist(self, request, **kwargs):
+        return TrackerChangeList
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "product":
+            # AppProduct.__str__ shows the brand name
+            kwargs["queryset"] = AppProduct.objects.select_related("brand")
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_urls(self):
+        return [
+            path(
+                "health/",
+                self.admin_site.admin_view(self.health_view),
+                name="app_apptracker_health",
+            ),
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name="app_apptracker_import",
+            ),
+        ] + super().get_urls()
+
+    def health_view(self, request):
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Tracker health",
+            "stale_runs": TRACKER_STALE_RUNS,
+            **get_health(),
+        }
+        return TemplateResponse(request, "admin/app/apptracker/health.html", context)
+
+    def import_view(self, request):
+        """Create/update trackers from a CSV or JSON file (see import_trackers)"""
+        if not (
+            self.has_add_permission(request) and self.has_change_permission(request)
+        ):
+            raise PermissionDenied
+
+        if request.method == "POST" and request.FILES.get("file"):
+            upload = request.FILES["file"]
+            fmt = "json" if upload.name.endswith(".json") else "csv"
+            site = request.POST.get("site")
+            try:
+                rows = read_trackers(
+                    io.TextIOWrapper(upload, encoding="utf-8", newline=""), fmt
+                )
+                counts = import_trackers(rows, site_id=int(site) if site else None)
+            except ValidationError as e:
+                for message in e.messages:
+                    self.message_user(request, message, messages.ERROR)
+            except ValueError as e:
+                self.message_user(request, f"Invalid file: {e}", messages.ERROR)
+            else:
+                self.message_user(
+                    request,
+                    f"Created {counts['trackers_created']} and updated "
+                    f"{counts['trackers_updated']} trackers: "
+                    f"{counts['schedules_created']} schedules created, "
+                    f"{counts['schedules_deleted']} deleted",
+                    messages.SUCCESS,
+                )
+                return redirect("admin:app_apptracker_changelist")
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Import trackers",
+            "sites": AppSite.objects.order_by("name"),
+        }
+        return TemplateResponse(request, "admin/app/apptracker/import.html", context)
+
+    def set_active(self, request, queryset, active):
+        # Bulk update and schedule sync, no create_task signal per tracker
+        counts = set_trackers_active(queryset, active)
+        self.message_user(
+            request,
+            f"{'Activated' if active else 'Deactivated'} {counts['trackers']} "
+            f"trackers: {counts['created']} schedules created, "
+            f"{counts['deleted']} deleted",
+            messages.SUCCESS,
+        )
+
+    def activate(self, request, queryset):
+        self.set_active(request, queryset, True)
+
+    activate.short_description = "Activate selected trackers"
+
+    def deactivate(self, request, queryset):
+        self.set_active(request, queryset, False)
+
+    deactivate.short_description = "Deactivate selected trackers"
+
+    def profile_runs(self, request, queryset):
+        for tracker in queryset:
+            profile_next_runs(tracker.id, PROFILE_NEXT_RUNS)
+        self.message_user(
+            request,
+            f"The next {PROFILE_NEXT_RUNS} runs of {queryset.count()} trackers "
+            "will be profiled",
+            messages.SUCCESS,
+        )
+
+    profile_runs.short_description = "Profile the next runs"
+
+    def export_csv(self, request, queryset):
+        # Same file as the export_trackers command, import it back to update
+        response = HttpResponse(content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="trackers.csv"'
+        export_trackers(queryset, response)
+        return response
+
+    export_csv.short_description = "Export selected trackers (CSV)"
+
+    def get_run_percentiles(self, obj):
+        # Once per row, several columns use it
+        if not hasattr(obj, "_run_percentiles"):
+            try:
+                obj._run_percentiles = get_run_percentiles(obj.id)
+            except Exception:
+                obj._run_percentiles = {}
+        return obj._run_percentiles
+
+    def last_run(self, obj):
+        last_run = self.get_run_percentiles(obj).get("last_run")
+        if last_run is None:
+            return "-"
+        return datetime.datetime.fromtimestamp(last_run, timezone.utc)
+
+    last_run.short_description = "last run"
+
+    def last_change(self, obj):
+        return obj._last_change
+
+    last_change.admin_order_field = "_last_change"
+    last_change.short_description = "last change"
+
+    # Of the recorded runs
+    def error_rate(self, obj):
+        rollup = self.get_run_percentiles(obj)
+        if not rollup.get("runs"):
+            return "-"
+        return f"{rollup['errors'] / rollup['runs']:.0%}"
+
+    error_rate.short_description = "error rate"
+
+    def run_p50(self, obj):
+        total = self.get_run_percentiles(obj).get("total")
+        return f"{total[0]:.2f}s" if total else "-"
+
+    run_p50.short_description = "run p50"
+
+    def run_p95(self, obj):
+        total = self.get_run_percentiles(obj).get("total")
+        return f"{total[1]:.2f}s" if total else "-"
+
+    run_p95.short_description = "run p95"
+
+    # p95 of the stages that take the most time
+    def slowest_stages(self, obj):
+        rollup = self.get_run_percentiles(obj)
+        stages = sorted(
+            ((rollup[name][1], name) for name in STAGES if name in rollup),
+            reverse=True,
+        )
+        slowest = [f"{name} {p95 * 1000:.0f}ms" for p95, name in stages[:3]]
+        return ", ".join(slowest) or "-"
+
+    slowest_stages.short_description = "slowest stages (p95)"
+
+    # Path the "auto" trackers currently use
+    def fetch_method(self, obj):
+        if obj.method == "auto":
+            return f"auto ({obj._auto_method})"
+        return obj.method
+
+    fetch_method.short_description = "method"
 
     # Add url in list
     @mark_safe
@@ -48,11 +330,126 @@ class AppTrackerAdmin(admin.ModelAdmin):
     save_as = True
 
 
-admin.site.register(AppSite)
-admin.site.register(AppProduct)
+@admin.register(AppProduct)
+class AppProductAdmin(admin.ModelAdmin):
+    list_display = ["id", "brand", "name", "category", "best_price"]
+    list_select_related = ["brand", "category"]
+    list_filter = [CategorySubtreeFilter]
+
+    def get_queryset(self, request):
+        # Cheapest priced offer that is not known to be out of stock
+        best = (
+            AppProductOffer.objects.filter(product=OuterRef("pk"), price__isnull=False)
+            .exclude(available=False)
+            .order_by("price")
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(_best_price=Subquery(best.values("price")[:1]))
+        )
+
+    def best_price(self, obj):
+        return obj._best_price
+
+    best_price.admin_order_field = "_best_price"
+
+
+@admin.register(AppTrackerProfile)
+class AppTrackerProfileAdmin(admin.ModelAdmin):
+    list_display = ["id", "tracker", "profiler", "duration", "error", "created_at"]
+    list_filter = ["profiler"]
+    list_select_related = ["tracker"]
+    readonly_fields = [
+        "tracker",
+        "profiler",
+        "duration",
+        "error",
+        "created_at",
+        "download",
+        "summary_text",
+    ]
+    exclude = ["summary", "data"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:profile_id>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="app_apptrackerprofile_download",
+            )
+        ] + super().get_urls()
+
+    def download_view(self, request, profile_id):
+        profile = get_object_or_404(AppTrackerProfile, id=profile_id)
+        # .prof opens with pstats/snakeviz, .folded with speedscope/flamegraph.pl
+        extension = "prof" if profile.profiler == "cprofile" else "folded"
+        response = HttpResponse(
+            zlib.decompress(profile.data), content_type="application/octet-stream"
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="tracker-{profile.tracker_id}-{profile.id}'
+            f'.{extension}"'
+        )
+        return response
+
+    def download(self, obj):
+        url = reverse("admin:app_apptrackerprofile_download", args=[obj.id])
+        return format_html('<a href="{}">Download</a>', url)
+
+    def summary_text(self, obj):
+        return format_html("<pre>{}</pre>", obj.summary)
+
+    summary_text.short_description = "summary"
+
+
+class AppSiteFeedInline(admin.TabularInline):
+    model = AppSiteFeed
+    extra = 0
+    formfield_overrides = {
+        models.JSONField: {"widget": JSONEditorWidget},
+    }
+
+
+@admin.register(AppSite)
+class AppSiteAdmin(admin.ModelAdmin):
+    list_display = ["id", "name", "url", "circuit"]
+    inlines = [AppSiteFeedInline]
+    actions = ["reset_circuit"]
+
+    def get_changelist(self, request, **kwargs):
+        return SiteChangeList
+
+    def circuit(self, obj):
+        breaker = obj._breaker
+        if breaker is None:
+            return "unknown"
+        state = get_breaker_state(breaker)
+        if state != CLOSED:
+            return f"{state} ({breaker['failures']} failures)"
+        return state
+
+    def reset_circuit(self, request, queryset):
+        for site in queryset:
+            record_success(site.id)
+
+    reset_circuit.short_description = "Close the circuit breaker"
+
+
+@admin.register(AppTrackerChange)
+class AppTrackerChangeAdmin(admin.ModelAdmin):
+    list_display = ["id", "tracker", "item_desc", "price", "available", "created_at"]
+    # AppTrackerChange.__str__ and AppTracker.__str__ show the site name
+    list_select_related = ["tracker__site"]
+    # A select would list every tracker
+    raw_id_fields = ["tracker"]
+
+
 admin.site.register(AppBrand)
 admin.site.register(AppCategory)
-admin.site.register(AppTrackerChange)
 admin.site.register(AppUserProfile)
 admin.site.register(AppUserSubscription)
 admin.site.unregister([q_models.Failure])
@@ -0,0 +1,127 @@
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "pages")
+
+# ~200 bytes of markup repeated to reach the requested page size
+FILLER = (
+    '    <div class="card"><a href="/p/{i}"><img src="/img/{i}.jpg" alt=""></a>'
+    '<h3 class="card-title">Accessory {i}</h3><p class="card-price">$ {i}.95</p>'
+    "</div>\n"
+)
+
+
+def load_page(name):
+    with open(os.path.join(PAGES_DIR, f"{name}.html")) as f:
+        return Template(f.read())
+
+
+def get_filler(size):
+    count = max(0, size // len(FILLER.format(i=100)))
+    return "".join(FILLER.format(i=i) for i in range(count))
+
+
+class FixtureServer(object):
+    """Local HTTP server for tracker benchmarks.
+
+    Serves product (/product/<n>), listing (/listing/<n>) and change
+    (/change/<n>) pages padded to `size` bytes after `latency` seconds
+    (+/- `jitter`).
+
+    Every page changes once every `change_every` fetches (0 never): a new
+    price and stock, a new newest listing item or a new release.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, size=50000, change_every=2):
+        self.latency = latency
+        self.jitter = jitter
+        self.change_every = change_every
+        self.filler = get_filler(size)
+        self.templates = {
+            name: load_page(name) for name in ("product", "listing", "change")
+        }
+        self.lock = threading.Lock()
+        self.fetches = {}
+        self.bytes_sent = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.get_handler())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def get_version(self, path):
+        with self.lock:
+            fetch = self.fetches.get(path, 0)
+            self.fetches[path] = fetch + 1
+        return fetch // self.change_every if self.change_every else 0
+
+    def render(self, kind, n, version):
+        if kind == "product":
+            return self.templates[kind].substitute(
+                n=n,
+                price=f"{1000 + n + version % 7 * 10}.00",
+                stock="In stock" if version % 3 else "",
+                filler=self.filler,
+            )
+        if kind == "listing":
+            # Newest first, a new item on top of each version
+            newest = n * 1000 + version
+            items = "".join(
+                f'    <li class="result"><a class="title" href="/item/{i}">'
+                f'Vespa PX 150 #{i}</a><span class="location">Sydney</span></li>\n'
+                for i in range(newest, newest - 20, -1)
+            )
+            return self.templates[kind].substitute(items=items, filler=self.filler)
+        notes = "".join(
+            f"      <li>Change {version}.{i}</li>\n" for i in range(version % 5 + 3)
+        )
+        return self.templates[kind].substitute(
+            version=f"{n}.{version}", notes=notes, filler=self.filler
+        )
+
+    def get_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_body(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                match = re.match(r"^/(product|listing|change)/(\d+)", self.path)
+                if not match:
+                    return self.send_body(404, b"Not found")
+
+                delay = server.latency + random.uniform(-server.jitter, server.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+
+                kind, n = match.group(1), int(match.group(2))
+                body = server.render(kind, n, server.get_version(self.path))
+                body = body.encode()
+                with server.lock:
+                    server.bytes_sent += len(body)
+                self.send_body(200, body)
+
+        return Handler
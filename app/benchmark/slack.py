@@ -0,0 +1,115 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SLACK_PATH = "/slack"
+
+
+class SlackStandIn(object):
+    """Local Slack incoming webhook for benchmarks.
+
+    Answers like Slack ("ok", "rate_limited" with Retry-After, server
+    errors) after `latency` seconds (+/- `jitter`). Above `rate_limit`
+    messages per second (0: unlimited, token bucket with a burst of as many)
+    messages get a 429; `error_rate` of them get a 500.
+
+    Accepted messages are kept with their time.time() arrival.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit=0, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.reset()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.get_handler())
+        self.httpd.daemon_threads = True
+        self.httpd.request_queue_size = 1024
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}{SLACK_PATH}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.accepted = []
+            self.statuses = Counter()
+            self.tokens = self.rate_limit
+            self.refilled_at = time.monotonic()
+
+    def take_token(self):
+        if not self.rate_limit:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.rate_limit,
+                self.tokens + (now - self.refilled_at) * self.rate_limit,
+            )
+            self.refilled_at = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def receive(self, payload):
+        """Status and body of the answer to a posted message"""
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if not self.take_token():
+            status, body = 429, b"rate_limited"
+        elif random.random() < self.error_rate:
+            status, body = 500, b"internal_error"
+        elif payload is None:
+            status, body = 400, b"invalid_payload"
+        else:
+            status, body = 200, b"ok"
+
+        with self.lock:
+            self.statuses[status] += 1
+            if status == 200:
+                self.accepted.append((time.time(), payload))
+        return status, body
+
+    def get_handler(self):
+        slack = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path != SLACK_PATH:
+                    status, answer = 404, b"no_service"
+                else:
+                    try:
+                        payload = json.loads(body)
+                    except ValueError:
+                        payload = None
+                    status, answer = slack.receive(payload)
+
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(answer)))
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(answer)
+
+        return Handler
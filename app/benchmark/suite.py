@@ -0,0 +1,315 @@
+import os
+import resource
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.db import close_old_connections, connection
+
+from ..models import (
+    AppBrand,
+    AppCategory,
+    AppProduct,
+    AppSite,
+    AppTracker,
+    AppTrackerChange,
+    AppUserSubscription,
+)
+from ..utils import tracker as checks
+from ..utils.stats import percentile
+
+SLACK_KEYS = (
+    "SLACK_KEY_ALERTS",
+    "SLACK_KEY_VESPA_ALERTS",
+    "SLACK_KEY_LAMBRETTA_ALERTS",
+    "SLACK_KEY_ERROR_ALERTS",
+)
+
+# Benchmarked check: (task, tracker type, fixture page, xpaths)
+CHECKS = {
+    "price": (
+        checks.check_price,
+        "price_and_avail",
+        "product",
+        {"price_xpath": "//span[@class='price']"},
+    ),
+    "availability": (
+        checks.check_availability,
+        "price_and_avail",
+        "product",
+        {"available_xpath": "//span[@class='stock']"},
+    ),
+    "change": (
+        checks.check_change,
+        "change",
+        "change",
+        {"content_xpath": "//article[@id='content']"},
+    ),
+    "new_item": (
+        checks.check_new_item,
+        "new_item",
+        "listing",
+        {
+            "title_xpath": "//ol[@class='results']/li[1]/a[@class='title']",
+            "link_xpath": "//ol[@class='results']/li[1]/a[@class='title']",
+            "location_xpath": "//ol[@class='results']/li[1]/span[@class='location']",
+        },
+    ),
+}
+
+
+def manage_app_tables():
+    """Have the test database creation create every app_* table.
+
+    The app tables are unmanaged (the live schema is not migrated from
+    here), so they are created straight from the models; the settings must
+    disable the app migrations (MIGRATION_MODULES).
+    """
+    for model in apps.get_app_config("app").get_models():
+        if model._meta.db_table.startswith("app_"):
+            model._meta.managed = True
+    # Nullable in the live table, price and new item changes leave it empty
+    AppTrackerChange._meta.get_field("available").null = True
+    # Unbounded numeric in the live table, Django can only round to a bounded one
+    target_price = AppUserSubscription._meta.get_field("target_price")
+    target_price.max_digits, target_price.decimal_places = 20, 2
+
+
+def create_test_database(verbosity=0):
+    """Create a throwaway database with every app_* table (see
+    manage_app_tables)
+
+    Returns:
+        string: The name of the real database, for destroy_test_database
+    """
+    manage_app_tables()
+    return connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False
+    )
+
+
+def destroy_test_database(old_name, verbosity=0):
+    connection.creation.destroy_test_db(old_name, verbosity)
+
+
+def create_trackers(server_url, count, names=tuple(CHECKS)):
+    """count trackers per benchmarked check, all fetching the fixture server
+
+    Returns:
+        list: (check name, AppTracker) pairs
+    """
+    site = AppSite.objects.create(name="Benchmark", url=server_url)
+    brand = AppBrand.objects.create(name="Vespa")
+    category = AppCategory.objects.create(name="Scooters")
+    product = AppProduct.objects.create(category=category, brand=brand, name="GTS")
+
+    # bulk_create: no schedules or tracker events
+    trackers = AppTracker.objects.bulk_create(
+        AppTracker(
+            name=f"{name} {i}",
+            t_type=t_type,
+            method="xpath",
+            search_key="vespa",
+            url=f"{server_url}/{page}/{i}",
+            site=site,
+            product=product,
+            params={"xpaths": [xpaths], "structured_data": False},
+        )
+        for name, (_, t_type, page, xpaths) in CHECKS.items()
+        if name in names
+        for i in range(count)
+    )
+    # bulk_create only sets the ids on PostgreSQL
+    trackers = AppTracker.objects.filter(site=site).order_by("id")
+    return [(t.name.rsplit(" ", 1)[0], t) for t in trackers]
+
+
+def run_check(name, tracker):
+    """Run a check task like a django-q worker would
+
+    Returns:
+        tuple: seconds, queries and the error class (None if it succeeded)
+    """
+    queries = 0
+
+    def count_query(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    error = None
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count_query):
+            CHECKS[name][0](tracker.id)
+    except Exception as e:
+        error = type(e).__name__
+    elapsed = time.perf_counter() - start
+    # django-q closes the connection between tasks (CONN_MAX_AGE)
+    close_old_connections()
+    return elapsed, queries, error
+
+
+def summarize(results, wall=None):
+    # Without the wall time, throughput is per worker (runs per busy second)
+    latencies = [r[0] for r in results]
+    wall = wall or sum(latencies)
+    return {
+        "runs": len(results),
+        "errors": sum(1 for r in results if r[2]),
+        "error_classes": dict(Counter(r[2] for r in results if r[2])),
+        "throughput": len(results) / wall if wall else 0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "queries": sum(r[1] for r in results) / len(results),
+    }
+
+
+def use_slack(slack):
+    # Every alert channel posts to the stand-in
+    for key in SLACK_KEYS:
+        os.environ[key] = slack.url
+
+
+def run_benchmark(server, slack, trackers=10, rounds=5, warmup=1, workers=1):
+    """Run every benchmarked check against the fixture server.
+
+    Each round runs every tracker once on `workers` threads. The warmup
+    rounds (first fetch, first insert) are not measured.
+
+    Args:
+        server (FixtureServer): The started fixture server
+        slack (SlackStandIn): The started Slack stand-in
+        trackers (int): Trackers per check
+        rounds (int): Measured rounds
+        warmup (int): Unmeasured rounds run first
+        workers (int): Concurrent runs, like django-q workers
+
+    Returns:
+        dict: "checks" summaries (runs, errors, throughput, latency
+            percentiles, queries per run) per check and "total", plus
+            "peak_rss_mb", "bytes" served and "slack_messages" received
+    """
+    use_slack(slack)
+    jobs = create_trackers(server.url, trackers)
+    results = {name: [] for name in CHECKS}
+
+    with ThreadPoolExecutor(workers) as pool:
+        for _ in range(warmup):
+            list(pool.map(lambda job: run_check(*job), jobs))
+
+        bytes_sent = server.bytes_sent
+        slack.reset()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for (name, _), result in zip(
+                jobs, pool.map(lambda job: run_check(*job), jobs)
+            ):
+                results[name].append(result)
+        wall = time.perf_counter() - start
+
+    report = {name: summarize(runs) for name, runs in results.items() if runs}
+    report["total"] = summarize(sum(results.values(), []), wall)
+    return {
+        # Check throughputs are per worker, the total is for the whole pool
+        "checks": report,
+        # Includes the fixture server, it runs in the same process
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "bytes": server.bytes_sent - bytes_sent,
+        "slack_messages": len(slack.accepted),
+        "wall": wall,
+    }
+
+
+def run_burst(slack, jobs, workers):
+    """Run every tracker at once, as when a sale changes every page
+
+    Returns:
+        dict: Tracker runs/s, Slack answers by status, failed runs by error,
+            accepted alerts per second and the alert latency percentiles
+            (from the start of the burst to Slack accepting the alert)
+    """
+    slack.reset()
+    started_at = time.time()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        results = list(pool.map(lambda job: run_check(*job), jobs))
+    wall = time.perf_counter() - start
+
+    latencies = [at - started_at for at, _ in slack.accepted]
+    return {
+        "runs": len(results),
+        "wall": wall,
+        "throughput": len(results) / wall,
+        "errors": dict(Counter(r[2] for r in results if r[2])),
+        "slack_statuses": dict(slack.statuses),
+        "alerts": len(latencies),
+        "sends_per_second": len(latencies) / wall,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "max": max(latencies, default=None),
+    }
+
+
+def run_notification_benchmark(server, fast_slack, slack, alerts=500, workers=8):
+    """Burst of new item alerts through the synchronous notification path.
+
+    `alerts` new item trackers each find a new item at the same time. The
+    burst runs once against a fast Slack stand-in (the baseline) and once
+    against `slack`, with its latency and errors.
+
+    Args:
+        server (FixtureServer): The started fixture server, its listings
+            must change on every fetch (change_every=1)
+        fast_slack (SlackStandIn): Stand-in without latency or errors
+        slack (SlackStandIn): Stand-in under test
+        alerts (int): Alerts in the burst
+        workers (int): Concurrent runs, like django-q workers
+
+    Returns:
+        dict: The "baseline" and "loaded" bursts (see run_burst) and the
+            tracker throughput "degradation" (a fraction)
+    """
+    jobs = create_trackers(server.url, alerts, ["new_item"])
+
+    use_slack(fast_slack)
+    # First runs: connections, first item of every tracker
+    run_burst(fast_slack, jobs, workers)
+    baseline = run_burst(fast_slack, jobs, workers)
+
+    use_slack(slack)
+    loaded = run_burst(slack, jobs, workers)
+
+    return {
+        "baseline": baseline,
+        "loaded": loaded,
+        "degradation": 1 - loaded["throughput"] / baseline["throughput"],
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Regressions of a report against a baseline report
+
+    Returns:
+        list[string]: The checks whose p95 latency grew or throughput dropped
+            by more than `tolerance` (a fraction)
+    """
+    regressions = []
+    for name, current in report["checks"].items():
+        previous = baseline["checks"].get(name)
+        if not previous:
+            continue
+        if current["p95"] > previous["p95"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {previous['p95'] * 1000:.1f}ms -> "
+                f"{current['p95'] * 1000:.1f}ms"
+            )
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {previous['throughput']:.1f}/s -> "
+                f"{current['throughput']:.1f}/s"
+            )
+    return regressions
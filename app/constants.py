@@ -1,7 +1,43 @@
 TRACKER_TYPES = ("price_and_avail", "new_item", "change")
-TRACKER_METHODS = ("xpath", "selenium")
+TRACKER_METHODS = ("xpath", "selenium", "auto")
+FEED_KINDS = ("rss", "json", "sitemap")
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/41.0.2228.0 Safari/537.36",
     "Accept-Language": "en-US, en;q=0.5",
 }
 DEFAULT_PARAMS = {"xpaths": {"title_xpath": "", "link_xpath": "", "location_xpath": ""}}
+# Subscriptions notified per fan-out task
+SUBSCRIPTION_BATCH_SIZE = 500
+# requests (connect, read) timeout in seconds
+REQUEST_TIMEOUT = (5, 30)
+# Seconds an "auto" tracker keeps its detected fetch method before re-probing
+AUTO_METHOD_TTL = 24 * 60 * 60
+# Maximum new feed items processed per run
+FEED_MAX_ITEMS = 50
+# Runs kept per tracker for the run stats percentiles
+RUN_STATS_SIZE = 100
+# Tracker run profilers: cProfile (deterministic) or a stack sampler
+PROFILERS = ("cprofile", "sampler")
+# Runs profiled when a tracker is picked for profiling in the admin
+PROFILE_NEXT_RUNS = 5
+# New item titles containing these are requests, not listings
+NEW_ITEM_SKIP_WORDS = ("wanted", "looking for", "anyone got")
+# Seconds a worker keeps a tracker config without seeing a tracker event
+TRACKER_CONFIG_TTL = 10 * 60
+# Seconds between two full reloads of the scheduler's trackers (for the
+# tracker events it missed)
+SCHEDULER_RESYNC_INTERVAL = 5 * 60
+# A tracker is stale after missing this many scheduled runs
+TRACKER_STALE_RUNS = 3
+# Rows per list of the tracker health dashboard
+HEALTH_LIST_SIZE = 50
+# Seconds a cached API response is kept (saves change its key before that)
+API_CACHE_TTL = 24 * 60 * 60
+# Changes returned per request by the changes API
+API_CHANGES_LIMIT = 100
+# Seconds between keep-alive comments on an idle change feed stream
+CHANGE_FEED_HEARTBEAT = 15
+# Changes read per query when a change feed stream catches up
+CHANGE_FEED_BATCH_SIZE = 500
+# Changes a slow change feed client can fall behind before it is disconnected
+CHANGE_FEED_QUEUE_SIZE = 1000
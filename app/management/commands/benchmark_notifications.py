@@ -0,0 +1,111 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmark.server import FixtureServer
+from app.benchmark.slack import SlackStandIn
+from app.benchmark.suite import (
+    create_test_database,
+    destroy_test_database,
+    run_notification_benchmark,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a burst of new item alerts through the notification path "
+        "against a local Slack stand-in "
+        "(run with --settings=shoptrio_be.settings_bench)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--alerts", type=int, default=500, help="Alerts in the burst"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=8, help="Concurrent runs (threads)"
+        )
+        parser.add_argument(
+            "--slack-latency",
+            type=float,
+            default=0.3,
+            help="Slack answer latency in seconds",
+        )
+        parser.add_argument(
+            "--slack-jitter", type=float, default=0.1, help="Latency jitter"
+        )
+        parser.add_argument(
+            "--rate-limit",
+            type=float,
+            default=0,
+            help="Messages per second before 429s (0 unlimited)",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of messages answered with a 500",
+        )
+        parser.add_argument(
+            "--page-latency", type=float, default=0.0, help="Page latency"
+        )
+        parser.add_argument("--size", type=int, default=50000, help="Page size")
+        parser.add_argument("--json", help="Also write the report to this file")
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "BENCHMARK", False):
+            raise CommandError(
+                "The benchmark clears the cache, run it with "
+                "--settings=shoptrio_be.settings_bench"
+            )
+        cache.clear()
+
+        # A new item on every fetch, every run alerts
+        server = FixtureServer(
+            latency=options["page_latency"], size=options["size"], change_every=1
+        ).start()
+        fast_slack = SlackStandIn().start()
+        slack = SlackStandIn(
+            latency=options["slack_latency"],
+            jitter=options["slack_jitter"],
+            rate_limit=options["rate_limit"],
+            error_rate=options["error_rate"],
+        ).start()
+        old_name = create_test_database(verbosity=options["verbosity"] - 1)
+        try:
+            report = run_notification_benchmark(
+                server,
+                fast_slack,
+                slack,
+                alerts=options["alerts"],
+                workers=options["workers"],
+            )
+        finally:
+            destroy_test_database(old_name, verbosity=options["verbosity"] - 1)
+            for stopping in (server, fast_slack, slack):
+                stopping.stop()
+
+        self.stdout.write(
+            f"{'burst':<10}{'runs/s':>9}{'sent/s':>9}{'alerts':>8}{'p50 s':>8}"
+            f"{'p95 s':>8}{'max s':>8}  Slack answers / failed runs"
+        )
+        for name in ("baseline", "loaded"):
+            burst = report[name]
+            latencies = "".join(
+                f"{burst[p]:>8.2f}" if burst[p] is not None else f"{'-':>8}"
+                for p in ("p50", "p95", "max")
+            )
+            self.stdout.write(
+                f"{name:<10}{burst['throughput']:>9.1f}"
+                f"{burst['sends_per_second']:>9.1f}{burst['alerts']:>8}{latencies}"
+                f"  {burst['slack_statuses']} / {burst['errors']}"
+            )
+        self.stdout.write(
+            f"Tracker throughput degradation: {report['degradation'] * 100:.0f}%"
+        )
+
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,125 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmark.server import FixtureServer
+from app.benchmark.slack import SlackStandIn
+from app.benchmark.suite import (
+    compare,
+    create_test_database,
+    destroy_test_database,
+    run_benchmark,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the tracker checks offline against a local fixture server "
+        "(run with --settings=shoptrio_be.settings_bench)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--trackers", type=int, default=10, help="Trackers per check"
+        )
+        parser.add_argument("--rounds", type=int, default=5, help="Measured rounds")
+        parser.add_argument(
+            "--warmup", type=int, default=1, help="Unmeasured rounds run first"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Concurrent runs (threads)"
+        )
+        parser.add_argument(
+            "--latency", type=float, default=0.0, help="Page latency in seconds"
+        )
+        parser.add_argument(
+            "--jitter", type=float, default=0.0, help="Latency jitter in seconds"
+        )
+        parser.add_argument(
+            "--size", type=int, default=50000, help="Page size in bytes"
+        )
+        parser.add_argument(
+            "--change-every",
+            type=int,
+            default=2,
+            help="Pages change once every N fetches (0 never)",
+        )
+        parser.add_argument("--json", help="Also write the report to this file")
+        parser.add_argument(
+            "--baseline", help="Fail if the report regressed from this JSON report"
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed p95/throughput regression (fraction, default 0.2)",
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "BENCHMARK", False):
+            raise CommandError(
+                "The benchmark clears the cache, run it with "
+                "--settings=shoptrio_be.settings_bench"
+            )
+
+        # No breaker, backoff or lease state left from a previous benchmark
+        cache.clear()
+
+        server = FixtureServer(
+            latency=options["latency"],
+            jitter=options["jitter"],
+            size=options["size"],
+            change_every=options["change_every"],
+        ).start()
+        slack = SlackStandIn().start()
+        old_name = create_test_database(verbosity=options["verbosity"] - 1)
+        try:
+            report = run_benchmark(
+                server,
+                slack,
+                trackers=options["trackers"],
+                rounds=options["rounds"],
+                warmup=options["warmup"],
+                workers=options["workers"],
+            )
+        finally:
+            destroy_test_database(old_name, verbosity=options["verbosity"] - 1)
+            server.stop()
+            slack.stop()
+
+        self.write_report(report)
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(report, f, indent=2)
+
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+            regressions = compare(report, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError("Regressed: " + "; ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regression from the baseline"))
+
+    def write_report(self, report):
+        self.stdout.write(
+            f"{'check':<14}{'runs':>6}{'errors':>8}{'runs/s':>9}{'p50 ms':>9}"
+            f"{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'queries':>9}"
+        )
+        for name, s in report["checks"].items():
+            self.stdout.write(
+                f"{name:<14}{s['runs']:>6}{s['errors']:>8}{s['throughput']:>9.1f}"
+                f"{s['p50'] * 1000:>9.1f}{s['p95'] * 1000:>9.1f}"
+                f"{s['p99'] * 1000:>9.1f}{s['max'] * 1000:>9.1f}{s['queries']:>9.1f}"
+            )
+        errors = report["checks"]["total"]["error_classes"]
+        if errors:
+            self.stdout.write(
+                "Errors: " + ", ".join(f"{e} x{n}" for e, n in errors.items())
+            )
+        self.stdout.write(
+            f"{report['wall']:.2f}s, peak RSS {report['peak_rss_mb']:.0f} MB, "
+            f"{report['bytes'] / 1e6:.1f} MB served, "
+            f"{report['slack_messages']} Slack messages"
+        )
@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from app.models import AppTracker
+from app.utils.bulk import FORMATS, export_trackers
+
+
+class Command(BaseCommand):
+    help = "Export trackers to CSV or JSON, the import_trackers format"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="File to write (default stdout)")
+        parser.add_argument("--format", choices=FORMATS, help="Default: by extension")
+        parser.add_argument(
+            "--site",
+            type=int,
+            action="append",
+            dest="sites",
+            help="Only export the trackers of this site id (can be repeated)",
+        )
+        parser.add_argument(
+            "--active", action="store_true", help="Only export active trackers"
+        )
+
+    def handle(self, *args, **options):
+        trackers = AppTracker.objects.all()
+        if options["sites"]:
+            trackers = trackers.filter(site_id__in=options["sites"])
+        if options["active"]:
+            trackers = trackers.filter(active=True)
+
+        output = options["output"]
+        fmt = options["format"] or (
+            "json" if output and output.endswith(".json") else "csv"
+        )
+        if output:
+            with open(output, "w", newline="") as f:
+                count = export_trackers(trackers, f, fmt)
+            self.stderr.write(self.style.SUCCESS(f"Exported {count} trackers"))
+        else:
+            export_trackers(trackers, sys.stdout, fmt)
@@ -0,0 +1,39 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from app.utils.bulk import FORMATS, import_trackers, read_trackers
+
+
+class Command(BaseCommand):
+    help = (
+        "Create/update trackers and their schedules in bulk from a CSV or JSON "
+        "file (see export_trackers). Rows with an id update that tracker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON file")
+        parser.add_argument("--format", choices=FORMATS, help="Default: by extension")
+        parser.add_argument(
+            "--site", type=int, help="Site id of the rows without a site"
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("json" if path.endswith(".json") else "csv")
+        with open(path, newline="") as f:
+            rows = read_trackers(f, fmt)
+
+        try:
+            counts = import_trackers(rows, site_id=options["site"])
+        except ValidationError as e:
+            raise CommandError("\n".join(e.messages))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {counts['trackers_created']} and updated "
+                f"{counts['trackers_updated']} trackers; created "
+                f"{counts['schedules_created']}, updated "
+                f"{counts['schedules_updated']} and deleted "
+                f"{counts['schedules_deleted']} schedules"
+            )
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app.utils.categories import rebuild_closure
+
+
+class Command(BaseCommand):
+    help = "Rebuild the category closure table used for category subtree queries"
+
+    def handle(self, *args, **options):
+        count = rebuild_closure()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} category links"))
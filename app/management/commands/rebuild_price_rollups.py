@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from app.utils.prices import rebuild_offers, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill/rebuild the daily price rollups from the tracker change log, "
+        "and the product offers (price and availability)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tracker",
+            type=int,
+            action="append",
+            dest="trackers",
+            help="Only rebuild this tracker id (can be repeated)",
+        )
+        parser.add_argument(
+            "--since", help="Only rebuild from this day onwards (YYYY-MM-DD)"
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            since = parse_date(options["since"])
+            if since is None:
+                raise CommandError("--since must be a YYYY-MM-DD date")
+
+        count = rebuild_rollups(tracker_ids=options["trackers"], since=since)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} price rollups"))
+
+        count = rebuild_offers(tracker_ids=options["trackers"])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {count} product offers"))
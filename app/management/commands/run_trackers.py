@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.constants import TRACKER_TYPES
+from app.models import AppTracker
+from app.utils.runner import TrackerRunner
+from app.utils.scheduler import TrackerScheduler
+
+
+class Command(BaseCommand):
+    help = "Run active xpath trackers concurrently with the asyncio runner"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--type", action="append", dest="types", choices=TRACKER_TYPES
+        )
+        parser.add_argument(
+            "--tracker",
+            type=int,
+            action="append",
+            dest="trackers",
+            help="Only run this tracker id (can be repeated)",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=50,
+            help="Maximum requests in flight",
+        )
+        parser.add_argument(
+            "--parse-workers", type=int, default=4, help="Size of the parser pool"
+        )
+        parser.add_argument(
+            "--processes",
+            action="store_true",
+            help="Parse pages in a process pool instead of threads",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=0,
+            help="Run again every REPEAT seconds (0 runs once)",
+        )
+        parser.add_argument(
+            "--schedule",
+            action="store_true",
+            help="Run forever, following each tracker's own schedule",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Maximum trackers dispatched at once by the scheduler",
+        )
+
+    def get_trackers(self, options):
+        trackers = AppTracker.objects.filter(active=True, method="xpath")
+        if options["types"]:
+            trackers = trackers.filter(t_type__in=options["types"])
+        if options["trackers"]:
+            trackers = trackers.filter(id__in=options["trackers"])
+
+        trackers = list(trackers.select_related("site", "product__brand"))
+        for t in trackers:
+            t.task_name = t.get_task_name()
+        return trackers
+
+    def handle(self, *args, **options):
+        runner = TrackerRunner(
+            concurrency=options["concurrency"],
+            parse_workers=options["parse_workers"],
+            parse_processes=options["processes"],
+        )
+        try:
+            if options["schedule"]:
+                scheduler = TrackerScheduler(runner, batch_size=options["batch_size"])
+                asyncio.run(scheduler.serve())
+                return
+
+            while True:
+                start = time.monotonic()
+                # Reload each round to pick up tracker edits
+                trackers = self.get_trackers(options)
+                stats = asyncio.run(runner.run(trackers))
+                self.stdout.write(
+                    f"{len(trackers)} trackers: {stats['ok']} ok, "
+                    f"{stats['failed']} failed, {stats['skipped']} skipped "
+                    f"in {stats['elapsed']:.1f}s"
+                )
+                if not options["repeat"]:
+                    break
+                time.sleep(max(0, options["repeat"] - (time.monotonic() - start)))
+        finally:
+            runner.close()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app.utils.schedules import sync_schedules
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile the django-q schedules with the trackers: create the "
+        "missing ones, update the stale ones and delete the orphaned ones"
+    )
+
+    def handle(self, *args, **options):
+        counts = sync_schedules()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {counts['created']}, updated {counts['updated']} and "
+                f"deleted {counts['deleted']} schedules"
+            )
+        )
@@ -0,0 +1,95 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0002_apppricerollup"),
+    ]
+
+    operations = [
+        # Unmanaged, missing from the initial migration state
+        migrations.CreateModel(
+            name="AppStoreLocation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                (
+                    "full_address",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                ("description", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "app_store_locations",
+                "managed": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="AppProductOffer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("price", models.FloatField(blank=True, null=True)),
+                ("available", models.BooleanField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "location",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        to="app.appstorelocation",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        to="app.appproduct",
+                    ),
+                ),
+                (
+                    "site",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        to="app.appsite",
+                    ),
+                ),
+                (
+                    "tracker",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="app.apptracker",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "app_product_offers",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="appproductoffer",
+            index=models.Index(
+                fields=["product", "price"], name="app_product_product_6ab6af_idx"
+            ),
+        ),
+    ]
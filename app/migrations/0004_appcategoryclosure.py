@@ -0,0 +1,53 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0003_appproductoffer"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AppCategoryClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.IntegerField()),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="descendant_links",
+                        to="app.appcategory",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="ancestor_links",
+                        to="app.appcategory",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "app_category_closure",
+                "unique_together": {("ancestor", "descendant")},
+            },
+        ),
+        migrations.AddIndex(
+            model_name="appcategoryclosure",
+            index=models.Index(
+                fields=["descendant", "depth"], name="app_categor_descend_caf9a0_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,91 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0004_appcategoryclosure"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AppSiteFeed",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("rss", "rss"),
+                            ("json", "json"),
+                            ("sitemap", "sitemap"),
+                        ],
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "url",
+                    models.TextField(
+                        help_text="{search_key} is replaced by the tracker's"
+                    ),
+                ),
+                (
+                    "params",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text='json feeds: dotted paths, e.g. {"items": "data.results", "id": "id", "title": "title", "link": "url", "location": "city", "published": "created_at"}',
+                    ),
+                ),
+                ("active", models.BooleanField(default=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "site",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        to="app.appsite",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "app_site_feeds",
+            },
+        ),
+        migrations.CreateModel(
+            name="AppTrackerFeedMark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("last_id", models.CharField(blank=True, max_length=255, null=True)),
+                ("last_seen_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "tracker",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="app.apptracker",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "app_tracker_feed_marks",
+            },
+        ),
+    ]
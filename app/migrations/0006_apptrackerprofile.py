@@ -0,0 +1,55 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0005_appsitefeed_apptrackerfeedmark"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AppTrackerProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "profiler",
+                    models.CharField(
+                        choices=[("cprofile", "cprofile"), ("sampler", "sampler")],
+                        max_length=255,
+                    ),
+                ),
+                ("duration", models.FloatField()),
+                ("error", models.CharField(blank=True, max_length=255, null=True)),
+                ("summary", models.TextField()),
+                ("data", models.BinaryField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "tracker",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="app.apptracker",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "app_tracker_profiles",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="apptrackerprofile",
+            index=models.Index(
+                fields=["tracker", "created_at"],
+                name="app_tracker_tracker_7c7787_idx",
+            ),
+        ),
+    ]
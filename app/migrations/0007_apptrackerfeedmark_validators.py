@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0006_apptrackerprofile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="apptrackerfeedmark",
+            name="etag",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="apptrackerfeedmark",
+            name="last_modified",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
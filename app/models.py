@@ -1,16 +1,19 @@
-import pprint
-from cron_converter import Cron
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django_countries.fields import CountryField
 from django.core.exceptions import ValidationError
-from django_q.tasks import schedule
 from django_q.models import Schedule
-from .constants import TRACKER_TYPES, TRACKER_METHODS, DEFAULT_PARAMS
-
-pp = pprint.PrettyPrinter(indent=4)
+from .constants import (
+    TRACKER_TYPES,
+    TRACKER_METHODS,
+    DEFAULT_PARAMS,
+    FEED_KINDS,
+    PROFILERS,
+)
 
 # pre-save and delete signals
-from django.db.models.signals import pre_save, post_save, pre_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.db.backends.signals import connection_created
 
 
 def get_default_params():
@@ -43,10 +46,67 @@ class AppCategory(models.Model):
         db_table = "app_categories"
         verbose_name_plural = "categories"
 
+    def clean(self):
+        from .utils.categories import check_parent
+
+        check_parent(self.id, self.parent_id)
+
+    def save(self, *args, **kwargs):
+        # The closure table is updated (post_save) in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 
+# Closure table of the category tree: one row per (ancestor, descendant) pair,
+# including each category with itself at depth 0
+class AppCategoryClosure(models.Model):
+    ancestor = models.ForeignKey(
+        AppCategory, models.DO_NOTHING, related_name="descendant_links"
+    )
+    descendant = models.ForeignKey(
+        AppCategory, models.DO_NOTHING, related_name="ancestor_links"
+    )
+    depth = models.IntegerField()
+
+    class Meta:
+        db_table = "app_category_closure"
+        unique_together = (("ancestor", "descendant"),)
+        indexes = [models.Index(fields=["descendant", "depth"])]
+
+
+def check_category_parent(sender, instance, **kwargs):
+    # Before the row is written, a cycle would corrupt the tree
+    from .utils.categories import check_parent
+
+    check_parent(instance.id, instance.parent_id)
+
+
+def update_category_closure(sender, instance, **kwargs):
+    from .utils.categories import move_category
+
+    move_category(instance.id, instance.parent_id)
+
+
+def delete_category_closure(sender, instance, **kwargs):
+    # Its descendants lose every ancestor from the category up, they are
+    # left as a tree of their own
+    links = AppCategoryClosure.objects
+    subtree = set(
+        links.filter(ancestor_id=instance.id).values_list("descendant_id", flat=True)
+    )
+    links.filter(descendant_id__in=subtree | {instance.id}).exclude(
+        ancestor_id__in=subtree - {instance.id}
+    ).delete()
+
+
+pre_save.connect(check_category_parent, sender=AppCategory)
+post_save.connect(update_category_closure, sender=AppCategory)
+post_delete.connect(delete_category_closure, sender=AppCategory)
+
+
 class AppProduct(models.Model):
     category = models.ForeignKey(AppCategory, models.DO_NOTHING)
     brand = models.ForeignKey(AppBrand, models.DO_NOTHING, blank=True, null=True)
@@ -95,6 +155,30 @@ class AppSite(models.Model):
         return self.name
 
 
+# Lightweight listing source (RSS/Atom, JSON search API, sitemap) of a site,
+# used by new item trackers instead of scraping the listing page
+class AppSiteFeed(models.Model):
+    site = models.ForeignKey(AppSite, models.DO_NOTHING)
+    kind = models.CharField(max_length=255, choices=[(k, k) for k in FEED_KINDS])
+    url = models.TextField(help_text="{search_key} is replaced by the tracker's")
+    params = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text='json feeds: dotted paths, e.g. {"items": "data.results", '
+        '"id": "id", "title": "title", "link": "url", "location": "city", '
+        '"published": "created_at"}',
+    )
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "app_site_feeds"
+
+    def __str__(self):
+        return f"{self.site} {self.kind}"
+
+
 class AppTrackerChange(models.Model):
     tracker = models.ForeignKey("AppTracker", models.CASCADE)
     item_desc = models.CharField(max_length=255, blank=True, null=True)
@@ -114,6 +198,80 @@ class AppTrackerChange(models.Model):
         return self.tracker.site.name + " " + self.tracker.name
 
 
+# Newest feed item a new item tracker has seen (high-water mark)
+class AppTrackerFeedMark(models.Model):
+    tracker = models.OneToOneField("AppTracker", models.CASCADE)
+    last_id = models.CharField(max_length=255, blank=True, null=True)
+    last_seen_at = models.DateTimeField(blank=True, null=True)
+    # Validators of the last feed response, for conditional requests
+    etag = models.CharField(max_length=255, blank=True, null=True)
+    last_modified = models.CharField(max_length=255, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "app_tracker_feed_marks"
+
+
+# Daily price rollup per tracker, kept up to date by check_price
+class AppPriceRollup(models.Model):
+    tracker = models.ForeignKey("AppTracker", models.CASCADE)
+    day = models.DateField()
+    open = models.FloatField()
+    low = models.FloatField()
+    high = models.FloatField()
+    last = models.FloatField()
+    changes = models.IntegerField(default=0)
+    first_at = models.DateTimeField()
+    last_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "app_price_rollups"
+        unique_together = (("tracker", "day"),)
+
+    def __str__(self):
+        return f"{self.tracker_id} {self.day}"
+
+
+# Current offer of every product tracker, sorted by price for best-price lookups
+class AppProductOffer(models.Model):
+    product = models.ForeignKey(AppProduct, models.DO_NOTHING)
+    tracker = models.OneToOneField("AppTracker", models.CASCADE)
+    site = models.ForeignKey(AppSite, models.DO_NOTHING)
+    location = models.ForeignKey(
+        AppStoreLocation, models.DO_NOTHING, blank=True, null=True
+    )
+    price = models.FloatField(blank=True, null=True)
+    available = models.BooleanField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "app_product_offers"
+        indexes = [models.Index(fields=["product", "price"])]
+
+    def __str__(self):
+        return f"{self.product_id} {self.site_id} {self.price}"
+
+
+# Profile of a single tracker run (cProfile stats or sampled stacks)
+class AppTrackerProfile(models.Model):
+    tracker = models.ForeignKey("AppTracker", models.CASCADE)
+    profiler = models.CharField(max_length=255, choices=[(p, p) for p in PROFILERS])
+    duration = models.FloatField()
+    error = models.CharField(max_length=255, blank=True, null=True)
+    # Top functions/stacks, readable in the admin
+    summary = models.TextField()
+    # zlib compressed pstats dump (cprofile) or folded stacks (sampler)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "app_tracker_profiles"
+        indexes = [models.Index(fields=["tracker", "created_at"])]
+
+    def __str__(self):
+        return f"{self.tracker_id} {self.profiler} {self.created_at}"
+
+
 class AppTracker(models.Model):
     name = models.CharField(max_length=255)
     # type is a python funtion
@@ -154,6 +312,8 @@ class AppTracker(models.Model):
         db_table = "app_trackers"
 
     def clean(self):
+        from cron_converter import Cron
+
         # Check id cron is valid
         try:
             cron_instance = Cron(self.cron_schedule)
@@ -163,69 +323,41 @@ class AppTracker(models.Model):
     def __str__(self):
         return self.site.name + " " + self.name
 
+    def get_cluster(self, auto_method=None):
+        # django-q cluster name the tracker's schedule is routed to, "auto"
+        # trackers go by the method they last needed (see get_auto_method)
+        method = self.method
+        if method == "auto":
+            if auto_method is None:
+                from .utils.tracker import get_auto_method
+
+                auto_method = get_auto_method(self.id)
+            method = auto_method
+        pool = settings.TRACKER_CLUSTERS.get(method, "light")
+        return settings.Q_CLUSTERS[pool]["name"]
+
+    def get_task_name(self):
+        # Name used in the tracker alerts
+        if self.t_type == "new_item":
+            return f"{self.site.name} {self.name}"
+        elif self.t_type == "change":
+            return self.name
+        else:
+            # Last is price and avail
+            name = []
+            if self.site.name.lower() in self.product.brand.name:
+                name.append(self.site.name)
+            name.extend([self.product.brand.name, self.product.name])
+            if self.name.lower() not in self.product.name.lower():
+                name.append(self.name)
+            return " ".join(name)
+
 
 def create_task(sender, instance, **kwargs):
-    # Build name
-    if instance.t_type == "new_item":
-        name = f"{instance.site.name} {instance.name}"
-    elif instance.t_type == "change":
-        name = instance.name
-    else:
-        # Last is price and avail
-        name = []
-        if instance.site.name.lower() in instance.product.brand.name:
-            name.append(instance.site.name)
-        name.extend([instance.product.brand.name, instance.product.name])
-        if instance.name.lower() not in instance.product.name.lower():
-            name.append(instance.name)
-
-    params = [
-        instance.id,
-        " ".join(name),
-        instance.search_key,
-        instance.site.id,
-        instance.url,
-        instance.method,
-        instance.params,
-    ]
-
-    if instance.cron_schedule:
-        sched_params = {
-            "schedule_type": Schedule.CRON,
-            "cron": instance.cron_schedule,
-        }
-    else:
-        sched_params = {
-            "schedule_type": Schedule.MINUTES,
-            "minutes": instance.frequency,
-            "repeats": instance.repeats,
-        }
-
-    if not Schedule.objects.filter(name=instance.id).exists():
-        if instance.active:
-            schedule(
-                "app.utils.tracker.check_" + instance.t_type,
-                *params,
-                hook="app.utils.hooks.notify_error",
-                name=instance.id,
-                **sched_params,
-            )
-    else:
-        task = Schedule.objects.get(name=instance.id)
-        if instance.active:
-            task.func = "app.utils.tracker.check_" + instance.t_type
-            task.args = tuple(params)
-            if instance.cron_schedule:
-                task.schedule_type = Schedule.CRON
-                task.cron = instance.cron
-            else:
-                task.schedule_type = Schedule.MINUTES
-                task.minutes = instance.frequency
-                task.repeats = instance.repeats
-            task.save()
-        else:
-            # delete task from the queue if deactivated
-            task.delete()
+    from .utils.schedules import sync_schedules
+
+    # Saved from the admin, the repeats edit applies to the running schedule
+    sync_schedules([instance], reset_repeats=True)
 
 
 def delete_task(sender, instance, **kwargs):
@@ -237,8 +369,87 @@ def delete_task(sender, instance, **kwargs):
         pass
 
 
+def tracker_saved(sender, instance, **kwargs):
+    from .utils.events import publish_tracker_event
+
+    publish_tracker_event(instance.id, "save")
+
+
+def tracker_deleted(sender, instance, **kwargs):
+    from .utils.events import publish_tracker_event
+
+    publish_tracker_event(instance.id, "delete")
+
+
+def site_saved(sender, instance, **kwargs):
+    # Site url/feed changes reach the tracker configs cached by workers
+    from .utils.events import publish_tracker_events
+
+    site_id = instance.site_id if sender is AppSiteFeed else instance.id
+    trackers = AppTracker.objects.filter(site_id=site_id)
+    publish_tracker_events(trackers.values_list("id", flat=True), "save")
+
+
+def invalidate_api_cache(sender, instance, **kwargs):
+    from .utils.api_cache import (
+        CHANGES,
+        SITES,
+        TRACKERS,
+        bump_versions,
+        invalidate_trackers,
+        tracker_key,
+        version_key,
+    )
+
+    if sender is AppTrackerChange:
+        bump_versions([tracker_key(instance.tracker_id), version_key(CHANGES)])
+    elif sender is AppTracker:
+        invalidate_trackers([instance.id])
+        if "created" not in kwargs:
+            # Deleted with its changes
+            bump_versions([version_key(CHANGES)])
+    else:
+        # Trackers are served with their site
+        keys = [version_key(SITES), version_key(TRACKERS)]
+        if "created" not in kwargs:
+            keys.append(version_key(CHANGES))
+        bump_versions(keys)
+
+
+def change_saved(sender, instance, created, **kwargs):
+    from .utils.change_feed import publish_change
+
+    # Once committed, so streams catching up from the database can see it
+    if created:
+        transaction.on_commit(lambda: publish_change(instance))
+
+
 post_save.connect(create_task, sender=AppTracker)
 pre_delete.connect(delete_task, sender=AppTracker)
+post_save.connect(tracker_saved, sender=AppTracker)
+pre_delete.connect(tracker_deleted, sender=AppTracker)
+post_save.connect(site_saved, sender=AppSite)
+post_save.connect(site_saved, sender=AppSiteFeed)
+post_delete.connect(site_saved, sender=AppSiteFeed)
+# Not on change deletes: a receiver would stop the fast cascade delete of the
+# changes of a deleted tracker (the tracker delete bumps their versions)
+post_save.connect(invalidate_api_cache, sender=AppTrackerChange)
+post_save.connect(change_saved, sender=AppTrackerChange)
+post_save.connect(invalidate_api_cache, sender=AppTracker)
+post_delete.connect(invalidate_api_cache, sender=AppTracker)
+post_save.connect(invalidate_api_cache, sender=AppSite)
+post_delete.connect(invalidate_api_cache, sender=AppSite)
+
+
+def time_queries(sender, connection, **kwargs):
+    from .utils.stats import time_query
+
+    # Query time of tracker runs (no-op outside of a run)
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+connection_created.connect(time_queries)
 
 
 class AppUserProfile(models.Model):
@@ -273,6 +484,31 @@ class AppUserSubscription(models.Model):
         db_table = "app_user_subscriptions"
 
 
+def previous_subscription(sender, instance, **kwargs):
+    # The targets before the save, a moved subscription leaves their indexes
+    instance._previous_targets = (
+        AppUserSubscription.objects.filter(id=instance.id)
+        .values_list("tracker_id", "product_id")
+        .first()
+        if instance.id
+        else None
+    )
+
+
+def invalidate_subscriptions(sender, instance, **kwargs):
+    from .utils.subscriptions import invalidate_thresholds
+
+    invalidate_thresholds(instance.tracker_id, instance.product_id)
+    previous = getattr(instance, "_previous_targets", None)
+    if previous and previous != (instance.tracker_id, instance.product_id):
+        invalidate_thresholds(*previous)
+
+
+pre_save.connect(previous_subscription, sender=AppUserSubscription)
+post_save.connect(invalidate_subscriptions, sender=AppUserSubscription)
+post_delete.connect(invalidate_subscriptions, sender=AppUserSubscription)
+
+
 class AuthGroup(models.Model):
     name = models.CharField(unique=True, max_length=150)
 
@@ -0,0 +1,214 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.db.models import F
+
+from .constants import (
+    CHANGE_FEED_BATCH_SIZE,
+    CHANGE_FEED_HEARTBEAT,
+    CHANGE_FEED_QUEUE_SIZE,
+)
+from .models import AppTrackerChange
+from .utils.change_feed import change_event, listener
+
+# Routed by shoptrio_be.asgi before Django, which would hold a thread per client
+CHANGE_STREAM_PATH = "/api/changes/stream/"
+FILTERS = ("tracker", "site", "product")
+
+
+class ChangeStream(object):
+    """The new changes a client subscribed to, queued on its event loop"""
+
+    def __init__(self, filters, last_id):
+        self.filters = filters
+        self.last_id = last_id
+        self.loop = asyncio.get_running_loop()
+        # One more slot for the None that ends the stream
+        self.queue = asyncio.Queue(CHANGE_FEED_QUEUE_SIZE + 1)
+        self.closed = False
+
+    def matches(self, event):
+        return all(event[key] in ids for key, ids in self.filters.items())
+
+    def push(self, event):
+        # None (or a client too slow to keep up) ends the stream, the client
+        # reconnects and catches up from the database
+        if self.closed:
+            return
+        if event is None or self.queue.qsize() >= CHANGE_FEED_QUEUE_SIZE:
+            self.closed = True
+            event = None
+        self.queue.put_nowait(event)
+
+
+def get_filters(scope):
+    """tracker/site/product ids of the query string (each can be repeated)
+
+    Raises:
+        ValueError: An id is not an integer
+    """
+    params = parse_qs(scope["query_string"].decode())
+    return {
+        key: {int(value) for values in params[key] for value in values.split(",")}
+        for key in FILTERS
+        if key in params
+    }
+
+
+def get_last_id(scope):
+    """The cursor: the Last-Event-ID header (set by EventSource on reconnect)
+    or the last_event_id param, None to only get the new changes
+
+    Raises:
+        ValueError: The cursor is not an integer
+    """
+    last_id = dict(scope["headers"]).get(b"last-event-id")
+    if last_id is None:
+        params = parse_qs(scope["query_string"].decode())
+        last_id = params.get("last_event_id", [None])[0]
+    return None if last_id in (None, b"", "") else int(last_id)
+
+
+def get_changes(filters, last_id):
+    """The next committed changes after last_id, oldest first"""
+    changes = AppTrackerChange.objects.filter(id__gt=last_id)
+    if "tracker" in filters:
+        changes = changes.filter(tracker_id__in=filters["tracker"])
+    if "site" in filters:
+        changes = changes.filter(tracker__site_id__in=filters["site"])
+    if "product" in filters:
+        changes = changes.filter(tracker__product_id__in=filters["product"])
+    changes = (
+        changes.defer("changed_content", "changes")
+        .annotate(site=F("tracker__site_id"), product=F("tracker__product_id"))
+        .order_by("id")[:CHANGE_FEED_BATCH_SIZE]
+    )
+    try:
+        return [change_event(c, c.site, c.product) for c in changes]
+    finally:
+        close_old_connections()
+
+
+def get_latest_id():
+    try:
+        latest = AppTrackerChange.objects.order_by("-id").values_list("id", flat=True)
+        return latest.first() or 0
+    finally:
+        close_old_connections()
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: change\ndata: {json.dumps(event)}\n\n".encode()
+
+
+async def send_response(send, status, body=b""):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def change_stream(scope, receive, send):
+    """Server-Sent Events feed of the new tracker changes.
+
+    Query params:
+        tracker, site, product: only the changes of these ids (can be
+            repeated or comma separated)
+        last_event_id: resume after this change id, like the Last-Event-ID
+            header EventSource sends when it reconnects
+
+    Each event is a change (see change_event) with the change id as event
+    id. A resumed stream first sends the changes committed since the
+    cursor from the database, then the ones published by the trackers, in
+    the order they commit: a lower id can follow a higher one, so a client
+    resuming from its Last-Event-ID may get some changes again.
+    """
+    if scope["method"] != "GET":
+        return await send_response(send, 405)
+    try:
+        filters = get_filters(scope)
+        last_id = get_last_id(scope)
+    except ValueError:
+        body = {"error": "tracker, site, product and last_event_id must be integers"}
+        return await send_response(send, 400, json.dumps(body).encode())
+
+    stream = ChangeStream(filters, last_id)
+    listener.add(stream)
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        # Subscribed before reading the database, so no change falls in between
+        loop = asyncio.get_running_loop()
+        ready = await loop.run_in_executor(
+            None, listener.ready.wait, CHANGE_FEED_HEARTBEAT
+        )
+        if not ready:
+            return await send_response(send, 503)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    # No buffering by nginx
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        body = {"type": "http.response.body", "more_body": True}
+
+        if stream.last_id is None:
+            stream.last_id = await sync_to_async(get_latest_id)()
+        # Ids sent from the database, that the queue may repeat
+        caught_up = set()
+        while True:
+            events = await sync_to_async(get_changes)(filters, stream.last_id)
+            for event in events:
+                await send({**body, "body": format_event(event)})
+                stream.last_id = event["id"]
+                caught_up.add(event["id"])
+            if len(events) < CHANGE_FEED_BATCH_SIZE:
+                break
+
+        while not disconnected.done():
+            get = asyncio.ensure_future(stream.queue.get())
+            await asyncio.wait(
+                {get, disconnected},
+                timeout=CHANGE_FEED_HEARTBEAT,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not get.done():
+                get.cancel()
+                if not disconnected.done():
+                    # Keeps proxies from closing an idle stream
+                    await send({**body, "body": b": ping\n\n"})
+                continue
+
+            event = get.result()
+            if event is None:
+                break
+            # Published changes may repeat the ones read from the database,
+            # the others are sent as they come: concurrent trackers do not
+            # commit their changes in id order
+            if event["id"] in caught_up:
+                caught_up.discard(event["id"])
+                continue
+            await send({**body, "body": format_event(event)})
+
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        listener.remove(stream)
+        disconnected.cancel()
@@ -0,0 +1,11 @@
+from django.test.runner import DiscoverRunner
+
+from ..benchmark.suite import manage_app_tables
+
+
+class TestRunner(DiscoverRunner):
+    """Creates the unmanaged app_* tables in the test database"""
+
+    def setup_databases(self, **kwargs):
+        manage_app_tables()
+        return super().setup_databases(**kwargs)
@@ -0,0 +1,83 @@
+from django.urls import reverse
+
+from ..models import AppTrackerChange
+from .utils import RedisTestCase, create_site, create_tracker
+
+
+def create_change(tracker, price):
+    return AppTrackerChange.objects.create(tracker=tracker, price=price, available=True)
+
+
+class ApiCacheTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = create_site()
+        self.tracker = create_tracker(self.site)
+        self.other = create_tracker(self.site)
+        create_change(self.tracker, 10)
+
+    def test_etag_not_modified(self):
+        url = reverse("tracker-changes", args=[self.tracker.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_saves_invalidate(self):
+        url = reverse("tracker-changes", args=[self.tracker.id])
+        etag = self.client.get(url)["ETag"]
+        other_url = reverse("tracker-changes", args=[self.other.id])
+        other_etag = self.client.get(other_url)["ETag"]
+
+        create_change(self.tracker, 9)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c["price"] for c in response.json()["changes"]], [9, 10])
+        # Changes of other trackers are still current
+        response = self.client.get(other_url, HTTP_IF_NONE_MATCH=other_etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_site_save_invalidates_trackers(self):
+        url = reverse("tracker", args=[self.tracker.id])
+        etag = self.client.get(url)["ETag"]
+        self.site.name = "Renamed"
+        self.site.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()["site"]["name"], "Renamed")
+
+
+class ChangesCursorTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tracker = create_tracker(create_site())
+        self.changes = [create_change(self.tracker, price) for price in range(5)]
+        self.url = reverse("changes")
+
+    def get_ids(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [c["id"] for c in response.json()["changes"]]
+
+    def test_latest_first(self):
+        ids = [c.id for c in self.changes]
+        self.assertEqual(self.get_ids(limit=2), ids[:-3:-1])
+
+    def test_since_id_pages_without_gaps(self):
+        since_id = self.changes[0].id
+        seen = []
+        while True:
+            page = self.get_ids(since_id=since_id, limit=2)
+            if not page:
+                break
+            seen += page
+            since_id = page[-1]
+        self.assertEqual(seen, [c.id for c in self.changes[1:]])
+
+    def test_invalid_params(self):
+        for params in ({"limit": -1}, {"limit": 0}, {"since_id": "x"}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
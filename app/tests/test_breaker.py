@@ -0,0 +1,131 @@
+import time
+
+import requests
+from django.test import override_settings
+from django_redis import get_redis_connection
+
+from ..utils import tracker as checks
+from ..utils.breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    allow_request,
+    backoff_key,
+    breaker_key,
+    circuit_breaker,
+    get_breaker,
+    get_breaker_state,
+    in_backoff,
+    is_site_error,
+    record_result,
+    should_skip,
+)
+from ..utils.leases import acquire_lease
+from .utils import RedisTestCase, create_site, create_tracker
+
+
+@override_settings(
+    BREAKER_FAILURE_THRESHOLD=2,
+    BREAKER_COOLDOWN=60,
+    BREAKER_MAX_COOLDOWN=600,
+    TRACKER_BACKLOG_THRESHOLD=0,
+)
+class CircuitBreakerTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = create_site()
+        self.tracker = create_tracker(self.site)
+        self.other = create_tracker(self.site)
+
+    def fail(self, tracker=None, error=None):
+        tracker = tracker or self.tracker
+        record_result(tracker.id, self.site.id, error or requests.ConnectionError())
+
+    def end_cooldown(self):
+        get_redis_connection("default").hset(
+            breaker_key(self.site.id), "opened_at", time.time() - 3600
+        )
+
+    def test_opens_at_threshold(self):
+        self.fail()
+        self.assertEqual(get_breaker_state(get_breaker(self.site.id)), CLOSED)
+        self.assertTrue(allow_request(self.site.id))
+
+        self.fail(self.other)
+        self.assertEqual(get_breaker_state(get_breaker(self.site.id)), OPEN)
+        self.assertFalse(allow_request(self.site.id))
+        self.assertEqual(should_skip(self.other.id, self.site.id), "backing off")
+
+    def test_half_open_probe_then_close(self):
+        self.fail()
+        self.fail(self.other)
+        self.end_cooldown()
+
+        self.assertEqual(get_breaker_state(get_breaker(self.site.id)), HALF_OPEN)
+        # A single probe
+        self.assertTrue(allow_request(self.site.id))
+        self.assertFalse(allow_request(self.site.id))
+
+        record_result(self.tracker.id, self.site.id)
+        breaker = get_breaker(self.site.id)
+        self.assertEqual((breaker["state"], breaker["failures"]), (CLOSED, 0))
+        self.assertFalse(in_backoff(self.tracker.id))
+
+    def test_failed_probe_doubles_cooldown(self):
+        self.fail()
+        self.fail(self.other)
+        self.end_cooldown()
+        self.assertTrue(allow_request(self.site.id))
+
+        self.fail()
+        breaker = get_breaker(self.site.id)
+        self.assertEqual((breaker["state"], breaker["cooldown"]), (OPEN, 120))
+
+    def test_other_errors_only_back_the_tracker_off(self):
+        self.fail(error=ValueError())
+        self.fail(self.other, error=ValueError())
+        self.assertEqual(get_breaker(self.site.id)["failures"], 0)
+        self.assertTrue(in_backoff(self.tracker.id))
+
+    def test_only_site_failures_count(self):
+        def http_error(status):
+            response = requests.Response()
+            response.status_code = status
+            return requests.HTTPError(response=response)
+
+        for error in (http_error(404), http_error(410), ValueError(), IOError()):
+            self.assertFalse(is_site_error(error), error)
+        for error in (http_error(503), http_error(429), requests.Timeout()):
+            self.assertTrue(is_site_error(error), error)
+
+        # A removed product does not open the circuit of its site
+        self.fail(error=http_error(404))
+        self.fail(self.other, error=http_error(404))
+        self.assertEqual(get_breaker(self.site.id)["failures"], 0)
+        self.fail(error=http_error(503))
+        self.fail(self.other, error=http_error(429))
+        self.assertEqual(get_breaker(self.site.id)["state"], OPEN)
+
+    def test_open_circuit_skips_runs(self):
+        calls = []
+
+        @circuit_breaker
+        def task(id):
+            calls.append(id)
+
+        self.fail()
+        self.fail(self.other)
+        third = create_tracker(self.site)
+        self.assertIsNone(task(third.id))
+        self.assertEqual(calls, [])
+
+    def test_dropped_run_records_nothing(self):
+        self.fail(self.other)
+        acquire_lease(self.tracker.id)
+
+        # Dropped by the lease before fetching anything
+        self.assertIsNone(checks.check_price(self.tracker.id))
+        self.assertEqual(get_breaker(self.site.id)["failures"], 1)
+        self.assertTrue(
+            get_redis_connection("default").exists(backoff_key(self.other.id))
+        )
@@ -0,0 +1,166 @@
+import io
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django_q.models import Schedule
+
+from ..models import AppTracker
+from ..utils.bulk import (
+    export_trackers,
+    import_trackers,
+    read_trackers,
+    set_trackers_active,
+)
+from .utils import RedisTestCase, create_product, create_site, create_tracker
+
+
+class BulkTrackersTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = create_site()
+        self.product = create_product()
+        self.tracker = create_tracker(
+            self.site,
+            product=self.product,
+            params={"xpaths": [{"price_xpath": "//b"}]},
+            frequency=5,
+        )
+
+    def round_trip(self, fmt):
+        out = io.StringIO()
+        self.assertEqual(export_trackers(AppTracker.objects.all(), out, fmt), 1)
+        return read_trackers(io.StringIO(out.getvalue()), fmt)
+
+    def test_csv_round_trip_updates(self):
+        (row,) = self.round_trip("csv")
+        row["frequency"] = "10"
+
+        counts = import_trackers([row])
+        self.assertEqual(counts["trackers_created"], 0)
+        self.assertEqual(counts["trackers_updated"], 1)
+        self.tracker.refresh_from_db()
+        self.assertEqual(self.tracker.frequency, 10)
+        self.assertEqual(self.tracker.params, {"xpaths": [{"price_xpath": "//b"}]})
+        self.assertEqual(Schedule.objects.get(name=str(self.tracker.id)).minutes, 10)
+
+    def test_json_round_trip_creates(self):
+        (row,) = self.round_trip("json")
+        del row["id"]
+        rows = [{**row, "name": "Copy 1"}, {**row, "name": "Copy 2", "active": False}]
+
+        counts = import_trackers(rows)
+        self.assertEqual(counts["trackers_created"], 2)
+        self.assertEqual(counts["schedules_created"], 1)
+        copy = AppTracker.objects.get(name="Copy 1")
+        self.assertEqual(
+            (copy.site_id, copy.product_id, copy.params),
+            (self.site.id, self.product.id, self.tracker.params),
+        )
+        self.assertTrue(Schedule.objects.filter(name=str(copy.id)).exists())
+        copy = AppTracker.objects.get(name="Copy 2")
+        self.assertFalse(Schedule.objects.filter(name=str(copy.id)).exists())
+
+    def test_site_option(self):
+        row = {"name": "New", "t_type": "change", "url": "http://site.test/new"}
+        import_trackers([row], site_id=self.site.id)
+        self.assertEqual(AppTracker.objects.get(name="New").site_id, self.site.id)
+
+    def test_validation_errors(self):
+        rows = [
+            {"name": "Ok", "url": "http://site.test/ok", "site": self.site.id},
+            {"name": "Bad", "url": "http://site.test/b", "site": 999},
+            {"name": "Bad", "url": "http://site.test/b", "t_type": "x", "site": 1},
+            {"id": 999, "name": "Missing"},
+            {"colour": "red"},
+        ]
+        with self.assertRaises(ValidationError) as e:
+            import_trackers(rows)
+        messages = "\n".join(e.exception.messages)
+        for expected in (
+            "Row 2: site 999 does not exist",
+            "Row 3: t_type",
+            "Row 4: tracker 999 does not exist",
+            "Row 5: unknown columns colour",
+        ):
+            self.assertIn(expected, messages)
+        # Nothing written
+        self.assertEqual(AppTracker.objects.count(), 1)
+
+    def test_concurrent_trackers_not_taken_for_imported_ones(self):
+        bulk_create = AppTracker.objects.bulk_create
+        other = AppTracker(
+            name="Admin", url="http://site.test/admin", site=self.site, active=True
+        )
+
+        def create_meanwhile(objs, *args, **kwargs):
+            created = bulk_create(objs, *args, **kwargs)
+            # Created by someone else in between, its schedule is not ours to set
+            bulk_create([other])
+            return created
+
+        row = {"name": "New", "url": "http://site.test/new", "site": self.site.id}
+        with mock.patch.object(
+            AppTracker.objects, "bulk_create", side_effect=create_meanwhile
+        ):
+            counts = import_trackers([row])
+
+        self.assertEqual(counts["schedules_created"], 1)
+        new = AppTracker.objects.get(name="New")
+        self.assertTrue(Schedule.objects.filter(name=str(new.id)).exists())
+        other = AppTracker.objects.get(name="Admin")
+        self.assertFalse(Schedule.objects.filter(name=str(other.id)).exists())
+
+
+class AdminImportExportTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@site.test", "admin")
+        )
+        self.site = create_site()
+        self.tracker = create_tracker(self.site, frequency=5)
+
+    def test_export_action(self):
+        response = self.client.post(
+            reverse("admin:app_apptracker_changelist"),
+            {"action": "export_csv", "_selected_action": [self.tracker.id]},
+        )
+        self.assertEqual(response["Content-Type"], "text/csv")
+        (row,) = read_trackers(io.StringIO(response.content.decode()))
+        self.assertEqual(int(row["id"]), self.tracker.id)
+
+    def test_import_view(self):
+        url = reverse("admin:app_apptracker_import")
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        upload = SimpleUploadedFile(
+            "trackers.csv", b"name,url\nNew,http://site.test/new\n"
+        )
+        response = self.client.post(url, {"file": upload, "site": self.site.id})
+        self.assertRedirects(response, reverse("admin:app_apptracker_changelist"))
+        self.assertEqual(AppTracker.objects.get(name="New").site_id, self.site.id)
+
+    def test_deactivate_action(self):
+        response = self.client.post(
+            reverse("admin:app_apptracker_changelist"),
+            {"action": "deactivate", "_selected_action": [self.tracker.id]},
+            follow=True,
+        )
+        self.assertContains(response, "Deactivated 1 trackers: 0 schedules created, 1")
+        self.assertFalse(Schedule.objects.filter(name=str(self.tracker.id)).exists())
+
+    def test_set_active_counts_updated_trackers(self):
+        # Counted after the update, this queryset would be empty
+        counts = set_trackers_active(AppTracker.objects.filter(active=True), False)
+        self.assertEqual(counts["trackers"], 1)
+
+    def test_import_view_errors(self):
+        upload = SimpleUploadedFile("trackers.csv", b"name,url\nNew,http://x.test\n")
+        response = self.client.post(
+            reverse("admin:app_apptracker_import"), {"file": upload}, follow=True
+        )
+        self.assertContains(response, "Row 1: site is required")
+        self.assertFalse(AppTracker.objects.filter(name="New").exists())
@@ -0,0 +1,79 @@
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from ..models import AppCategory, AppCategoryClosure
+from ..utils.categories import category_subtree, move_category
+
+
+class CategoryClosureTest(TestCase):
+    def setUp(self):
+        self.root = AppCategory.objects.create(name="Vehicles")
+        self.child = AppCategory.objects.create(name="Scooters", parent=self.root)
+        self.leaf = AppCategory.objects.create(name="Vespa", parent=self.child)
+
+    def subtree(self, category):
+        subtree = category_subtree(category.id)
+        return set(subtree.values_list("descendant_id", flat=True))
+
+    def test_subtree(self):
+        self.assertEqual(
+            self.subtree(self.root), {self.root.id, self.child.id, self.leaf.id}
+        )
+        self.assertEqual(self.subtree(self.leaf), {self.leaf.id})
+
+    def test_move(self):
+        other = AppCategory.objects.create(name="Parts")
+        self.child.parent = other
+        self.child.save()
+        self.assertEqual(self.subtree(self.root), {self.root.id})
+        self.assertEqual(self.subtree(other), {other.id, self.child.id, self.leaf.id})
+
+    def test_move_under_descendant_rejected(self):
+        links = AppCategoryClosure.objects.count()
+        for parent in (self.leaf, self.root):
+            with self.assertRaises(ValidationError):
+                move_category(self.root.id, parent.id)
+
+        self.root.parent = self.leaf
+        with self.assertRaises(ValidationError):
+            self.root.full_clean()
+        self.assertEqual(AppCategoryClosure.objects.count(), links)
+
+    def test_cyclic_parent_not_saved(self):
+        links = set(AppCategoryClosure.objects.values_list("ancestor", "descendant"))
+        self.root.parent = self.leaf
+        with self.assertRaises(ValidationError):
+            self.root.save()
+
+        self.root.refresh_from_db()
+        self.assertIsNone(self.root.parent_id)
+        self.assertEqual(
+            set(AppCategoryClosure.objects.values_list("ancestor", "descendant")),
+            links,
+        )
+
+    def test_closure_saved_with_the_row(self):
+        other = AppCategory.objects.create(name="Parts")
+        self.child.parent = other
+        with mock.patch(
+            "app.utils.categories.move_category", side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            self.child.save()
+
+        self.child.refresh_from_db()
+        self.assertEqual(self.child.parent_id, self.root.id)
+
+    def test_delete_detaches_the_subtree(self):
+        # A bulk update skips the signals, the closure still has the leaf
+        # under the root through the child
+        AppCategory.objects.filter(parent=self.child).update(parent=None)
+        self.child.delete()
+        self.assertEqual(self.subtree(self.root), {self.root.id})
+        self.assertEqual(self.subtree(self.leaf), {self.leaf.id})
+        self.assertFalse(
+            AppCategoryClosure.objects.filter(descendant=self.leaf)
+            .exclude(ancestor=self.leaf)
+            .exists()
+        )
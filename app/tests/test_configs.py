@@ -0,0 +1,52 @@
+from unittest import mock
+
+from ..constants import TRACKER_CONFIG_TTL
+from ..utils import configs
+from ..utils.configs import get_config
+from .utils import RedisTestCase, create_site, create_tracker
+
+
+class TrackerConfigCacheTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reset()
+        self.addCleanup(self.reset)
+        self.site = create_site()
+        self.tracker = create_tracker(self.site, name="GTS")
+
+    def reset(self):
+        configs.configs.clear()
+        configs.subscription["pubsub"] = None
+
+    def test_cached(self):
+        config = get_config(self.tracker.id)
+        with self.assertNumQueries(0):
+            self.assertIs(get_config(self.tracker.id), config)
+
+    def test_tracker_save_invalidates(self):
+        get_config(self.tracker.id)
+        self.tracker.url = "http://site.test/other"
+        self.tracker.save()
+        self.assertEqual(get_config(self.tracker.id).url, "http://site.test/other")
+
+    def test_site_save_invalidates(self):
+        get_config(self.tracker.id)
+        self.site.url = "http://new.test"
+        self.site.save()
+        self.assertEqual(get_config(self.tracker.id).site_url, "http://new.test")
+
+    def test_expired(self):
+        with mock.patch("app.utils.configs.time.monotonic", return_value=0):
+            config = get_config(self.tracker.id)
+        with mock.patch(
+            "app.utils.configs.time.monotonic", return_value=TRACKER_CONFIG_TTL
+        ):
+            self.assertIsNot(get_config(self.tracker.id), config)
+
+    def test_not_cached_without_events(self):
+        with mock.patch(
+            "app.utils.configs.subscribe_tracker_events", side_effect=ConnectionError
+        ):
+            config = get_config(self.tracker.id)
+            self.assertIsNot(get_config(self.tracker.id), config)
+        self.assertEqual(configs.configs, {})
@@ -0,0 +1,210 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from ..models import AppSiteFeed, AppTrackerChange, AppTrackerFeedMark
+from ..utils.feeds import (
+    JsonFeed,
+    RssFeed,
+    SitemapFeed,
+    get_new_feed_items,
+    parse_date,
+    update_feed_mark,
+)
+from .utils import RedisTestCase, create_site, create_tracker
+
+RSS = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Listings</title>
+<item><title>Vespa GTS 300</title><link>http://site.test/2</link>
+<guid>2</guid><pubDate>Tue, 10 Aug 2021 10:00:00 GMT</pubDate></item>
+<item><title>Vespa PX</title><link>http://site.test/1</link>
+<guid>1</guid><pubDate>Mon, 09 Aug 2021 10:00:00 GMT</pubDate></item>
+</channel></rss>"""
+
+ATOM = b"""<?xml version="1.0"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+<entry><id>tag:1</id><title>Lambretta</title>
+<link href="http://site.test/l"/><updated>2021-08-10T10:00:00Z</updated></entry>
+</feed>"""
+
+SITEMAP = b"""<?xml version="1.0"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+<url><loc>http://site.test/items/vespa-gts_300</loc><lastmod>2021-08-10</lastmod></url>
+</urlset>"""
+
+
+SITEMAP_INDEX = b"""<?xml version="1.0"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+<sitemap><loc>http://site.test/old.xml</loc><lastmod>2021-08-01</lastmod></sitemap>
+<sitemap><loc>http://site.test/new.xml</loc><lastmod>2021-08-11</lastmod></sitemap>
+</sitemapindex>"""
+
+
+class Response(object):
+    """The parts of a streamed requests response the feeds read"""
+
+    def __init__(self, body=b"", status_code=200, headers=None):
+        self.raw = io.BytesIO(body)
+        self.content = body
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.elapsed = timedelta(0)
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def items(adapter, body):
+    return list(adapter.iter_items(Response(body)))
+
+
+class FeedParsingTest(SimpleTestCase):
+    def test_rss(self):
+        parsed = items(RssFeed({}), RSS)
+        self.assertEqual([i["id"] for i in parsed], ["2", "1"])
+        self.assertEqual(parsed[0]["title"], "Vespa GTS 300")
+        self.assertEqual(parsed[0]["link"], "http://site.test/2")
+        self.assertEqual(
+            parsed[0]["published"], datetime(2021, 8, 10, 10, tzinfo=timezone.utc)
+        )
+
+    def test_atom(self):
+        (item,) = items(RssFeed({}), ATOM)
+        self.assertEqual(
+            (item["id"], item["title"], item["link"]),
+            ("tag:1", "Lambretta", "http://site.test/l"),
+        )
+
+    def test_sitemap(self):
+        (item,) = items(SitemapFeed({}), SITEMAP)
+        self.assertEqual(item["title"], "vespa gts 300")
+        self.assertEqual(item["published"].date().isoformat(), "2021-08-10")
+
+    def test_json(self):
+        body = json.dumps(
+            {"data": {"results": [{"ref": 7, "name": "GTS", "when": "2021-08-10"}]}}
+        ).encode()
+        params = {"items": "data.results", "id": "ref", "title": "name"}
+        params["published"] = "when"
+        (item,) = items(JsonFeed(params), body)
+        self.assertEqual((item["id"], item["title"], item["link"]), ("7", "GTS", None))
+
+    def test_external_entities_not_resolved(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("secret")
+        self.addCleanup(os.remove, f.name)
+        body = (
+            '<?xml version="1.0"?>'
+            f'<!DOCTYPE rss [<!ENTITY x SYSTEM "file://{f.name}">]>'
+            "<rss><channel><item><title>Vespa &x;</title><guid>1</guid></item>"
+            "</channel></rss>"
+        ).encode()
+        (item,) = items(RssFeed({}), body)
+        self.assertNotIn("secret", item["title"])
+
+    def test_parse_date(self):
+        self.assertIsNone(parse_date("not a date"))
+        self.assertEqual(parse_date("2021-08-10T10:00:00Z").hour, 10)
+
+
+class NewFeedItemsTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        site = create_site()
+        self.tracker = create_tracker(site, t_type="new_item")
+        self.rss = AppSiteFeed(site=site, kind="rss", url="http://site.test/rss")
+        self.sitemap = AppSiteFeed(
+            site=site, kind="sitemap", url="http://site.test/index.xml"
+        )
+
+    def get_items(self, feed, responses):
+        requests = []
+
+        def get(url, headers, **kwargs):
+            requests.append((url, headers))
+            if url not in responses:
+                raise AssertionError(f"{url} fetched")
+            return responses[url]
+
+        with mock.patch("app.utils.feeds.requests.get", side_effect=get):
+            items, mark = get_new_feed_items(self.tracker.id, "vespa", feed)
+        update_feed_mark(mark, items)
+        return items, requests
+
+    def test_conditional_request(self):
+        feed = {self.rss.url: Response(RSS, headers={"ETag": '"v1"'})}
+        items, _ = self.get_items(self.rss, feed)
+        # Only the newest on the first run
+        self.assertEqual([i["id"] for i in items], ["2"])
+
+        feed = {self.rss.url: Response(status_code=304)}
+        items, requests = self.get_items(self.rss, feed)
+        self.assertEqual(items, [])
+        self.assertEqual(requests[0][1]["If-None-Match"], '"v1"')
+
+    def test_sitemap_index_skips_unmodified_sitemaps(self):
+        AppTrackerFeedMark.objects.create(
+            tracker=self.tracker,
+            last_id="http://site.test/items/seen",
+            last_seen_at=datetime(2021, 8, 5, tzinfo=timezone.utc),
+        )
+        feed = {
+            self.sitemap.url: Response(SITEMAP_INDEX),
+            "http://site.test/new.xml": Response(SITEMAP),
+        }
+        items, requests = self.get_items(self.sitemap, feed)
+        self.assertEqual(
+            [url for url, _ in requests],
+            [self.sitemap.url, "http://site.test/new.xml"],
+        )
+        self.assertEqual([i["title"] for i in items], ["vespa gts 300"])
+
+    def test_sitemap_undated_entries_deduped_by_link(self):
+        AppTrackerFeedMark.objects.create(
+            tracker=self.tracker,
+            last_id="http://site.test/items/seen",
+            last_seen_at=datetime(2021, 8, 5, tzinfo=timezone.utc),
+        )
+        AppTrackerChange.objects.create(
+            tracker=self.tracker,
+            item_desc="vespa px",
+            item_url="http://site.test/items/vespa-px",
+            available=True,
+        )
+        body = b"""<?xml version="1.0"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+<url><loc>http://site.test/items/vespa-px?ref=1</loc></url>
+<url><loc>http://site.test/items/vespa-gts</loc></url>
+</urlset>"""
+        items, _ = self.get_items(self.sitemap, {self.sitemap.url: Response(body)})
+        self.assertEqual([i["title"] for i in items], ["vespa gts"])
+
+    def test_record_and_replay(self):
+        archive = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive)
+
+        with override_settings(FETCH_MODE="record", FETCH_ARCHIVE_DIR=archive):
+            recorded, _ = self.get_items(self.rss, {self.rss.url: Response(RSS)})
+        AppTrackerFeedMark.objects.all().delete()
+
+        # Served from the archive, not the network
+        with override_settings(FETCH_MODE="replay", FETCH_ARCHIVE_DIR=archive):
+            replayed, requests = self.get_items(self.rss, {})
+        self.assertEqual(requests, [])
+        self.assertEqual(replayed, recorded)
+        self.assertEqual([i["id"] for i in replayed], ["2"])
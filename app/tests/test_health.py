@@ -0,0 +1,59 @@
+from unittest import mock
+
+import requests
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+
+from ..utils.breaker import OPEN, record_result
+from ..utils.health import get_open_circuits, get_stale_trackers
+from ..utils.tracker import set_auto_method
+from .utils import RedisTestCase, create_site, create_tracker
+
+
+@override_settings(BREAKER_FAILURE_THRESHOLD=1)
+class HealthTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = create_site()
+        self.other = create_site(name="Other", url="http://other.test")
+        self.tracker = create_tracker(self.site)
+
+    def test_open_circuits(self):
+        record_result(self.tracker.id, self.site.id, requests.ConnectionError())
+        circuits = get_open_circuits()
+        self.assertEqual(
+            [(c["site"], c["state"], c["failures"]) for c in circuits],
+            [(self.site, OPEN, 1)],
+        )
+
+    def test_invalid_cron_leaves_the_tracker_out(self):
+        broken = create_tracker(self.site, cron_schedule="not a cron")
+        with mock.patch("app.utils.health.TRACKER_STALE_RUNS", 0):
+            stale = [s["tracker"] for s in get_stale_trackers()]
+        self.assertIn(self.tracker, stale)
+        self.assertNotIn(broken, stale)
+
+
+@override_settings(BREAKER_FAILURE_THRESHOLD=1)
+class AdminListTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@site.test", "admin")
+        )
+        self.site = create_site()
+        self.tracker = create_tracker(self.site, method="auto")
+
+    def test_tracker_list_auto_method(self):
+        set_auto_method(self.tracker.id, "selenium")
+        response = self.client.get(reverse("admin:app_apptracker_changelist"))
+        self.assertContains(response, "auto (selenium)")
+
+    def test_site_list_circuit(self):
+        create_site(name="Other", url="http://other.test")
+        record_result(self.tracker.id, self.site.id, requests.ConnectionError())
+        response = self.client.get(reverse("admin:app_appsite_changelist"))
+        self.assertContains(response, "open (1 failures)")
+        self.assertContains(response, "closed")
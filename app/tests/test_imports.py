@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+
+# Seconds a fresh process may spend setting up Django and importing the app,
+# checked only when set: wall-clock timings depend on the machine
+IMPORT_TIME_BUDGET = os.getenv("IMPORT_TIME_BUDGET")
+
+# Loaded only on the code paths that need them
+LAZY_MODULES = ("selenium", "webdriver_manager", "cron_converter", "lxml.html.diff")
+
+IMPORT_SCRIPT = """
+import json, sys, time
+import django
+
+start = time.perf_counter()
+django.setup()
+import app.models, app.utils.tracker, app.views, shoptrio_be.urls
+
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+class ImportTimeTest(SimpleTestCase):
+    def import_app(self):
+        # A fresh interpreter, this one has already imported everything
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT % (LAZY_MODULES,)],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        return json.loads(output.splitlines()[-1])
+
+    def test_heavy_modules_not_imported(self):
+        self.assertEqual(self.import_app()["loaded"], [])
+
+    @skipUnless(IMPORT_TIME_BUDGET, "benchmark, set IMPORT_TIME_BUDGET to run it")
+    def test_import_time_budget(self):
+        self.assertLess(self.import_app()["seconds"], float(IMPORT_TIME_BUDGET))
@@ -0,0 +1,100 @@
+import time
+from unittest import mock
+
+from django.test import override_settings
+from django_redis import get_redis_connection
+
+from ..utils.leases import (
+    acquire_lease,
+    is_stale_run,
+    last_run_key,
+    lease_key,
+    release_lease,
+    single_flight,
+)
+from .utils import RedisTestCase
+
+
+def make_task():
+    calls = []
+
+    @single_flight
+    def task(id):
+        calls.append(id)
+        return "done"
+
+    return task, calls
+
+
+class LeaseTest(RedisTestCase):
+    def test_lease_is_exclusive(self):
+        token = acquire_lease(1)
+        self.assertIsNotNone(token)
+        self.assertIsNone(acquire_lease(1))
+        self.assertIsNotNone(acquire_lease(2))
+
+        release_lease(1, token)
+        self.assertIsNotNone(acquire_lease(1))
+
+    def test_release_keeps_a_lease_taken_over(self):
+        token = acquire_lease(1, ttl=60)
+        get_redis_connection("default").delete(lease_key(1))
+        other = acquire_lease(1)
+
+        release_lease(1, token)
+        self.assertIsNone(acquire_lease(1))
+        release_lease(1, other)
+        self.assertIsNotNone(acquire_lease(1))
+
+
+@override_settings(TRACKER_BACKLOG_THRESHOLD=0)
+class SingleFlightTest(RedisTestCase):
+    def test_runs_and_releases(self):
+        task, calls = make_task()
+        self.assertEqual(task(1), "done")
+        self.assertEqual(task(1), "done")
+        self.assertEqual(calls, [1, 1])
+
+    def test_dropped_while_leased(self):
+        task, calls = make_task()
+        acquire_lease(1)
+        self.assertIsNone(task(1))
+        self.assertEqual(calls, [])
+        # Other trackers are not held up
+        task(2)
+        self.assertEqual(calls, [2])
+
+    def test_released_on_error(self):
+        @single_flight
+        def failing(id):
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            failing(1)
+        self.assertIsNotNone(acquire_lease(1))
+
+
+@override_settings(TRACKER_BACKLOG_THRESHOLD=10, TRACKER_MIN_RUN_INTERVAL=30)
+class StaleRunTest(RedisTestCase):
+    def queue_size(self, size):
+        broker = mock.Mock(**{"queue_size.return_value": size})
+        return mock.patch("django_q.brokers.get_broker", return_value=broker)
+
+    def test_recent_run_skipped_when_queue_is_behind(self):
+        get_redis_connection("default").set(last_run_key(1), time.time())
+        with self.queue_size(11):
+            self.assertTrue(is_stale_run(1))
+            self.assertFalse(is_stale_run(2))
+            task, calls = make_task()
+            self.assertIsNone(task(1))
+            self.assertEqual(calls, [])
+
+    def test_not_skipped_when_queue_is_short(self):
+        get_redis_connection("default").set(last_run_key(1), time.time())
+        with self.queue_size(10):
+            self.assertFalse(is_stale_run(1))
+
+    def test_not_skipped_after_interval(self):
+        get_redis_connection("default").set(last_run_key(1), time.time() - 31)
+        with self.queue_size(11):
+            self.assertFalse(is_stale_run(1))
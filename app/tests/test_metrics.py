@@ -0,0 +1,52 @@
+from django.test import override_settings
+from django.urls import reverse
+
+from ..utils.stats import RunStats, save_run_stats
+from .utils import RedisTestCase
+
+
+class MetricsTest(RedisTestCase):
+    def record(self, error=None, **stages):
+        stats = RunStats("price", "xpath")
+        stats.stages.update(stages)
+        stats.bytes = 2000
+        stats.error = error
+        save_run_stats(1, stats)
+
+    def get_lines(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()
+
+    def test_runs_counted(self):
+        self.record(ttfb=0.2, download=0.1)
+        self.record(error="Timeout")
+
+        lines = self.get_lines()
+        labels = 'method="xpath",status="{}",type="price"'
+        self.assertIn(f"tracker_runs_total{{{labels.format('ok')}}} 1.0", lines)
+        self.assertIn(f"tracker_runs_total{{{labels.format('error')}}} 1.0", lines)
+        self.assertIn(
+            'tracker_run_errors_total{error="Timeout",method="xpath",type="price"} 1.0',
+            lines,
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        self.record(ttfb=0.2, download=0.1)
+        self.record(browser=2)
+
+        lines = self.get_lines()
+        name = "tracker_fetch_duration_seconds"
+        self.assertIn(f'{name}_bucket{{method="xpath",le="0.25"}} 0.0', lines)
+        self.assertIn(f'{name}_bucket{{method="xpath",le="0.5"}} 1.0', lines)
+        self.assertIn(f'{name}_bucket{{method="xpath",le="2.5"}} 2.0', lines)
+        self.assertIn(f'{name}_bucket{{method="xpath",le="+Inf"}} 2.0', lines)
+        self.assertIn(f'{name}_count{{method="xpath"}} 2.0', lines)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret"
+        )
+        self.assertEqual(response.status_code, 200)
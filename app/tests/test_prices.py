@@ -0,0 +1,83 @@
+from unittest import mock
+
+from django.urls import reverse
+
+from ..models import AppPriceRollup, AppProductOffer, AppTrackerChange
+from ..utils.prices import get_best_offer, rebuild_offers, update_offer
+from ..utils.tracker import save_price, save_price_and_availability
+from .utils import RedisTestCase, create_site, create_tracker
+
+
+@mock.patch("app.utils.tracker.send_slack_message")
+class PriceChangeTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tracker = create_tracker(create_site())
+
+    def save(self, **content):
+        save_price_and_availability(
+            self.tracker.id, self.tracker.name, self.tracker.url, content
+        )
+
+    def test_saved_together(self, send):
+        with mock.patch(
+            "app.utils.tracker.update_offer", side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            self.save(price_xpath="$99.00", available_xpath="In stock")
+        with mock.patch(
+            "app.utils.tracker.record_price", side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            content = {"price_xpath": "$99.00"}
+            save_price(self.tracker.id, self.tracker.name, self.tracker.url, content)
+
+        self.assertFalse(AppTrackerChange.objects.exists())
+        self.assertFalse(AppProductOffer.objects.exists())
+        self.assertFalse(AppPriceRollup.objects.exists())
+
+    def test_rebuild_offers(self, send):
+        self.save(price_xpath="$99.00", available_xpath="")
+        self.save(price_xpath="$89.00")
+        # An availability only change
+        AppTrackerChange.objects.create(tracker=self.tracker, available=True)
+        AppProductOffer.objects.update(price=None, available=None)
+
+        self.assertEqual(rebuild_offers(), 1)
+        offer = AppProductOffer.objects.get(tracker=self.tracker)
+        self.assertEqual((offer.price, offer.available), (89, True))
+        self.assertEqual(AppPriceRollup.objects.get().last, 89)
+
+
+class OfferIndexTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = create_tracker(create_site())
+        self.product = self.first.product
+        self.second = create_tracker(
+            create_site("Other", "http://other.test"), product=self.product
+        )
+        self.third = create_tracker(
+            create_site("Third", "http://third.test"), product=self.product
+        )
+
+    def test_best_offer(self):
+        update_offer(self.first.id, price=90, available=True)
+        update_offer(self.second.id, price=80, available=False)
+        update_offer(self.third.id, available=True)
+        self.assertEqual(get_best_offer(self.product.id).tracker_id, self.first.id)
+
+        # Trackers without a product have no offer
+        update_offer(create_tracker(create_site(), product=None).id, price=10)
+        self.assertEqual(get_best_offer(self.product.id).price, 90)
+
+    def test_offers_view(self):
+        update_offer(self.first.id, price=90)
+        update_offer(self.second.id, price=80, available=False)
+        update_offer(self.third.id, available=True)
+
+        url = reverse("product-offers", args=[self.product.id])
+        data = self.client.get(url).json()
+        self.assertEqual(
+            [(o["site"], o["price"]) for o in data["offers"]],
+            [("Other", 80), ("Site", 90), ("Third", None)],
+        )
+        self.assertEqual(data["best"]["tracker"], self.first.id)
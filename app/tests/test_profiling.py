@@ -0,0 +1,62 @@
+import marshal
+import time
+import zlib
+
+from django.test import override_settings
+
+from ..models import AppTrackerProfile
+from ..utils.profiling import profile_next_runs, profiled, should_profile
+from .utils import RedisTestCase, create_site, create_tracker
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+@override_settings(PROFILE_SAMPLE_RATE=0)
+class ProfilingTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tracker = create_tracker(create_site())
+
+    def test_next_runs(self):
+        profile_next_runs(self.tracker.id, 2)
+        self.assertEqual(
+            [should_profile(self.tracker.id) for _ in range(3)], [True, True, False]
+        )
+
+    @override_settings(PROFILER="cprofile")
+    def test_cprofile(self):
+        task = profiled(lambda id: busy(0.01))
+        task(self.tracker.id)
+        self.assertFalse(AppTrackerProfile.objects.exists())
+
+        profile_next_runs(self.tracker.id, 1)
+        task(self.tracker.id)
+        profile = AppTrackerProfile.objects.get()
+        self.assertEqual((profile.profiler, profile.error), ("cprofile", None))
+        self.assertIn("busy", profile.summary)
+        self.assertTrue(marshal.loads(zlib.decompress(profile.data)))
+
+    @override_settings(PROFILER="sampler", PROFILE_SAMPLE_INTERVAL=0.001)
+    def test_sampler_records_errors(self):
+        def task(id):
+            busy(0.05)
+            raise ValueError
+
+        profile_next_runs(self.tracker.id, 1)
+        with self.assertRaises(ValueError):
+            profiled(task)(self.tracker.id)
+        profile = AppTrackerProfile.objects.get()
+        self.assertEqual((profile.profiler, profile.error), ("sampler", "ValueError"))
+        self.assertIn("busy (test_profiling.py", zlib.decompress(profile.data).decode())
+
+    @override_settings(PROFILER="cprofile", PROFILE_KEEP=2)
+    def test_keeps_the_latest(self):
+        task = profiled(lambda id: None)
+        profile_next_runs(self.tracker.id, 3)
+        for _ in range(3):
+            task(self.tracker.id)
+        self.assertEqual(AppTrackerProfile.objects.count(), 2)
@@ -0,0 +1,76 @@
+import asyncio
+from unittest import mock
+
+from django.test import TransactionTestCase, override_settings
+from django_redis import get_redis_connection
+
+from ..models import AppSiteFeed, AppTrackerChange, AppTrackerProfile
+from ..utils.configs import configs
+from ..utils.profiling import profile_next_runs
+from ..utils.runner import TrackerRunner
+from ..utils.stats import get_run_stats
+from .test_feeds import RSS, Response
+from .utils import create_site, create_tracker
+
+PAGE = b"<html><body><span class='price'>$99.00</span></body></html>"
+
+
+@override_settings(PROFILE_SAMPLE_RATE=0, PROFILER="sampler")
+@mock.patch("app.utils.tracker.send_slack_message")
+class TrackerRunnerTest(TransactionTestCase):
+    # The runner reads and writes from its own threads
+    def setUp(self):
+        get_redis_connection("default").flushdb()
+        configs.clear()
+        self.site = create_site()
+
+    def run_trackers(self, *trackers):
+        for tracker in trackers:
+            tracker.task_name = tracker.get_task_name()
+        runner = TrackerRunner(concurrency=2, parse_workers=1)
+        try:
+            return asyncio.run(runner.run(trackers))
+        finally:
+            runner.close()
+
+    def test_feed_trackers_read_the_feed(self, send):
+        AppSiteFeed.objects.create(
+            site=self.site, kind="rss", url="http://site.test/feed?q={search_key}"
+        )
+        tracker = create_tracker(self.site, t_type="new_item", search_key="vespa")
+
+        with mock.patch(
+            "app.utils.feeds.requests.get", side_effect=lambda *a, **k: Response(RSS)
+        ), mock.patch("app.utils.tracker.fetch_page") as fetch_page:
+            self.assertEqual(self.run_trackers(tracker)["ok"], 1)
+            # The high-water mark keeps the next run from alerting again
+            self.assertEqual(self.run_trackers(tracker)["ok"], 1)
+
+        fetch_page.assert_not_called()
+        self.assertEqual(
+            list(AppTrackerChange.objects.values_list("item_url", flat=True)),
+            ["http://site.test/2"],
+        )
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(get_run_stats(tracker.id)[0]["method"], "feed")
+
+    def test_stats_and_profiles_like_the_tasks(self, send):
+        xpaths = {"price_xpath": "//span[@class='price']"}
+        tracker = create_tracker(self.site, params={"xpaths": [xpaths]})
+        profile_next_runs(tracker.id, 1)
+
+        with mock.patch("app.utils.tracker.fetch_page", return_value=PAGE):
+            self.assertEqual(self.run_trackers(tracker)["ok"], 1)
+            self.assertEqual(self.run_trackers(tracker)["ok"], 1)
+
+        self.assertEqual(AppTrackerChange.objects.get().price, 99)
+        self.assertEqual(AppTrackerProfile.objects.filter(tracker=tracker).count(), 1)
+        runs = get_run_stats(tracker.id)
+        self.assertEqual([run["method"] for run in runs], ["xpath", "xpath"])
+        self.assertEqual([run["error"] for run in runs], [None, None])
+
+    def test_failed_run(self, send):
+        tracker = create_tracker(self.site, params={"xpaths": [{"price_xpath": "//b"}]})
+        with mock.patch("app.utils.tracker.fetch_page", return_value=PAGE):
+            self.assertEqual(self.run_trackers(tracker)["failed"], 1)
+        self.assertEqual(get_run_stats(tracker.id)[0]["error"], "IndexError")
@@ -0,0 +1,67 @@
+from django.test import TestCase
+
+from ..models import AppTracker
+from ..utils.scheduler import TrackerScheduler
+from .utils import create_site, create_tracker
+
+
+class TrackerSchedulerTest(TestCase):
+    def setUp(self):
+        site = create_site()
+        self.hourly = create_tracker(site, frequency=60)
+        self.often = create_tracker(site, frequency=5)
+        self.scheduler = TrackerScheduler(runner=None, batch_size=10)
+        self.scheduler.load()
+        self.now = self.scheduler.heap[0][0]
+
+    def pop_ids(self, now):
+        return [t.id for t in self.scheduler.pop_due(now)]
+
+    def test_heap_order(self):
+        # Every tracker runs once at load, then follows its frequency
+        self.assertEqual(
+            sorted(self.pop_ids(self.now)), sorted([self.hourly.id, self.often.id])
+        )
+        self.assertEqual(self.pop_ids(self.now + 60), [])
+        self.assertEqual(self.pop_ids(self.now + 5 * 60), [self.often.id])
+        self.assertEqual(self.pop_ids(self.now + 59 * 60), [self.often.id])
+        # Same due time: by id
+        self.assertEqual(
+            self.pop_ids(self.now + 60 * 60), [self.hourly.id, self.often.id]
+        )
+
+    def test_batch_size_and_running(self):
+        self.scheduler.batch_size = 1
+        self.assertEqual(self.pop_ids(self.now), [self.hourly.id])
+        self.assertEqual(self.pop_ids(self.now), [self.often.id])
+
+        # A run still in flight is skipped, not queued behind it
+        self.scheduler.running.add(self.often.id)
+        self.assertEqual(self.pop_ids(self.now + 5 * 60), [])
+        self.scheduler.running.clear()
+        self.assertEqual(self.pop_ids(self.now + 10 * 60), [self.often.id])
+
+    def test_refresh(self):
+        self.pop_ids(self.now)
+        self.often.frequency = 30
+        self.often.save()
+        # A site event only reloads the other one, keeping its schedule
+        self.scheduler.refresh([self.often.id, self.hourly.id])
+
+        self.assertEqual(self.pop_ids(self.now + 1), [self.often.id])
+        self.assertEqual(self.pop_ids(self.now + 29 * 60), [])
+        self.assertEqual(self.pop_ids(self.now + 31 * 60), [self.often.id])
+
+    def test_resync_missed_events(self):
+        self.pop_ids(self.now)
+        other = create_tracker(self.hourly.site, frequency=60)
+        # Bulk updates skip the signals, hence the tracker events
+        AppTracker.objects.filter(id=self.hourly.id).update(active=False)
+        AppTracker.objects.filter(id=self.often.id).update(frequency=60)
+
+        self.assertEqual(self.scheduler.resync(), 3)
+        self.assertEqual(
+            sorted(self.pop_ids(self.now + 1)), sorted([other.id, self.often.id])
+        )
+        self.assertEqual(self.pop_ids(self.now + 30 * 60), [])
+        self.assertEqual(self.scheduler.resync(), 0)
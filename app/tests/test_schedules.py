@@ -0,0 +1,96 @@
+from django.conf import settings
+from django_q.models import Schedule
+
+from ..models import AppTracker
+from ..utils.schedules import TASK_PREFIX, sync_schedules
+from ..utils.tracker import set_auto_method
+from .utils import RedisTestCase, create_product, create_site, create_tracker
+
+LIGHT = settings.Q_CLUSTERS["light"]["name"]
+BROWSER = settings.Q_CLUSTERS["browser"]["name"]
+
+
+def get_schedule(tracker):
+    return Schedule.objects.get(name=str(tracker.id))
+
+
+class AutoClusterTest(RedisTestCase):
+    def test_follows_the_auto_method(self):
+        tracker = create_tracker(create_site(), method="auto")
+        self.assertEqual(get_schedule(tracker).cluster, LIGHT)
+
+        set_auto_method(tracker.id, "selenium")
+        self.assertEqual(get_schedule(tracker).cluster, BROWSER)
+        # Saves keep it there
+        tracker.save()
+        self.assertEqual(get_schedule(tracker).cluster, BROWSER)
+
+        set_auto_method(tracker.id, "xpath")
+        self.assertEqual(get_schedule(tracker).cluster, LIGHT)
+
+    def test_method_clusters(self):
+        site = create_site()
+        for method, cluster in (("xpath", LIGHT), ("selenium", BROWSER)):
+            tracker = create_tracker(site, method=method)
+            self.assertEqual(get_schedule(tracker).cluster, cluster)
+
+
+class SyncSchedulesTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        site = create_site()
+        product = create_product()
+        # Without the post_save signals, so without schedules
+        AppTracker.objects.bulk_create(
+            AppTracker(
+                name=f"Tracker {i}", url=f"{site.url}/{i}", site=site, product=product
+            )
+            for i in range(3)
+        )
+        self.trackers = list(AppTracker.objects.order_by("id"))
+
+    def test_create_update_delete(self):
+        counts = sync_schedules()
+        self.assertEqual(counts, {"created": 3, "updated": 0, "deleted": 0})
+        self.assertEqual(sync_schedules(), {"created": 0, "updated": 0, "deleted": 0})
+
+        first, second, _ = self.trackers
+        first.frequency = 15
+        first.save()
+        second.cron_schedule = "0 * * * *"
+        AppTracker.objects.filter(id=second.id).update(cron_schedule="0 * * * *")
+        AppTracker.objects.filter(id=self.trackers[2].id).update(active=False)
+
+        counts = sync_schedules(AppTracker.objects.all())
+        self.assertEqual(counts, {"created": 0, "updated": 1, "deleted": 1})
+        self.assertEqual(get_schedule(first).minutes, 15)
+        schedule = get_schedule(second)
+        self.assertEqual((schedule.schedule_type, schedule.cron), ("C", "0 * * * *"))
+        self.assertEqual(schedule.args, repr((second.id,)))
+        self.assertEqual(Schedule.objects.count(), 2)
+
+    def test_repeats_kept_unless_reset(self):
+        sync_schedules()
+        tracker = self.trackers[0]
+        Schedule.objects.filter(name=str(tracker.id)).update(repeats=5)
+
+        sync_schedules([tracker])
+        self.assertEqual(get_schedule(tracker).repeats, 5)
+        sync_schedules([tracker], reset_repeats=True)
+        self.assertEqual(get_schedule(tracker).repeats, -1)
+
+    def test_prune(self):
+        sync_schedules()
+        duplicate = get_schedule(self.trackers[0])
+        duplicate.pk = None
+        duplicate.save()
+        Schedule.objects.create(name="999", func=TASK_PREFIX + "price_and_avail")
+        Schedule.objects.create(name="other", func="app.tasks.cleanup")
+
+        # Only a full sync prunes
+        self.assertEqual(sync_schedules(self.trackers)["deleted"], 1)
+        self.assertEqual(sync_schedules()["deleted"], 1)
+        self.assertEqual(
+            sorted(Schedule.objects.values_list("name", flat=True)),
+            sorted([str(t.id) for t in self.trackers] + ["other"]),
+        )
@@ -0,0 +1,67 @@
+from django.test import SimpleTestCase
+
+from ..utils.stats import (
+    add_bytes,
+    get_run_percentiles,
+    instrumented,
+    percentile,
+    rollup_runs,
+    set_method,
+    stage,
+)
+from .utils import RedisTestCase
+
+
+def run(total, error=None, **stages):
+    return {"at": total, "total": total, "stages": stages, "bytes": 0, "error": error}
+
+
+class RollupTest(SimpleTestCase):
+    def test_percentile(self):
+        self.assertIsNone(percentile([], 50))
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile([3], 95), 3)
+
+    def test_rollup(self):
+        runs = [run(3, xpath=0.1), run(1, error="Timeout"), run(2, xpath=0.3)]
+        rollup = rollup_runs(runs)
+        self.assertEqual((rollup["runs"], rollup["errors"]), (3, 1))
+        self.assertEqual(rollup["last_run"], 3)
+        self.assertEqual(rollup["total"], (2, 3))
+        self.assertEqual(rollup["xpath"], (0.1, 0.3))
+        self.assertNotIn("parse", rollup)
+        self.assertEqual(rollup_runs([]), {"runs": 0, "errors": 0})
+
+
+class InstrumentedTest(RedisTestCase):
+    def test_run_recorded(self):
+        @instrumented("price")
+        def task(id):
+            set_method("xpath")
+            add_bytes(100)
+            with stage("parse"):
+                pass
+
+        task(1)
+        rollup = get_run_percentiles(1)
+        self.assertEqual((rollup["runs"], rollup["errors"]), (1, 0))
+        self.assertEqual(rollup["bytes"], (100, 100))
+        self.assertIn("parse", rollup)
+
+    def test_failed_run_recorded(self):
+        @instrumented("price")
+        def task(id):
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            task(1)
+        self.assertEqual(get_run_percentiles(1)["errors"], 1)
+
+    def test_outside_a_run(self):
+        # Helpers are no-ops without a run in progress
+        add_bytes(100)
+        with stage("parse"):
+            pass
+        self.assertEqual(get_run_percentiles(1), {"runs": 0, "errors": 0})
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from ..models import AppTrackerChange
+from ..stream import change_stream
+from ..utils.change_feed import change_event
+from .utils import RedisTestCase, create_site, create_tracker
+
+
+class FakeListener(object):
+    """Queues the given published events, then ends the stream"""
+
+    def __init__(self, events):
+        self.events = events
+        self.ready = threading.Event()
+        self.ready.set()
+
+    def add(self, stream):
+        for event in self.events + [None]:
+            stream.push(event)
+
+    def remove(self, stream):
+        pass
+
+
+class ChangeStreamTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tracker = create_tracker(create_site())
+        self.changes = [
+            AppTrackerChange.objects.create(
+                tracker=self.tracker, price=price, available=True
+            )
+            for price in range(3)
+        ]
+
+    def stream(self, published, last_id):
+        sent = []
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "method": "GET",
+            "query_string": f"last_event_id={last_id}".encode(),
+            "headers": [],
+        }
+        with mock.patch("app.stream.listener", FakeListener(published)):
+            async_to_sync(change_stream)(scope, receive, send)
+        body = b"".join(m.get("body", b"") for m in sent).decode()
+        return [int(line[4:]) for line in body.splitlines() if line[:4] == "id: "]
+
+    def event(self, change):
+        return change_event(change, self.tracker.site_id, self.tracker.product_id)
+
+    def test_catch_up_then_live_in_commit_order(self):
+        first, late, last = self.changes
+        # Committed after the catch-up read, after a higher id
+        late_event = self.event(late)
+        late.delete()
+
+        ids = self.stream([self.event(last), late_event], first.id)
+        # The published last repeats the catch-up, the late one still goes
+        self.assertEqual(ids, [last.id, late_event["id"]])
@@ -0,0 +1,104 @@
+import json
+
+from django.test import SimpleTestCase, override_settings
+
+from ..utils.structured import extract_offer, get_structured_content
+
+URL = "https://www.site.test/p/gts-300?ref=list"
+PARAMS = {"xpaths": [{"price_xpath": "//span", "available_xpath": "//b"}]}
+
+
+def json_ld(*nodes):
+    return "".join(
+        f'<script type="application/ld+json">{json.dumps(node)}</script>'
+        for node in nodes
+    )
+
+
+def product(url="https://site.test/p/gts-300/", offers=None, **fields):
+    offers = offers or offer(9999)
+    return {"@type": "Product", "url": url, "offers": offers, **fields}
+
+
+def offer(price, currency="AUD", availability="https://schema.org/InStock"):
+    return {
+        "@type": "Offer",
+        "price": price,
+        "priceCurrency": currency,
+        "availability": availability,
+    }
+
+
+def page(*parts):
+    return f"<html><head>{''.join(parts)}</head><body></body></html>".encode()
+
+
+@override_settings(PRICE_CURRENCY="AUD")
+class StructuredDataTest(SimpleTestCase):
+    def test_offer_of_the_tracked_product(self):
+        related = product("https://site.test/p/gts-125", offer(5999))
+        content = get_structured_content(page(json_ld(related, product())), PARAMS, URL)
+        self.assertEqual(
+            content, {"price_xpath": "9999.0", "available_xpath": "in stock"}
+        )
+
+    def test_matched_by_id_in_a_graph(self):
+        graph = {
+            "@graph": [
+                product(url=None, **{"@id": "https://site.test/p/gts-300#product"}),
+            ]
+        }
+        self.assertEqual(extract_offer(page(json_ld(graph)), URL)["price"], 9999)
+
+    def test_other_products_only(self):
+        carousel = product("https://site.test/p/gts-125", offer(5999))
+        self.assertIsNone(get_structured_content(page(json_ld(carousel)), PARAMS, URL))
+
+    def test_aggregate_offer_range_rejected(self):
+        aggregate = {"@type": "AggregateOffer", "lowPrice": 5999, "highPrice": 9999}
+        self.assertIsNone(extract_offer(page(json_ld(product(offers=aggregate))), URL))
+
+        aggregate["offers"] = [offer(9999)]
+        offer_data = extract_offer(page(json_ld(product(offers=aggregate))), URL)
+        self.assertEqual(offer_data["price"], 9999)
+
+    def test_other_currency_rejected(self):
+        offers = [offer(6500, "USD"), offer(9999)]
+        offer_data = extract_offer(page(json_ld(product(offers=offers))), URL)
+        self.assertEqual(offer_data["price"], 9999)
+
+        usd = page(json_ld(product(offers=offer(6500, "USD"))))
+        self.assertIsNone(get_structured_content(usd, PARAMS, URL))
+        content = get_structured_content(usd, {**PARAMS, "currency": "usd"}, URL)
+        self.assertEqual(content["price_xpath"], "6500.0")
+
+    def test_variants_fall_back_to_xpaths(self):
+        offers = [offer(9999), offer(10999)]
+        self.assertIsNone(
+            get_structured_content(page(json_ld(product(offers=offers))), PARAMS, URL)
+        )
+
+    def test_meta_tags(self):
+        tags = (
+            '<meta property="og:url" content="https://site.test/p/gts-300">'
+            '<meta property="product:price:amount" content="9,999.00">'
+            '<meta property="product:price:currency" content="AUD">'
+            '<meta property="product:availability" content="out of stock">'
+        )
+        content = get_structured_content(page(tags), PARAMS, URL)
+        self.assertEqual(content, {"price_xpath": "9999.0", "available_xpath": ""})
+
+        other = tags.replace("gts-300", "gts-125")
+        self.assertIsNone(get_structured_content(page(other), PARAMS, URL))
+
+    def test_ambiguous_microdata_ignored(self):
+        items = (
+            '<span itemprop="price" content="9999"></span>'
+            '<span itemprop="price" content="5999"></span>'
+            '<link itemprop="availability" href="https://schema.org/InStock">'
+        )
+        self.assertEqual(extract_offer(page(items), URL), {"available": True})
+
+    def test_opt_out(self):
+        params = {**PARAMS, "structured_data": False}
+        self.assertIsNone(get_structured_content(page(json_ld(product())), params, URL))
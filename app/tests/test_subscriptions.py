@@ -0,0 +1,84 @@
+from ..models import AppUserProfile, AppUserSubscription
+from ..utils.prices import update_offer
+from ..utils.subscriptions import get_product_best, match_subscriptions
+from .utils import RedisTestCase, create_site, create_tracker
+
+
+class SubscriptionIndexTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        site = create_site()
+        self.first = create_tracker(site)
+        self.second = create_tracker(site)
+        self.user = user = AppUserProfile.objects.create(
+            uid="1",
+            username="user",
+            first_name="",
+            last_name="",
+            email="",
+            phone="",
+            comments="",
+        )
+        self.subscription = AppUserSubscription.objects.create(
+            user=user, tracker=self.first, paused=False, type="price", target_price=50
+        )
+
+    def test_target_crossed(self):
+        self.assertEqual(
+            match_subscriptions(self.first.id, 60, 45), [self.subscription.id]
+        )
+        self.assertEqual(match_subscriptions(self.first.id, 45, 40), [])
+
+    def test_moved_subscription_leaves_old_tracker(self):
+        # Load both indexes before the move
+        match_subscriptions(self.first.id, 60, 45)
+        match_subscriptions(self.second.id, 60, 45)
+
+        self.subscription.tracker = self.second
+        self.subscription.save()
+
+        self.assertEqual(match_subscriptions(self.first.id, 60, 45), [])
+        self.assertEqual(
+            match_subscriptions(self.second.id, 60, 45), [self.subscription.id]
+        )
+
+    def subscribe_product(self, **fields):
+        return AppUserSubscription.objects.create(
+            user=self.user,
+            product=self.first.product,
+            paused=False,
+            type="price",
+            target_price=50,
+            **fields,
+        )
+
+    def change_price(self, tracker, old_price, new_price):
+        product = get_product_best(tracker.id)
+        update_offer(tracker.id, price=new_price)
+        return match_subscriptions(tracker.id, old_price, new_price, product)
+
+    def test_tracker_and_product_subscription_matches_once(self):
+        subscription = self.subscribe_product(tracker=self.first)
+        update_offer(self.first.id, price=60)
+        self.assertEqual(
+            self.change_price(self.first, 60, 45),
+            [self.subscription.id, subscription.id],
+        )
+
+    def test_product_targets_use_the_best_offer(self):
+        subscription = self.subscribe_product()
+        other = create_tracker(self.first.site, product=self.first.product)
+        update_offer(self.first.id, price=60)
+        update_offer(other.id, price=40)
+
+        # The product was already below the target elsewhere
+        self.assertEqual(self.change_price(self.first, 60, 45), [self.subscription.id])
+
+        # An offer back in stock can lower the best price
+        update_offer(other.id, available=False)
+        update_offer(self.first.id, price=55)
+        product = get_product_best(other.id)
+        update_offer(other.id, available=True)
+        self.assertEqual(
+            match_subscriptions(other.id, 40, 40, product), [subscription.id]
+        )
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase
+
+from ..models import AppTrackerChange
+from ..utils.prices import record_price
+from ..utils.timeseries import get_price_series, lttb, product_price_sources
+from .utils import RedisTestCase, create_site, create_tracker
+
+START = datetime(2021, 8, 10, 10, tzinfo=timezone.utc)
+
+
+class PriceSeriesTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = create_tracker(create_site())
+        self.second = create_tracker(
+            create_site("Other", "http://other.test"), product=self.first.product
+        )
+
+    def change(self, tracker, price, minutes):
+        at = START + timedelta(minutes=minutes)
+        change = AppTrackerChange.objects.create(
+            tracker=tracker, price=price, available=True
+        )
+        AppTrackerChange.objects.filter(id=change.id).update(created_at=at)
+        record_price(tracker.id, price, at)
+
+    def series(self, interval, **kwargs):
+        sources = product_price_sources(self.first.product_id)
+        return [
+            (b["tracker_id"], b["open"], b["low"], b["high"], b["last"], b["changes"])
+            for b in get_price_series(*sources, interval, **kwargs)
+        ]
+
+    def test_offers_are_not_mixed(self):
+        self.change(self.first, 100, 0)
+        self.change(self.second, 80, 10)
+        self.change(self.first, 90, 20)
+        self.change(self.second, 85, 30)
+
+        expected = [
+            (self.first.id, 100, 90, 100, 90, 2),
+            (self.second.id, 80, 80, 85, 85, 2),
+        ]
+        self.assertEqual(self.series("hour"), expected)
+        self.assertEqual(self.series("day"), expected)
+
+    def test_points_apply_per_offer(self):
+        for hour in range(6):
+            self.change(self.first, 100 + hour, hour * 60)
+        self.change(self.second, 80, 0)
+
+        series = self.series("hour", points=3)
+        self.assertEqual([b[0] for b in series].count(self.first.id), 3)
+        self.assertEqual([b[0] for b in series].count(self.second.id), 1)
+
+    @skipUnless(connection.vendor == "postgresql", "ordered array aggregates")
+    def test_sql_matches_portable_fold(self):
+        self.change(self.first, 100, 0)
+        self.change(self.first, 90, 20)
+        self.change(self.second, 80, 10)
+
+        sql = self.series("hour"), self.series("week")
+        with mock.patch("app.utils.timeseries.has_array_agg", return_value=False):
+            self.assertEqual((self.series("hour"), self.series("week")), sql)
+
+
+class LttbTest(SimpleTestCase):
+    def test_keeps_ends_and_extremes(self):
+        rows = [(x, 10) for x in range(20)]
+        rows[7] = (7, 100)
+        rows[13] = (13, -50)
+
+        sampled = lttb(rows, 5, x=lambda r: r[0], y=lambda r: r[1])
+        self.assertEqual(len(sampled), 5)
+        self.assertEqual((sampled[0], sampled[-1]), (rows[0], rows[-1]))
+        self.assertIn((7, 100), sampled)
+        self.assertIn((13, -50), sampled)
+
+    def test_small_series_unchanged(self):
+        rows = [(x, x) for x in range(4)]
+        self.assertEqual(lttb(rows, 10, x=lambda r: r[0], y=lambda r: r[1]), rows)
+        self.assertEqual(lttb(rows, 2, x=lambda r: r[0], y=lambda r: r[1]), rows)
@@ -0,0 +1,46 @@
+from unittest import mock
+
+from ..models import AppProductOffer, AppTrackerChange
+from ..utils.prices import get_best_offer
+from ..utils.tracker import save_price_and_availability
+from .utils import RedisTestCase, create_site, create_tracker
+
+
+@mock.patch("app.utils.tracker.send_slack_message")
+class SavePriceAndAvailabilityTest(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tracker = create_tracker(create_site())
+
+    def save(self, **content):
+        save_price_and_availability(
+            self.tracker.id, self.tracker.name, self.tracker.url, content
+        )
+
+    def test_no_availability_xpath_is_unknown(self, send):
+        self.save(price_xpath="$99.00")
+        change = AppTrackerChange.objects.get()
+        self.assertIsNone(change.available)
+        self.assertEqual(get_best_offer(self.tracker.product_id).price, 99)
+        # Only the price alert
+        self.assertEqual(send.call_count, 1)
+
+    def test_unknown_availability_keeps_the_offer(self, send):
+        self.save(price_xpath="$99.00", available_xpath="In stock")
+        self.save(price_xpath="$89.00")
+        offer = AppProductOffer.objects.get(tracker=self.tracker)
+        self.assertEqual((offer.price, offer.available), (89, True))
+
+        # Same price, unknown availability: nothing new
+        self.save(price_xpath="$89.00")
+        self.assertEqual(AppTrackerChange.objects.count(), 2)
+
+    def test_availability_change(self, send):
+        self.save(price_xpath="$99.00", available_xpath="")
+        self.save(price_xpath="$99.00", available_xpath="In stock")
+        self.assertEqual(
+            list(AppTrackerChange.objects.order_by("id").values_list("available")),
+            [(False,), (True,)],
+        )
+        self.assertTrue(AppProductOffer.objects.get(tracker=self.tracker).available)
+        self.assertEqual(send.call_args[0][0], f"{self.tracker.name} is avalable!")
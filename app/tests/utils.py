@@ -0,0 +1,34 @@
+from django.test import TestCase
+from django_redis import get_redis_connection
+
+from ..models import AppBrand, AppCategory, AppProduct, AppSite, AppTracker
+
+
+class RedisTestCase(TestCase):
+    """Starts every test with an empty Redis database"""
+
+    def setUp(self):
+        get_redis_connection("default").flushdb()
+
+
+def create_site(name="Site", url="http://site.test"):
+    return AppSite.objects.create(name=name, url=url)
+
+
+def create_product(name="GTS"):
+    brand = AppBrand.objects.create(name="Vespa")
+    category = AppCategory.objects.create(name="Scooters")
+    return AppProduct.objects.create(category=category, brand=brand, name=name)
+
+
+def create_tracker(site, **fields):
+    fields = {
+        "name": "Tracker",
+        "t_type": "price_and_avail",
+        "method": "xpath",
+        "url": f"{site.url}/item",
+        **fields,
+    }
+    if "product" not in fields:
+        fields["product"] = create_product()
+    return AppTracker.objects.create(site=site, **fields)
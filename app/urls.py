@@ -1,16 +1,36 @@
-# myapi/urls.py
-from django.urls import include, path
-from rest_framework import routers
+# app/urls.py
+from django.urls import path
 from . import views
 
-router = routers.DefaultRouter()
-router.register(r'sites', views.SiteViewSet)
-router.register(r'pages', views.PageViewSet)
-router.register(r'pagechanges', views.PageChangeViewSet)
-
-# Wire up our API using automatic URL routing.
-# Additionally, we include login URLs for the browsable API.
 urlpatterns = [
-    path('', include(router.urls)),
-    path('api-auth/', include('rest_framework.urls', namespace='rest_framework'))
-]
\ No newline at end of file
+    path("sites/", views.site_list, name="sites"),
+    path("sites/<int:site_id>/", views.site_detail, name="site"),
+    path("trackers/", views.tracker_list, name="trackers"),
+    path("trackers/<int:tracker_id>/", views.tracker_detail, name="tracker"),
+    path(
+        "trackers/<int:tracker_id>/changes/",
+        views.tracker_changes,
+        name="tracker-changes",
+    ),
+    path("changes/", views.change_list, name="changes"),
+    path(
+        "trackers/<int:tracker_id>/prices/",
+        views.tracker_prices,
+        name="tracker-prices",
+    ),
+    path(
+        "products/<int:product_id>/prices/",
+        views.product_prices,
+        name="product-prices",
+    ),
+    path(
+        "products/<int:product_id>/offers/",
+        views.product_offers,
+        name="product-offers",
+    ),
+    path(
+        "categories/<int:category_id>/prices/",
+        views.category_prices,
+        name="category-prices",
+    ),
+]
@@ -0,0 +1,117 @@
+import hashlib
+from functools import wraps
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+
+from ..constants import API_CACHE_TTL
+
+# Collections with their own version, bumped on any save in them
+TRACKERS = "trackers"
+SITES = "sites"
+CHANGES = "changes"
+
+
+def version_key(kind, id=None):
+    return f"api:version:{kind}" if id is None else f"api:version:{kind}:{id}"
+
+
+def tracker_key(tracker_id):
+    # Bumped when the tracker or one of its changes is saved
+    return version_key("tracker", tracker_id)
+
+
+def bump_versions(keys):
+    """Invalidate every cached response depending on these versions"""
+    try:
+        cache.set_many({key: uuid4().hex for key in keys}, None)
+    except Exception as e:
+        print(type(e).__name__, "bumping the API cache versions")
+
+
+def invalidate_trackers(tracker_ids):
+    # Tracker saves/deletes, also by bulk updates that skip the signals
+    bump_versions([version_key(TRACKERS)] + [tracker_key(id) for id in tracker_ids])
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Never bumped or evicted: start a new version, so responses
+            # cached under an evicted one are never served again
+            cache.add(key, uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_etag(request, versions):
+    data = "\n".join([request.get_full_path(), *versions])
+    return hashlib.md5(data.encode()).hexdigest()
+
+
+def get_response(key, view, request, *args, **kwargs):
+    # The cached response, rendered and cached on a miss
+    try:
+        cached = cache.get(key)
+    except Exception as e:
+        print(type(e).__name__, "reading the API cache")
+        cached = None
+    if cached is not None:
+        return HttpResponse(cached["content"], content_type=cached["content_type"])
+
+    response = view(request, *args, **kwargs)
+    if response.status_code == 200:
+        try:
+            cache.set(
+                key,
+                {"content": response.content, "content_type": response["Content-Type"]},
+                API_CACHE_TTL,
+            )
+        except Exception as e:
+            print(type(e).__name__, "saving to the API cache")
+    return response
+
+
+def cached_response(get_keys):
+    """Cache the 200 responses of a GET view in Redis, with ETags.
+
+    A response is cached under the versions it depends on: saves bump the
+    versions (see the models signals) instead of deleting responses, so the
+    cache key and ETag change and stale entries simply expire. A matching
+    If-None-Match gets a 304 without reading the cached body.
+
+    Args:
+        get_keys (function): (request, **view kwargs) -> the version keys
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                versions = get_versions(get_keys(request, **kwargs))
+            except Exception as e:
+                # Redis unavailable, serve from the database
+                print(type(e).__name__, "reading the API cache versions")
+                return view(request, *args, **kwargs)
+
+            digest = get_etag(request, versions)
+            etag = quote_etag(digest)
+            if etag in parse_etags(request.headers.get("If-None-Match", "")):
+                response = HttpResponseNotModified()
+            else:
+                key = f"api:response:{digest}"
+                response = get_response(key, view, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response["ETag"] = etag
+            # Clients may keep it, but must revalidate before using it
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,204 @@
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import time
+from datetime import timedelta
+from urllib.parse import urljoin
+
+import requests
+from django.conf import settings
+from lxml import html
+from requests.structures import CaseInsensitiveDict
+
+from .stats import add_bytes, add_stage
+
+# "http": requests responses, "browser": Selenium page sources
+KINDS = ("http", "browser")
+
+
+def archive_path(url, kind="http"):
+    name = hashlib.sha1(url.encode()).hexdigest()
+    return os.path.join(settings.FETCH_ARCHIVE_DIR, kind, f"{name}.json.gz")
+
+
+def save_entry(url, kind, entry):
+    path = archive_path(url, kind)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written aside and renamed, a replay never reads half an entry
+    with gzip.open(f"{path}.tmp", "wt") as f:
+        json.dump(entry, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_entry(url, kind="http"):
+    """Archived response of a url
+
+    Raises:
+        IOError: The url was never recorded
+    """
+    path = archive_path(url, kind)
+    if not os.path.exists(path):
+        raise IOError(f"No {kind} recording of {url} in {settings.FETCH_ARCHIVE_DIR}")
+    with gzip.open(path, "rt") as f:
+        return json.load(f)
+
+
+def record_response(url, response, elapsed):
+    """Archive a requests response (status, headers, body and timings)
+
+    Args:
+        url (string): The fetched url
+        response (requests.Response): The response
+        elapsed (float): Seconds the whole request took
+
+    Returns:
+        dict: The archived entry
+    """
+    ttfb = response.elapsed.total_seconds()
+    entry = {
+        "url": url,
+        "status": response.status_code,
+        "headers": dict(response.headers),
+        "body": base64.b64encode(response.content).decode(),
+        "ttfb": ttfb,
+        "download": max(0, elapsed - ttfb),
+        "recorded_at": time.time(),
+    }
+    save_entry(url, "http", entry)
+    return entry
+
+
+def replay_response(url):
+    """Body of an archived response, fetched like fetch_page does
+
+    With FETCH_REPLAY_TIMING = "recorded" the recorded TTFB and download
+    times are slept, otherwise it returns at once.
+
+    Raises:
+        IOError: Not recorded, or requests.HTTPError for a recorded status
+            not 200/OK
+
+    Returns:
+        bytes: The page content
+    """
+    entry = load_entry(url)
+    if settings.FETCH_REPLAY_TIMING == "recorded":
+        time.sleep(entry["ttfb"] + entry["download"])
+        add_stage("ttfb", entry["ttfb"])
+        add_stage("download", entry["download"])
+
+    if entry["status"] != 200:
+        raise requests.HTTPError(
+            f"Call returned error {entry['status']}", response=ArchivedResponse(entry)
+        )
+    body = base64.b64decode(entry["body"])
+    add_bytes(len(body))
+    return body
+
+
+class ArchivedResponse(object):
+    """Stand-in for a streamed requests response, serving an archived one.
+
+    Used for the feeds, which parse the body (raw) while it is read.
+    """
+
+    def __init__(self, entry):
+        self.url = entry["url"]
+        self.status_code = entry["status"]
+        self.headers = CaseInsensitiveDict(entry["headers"])
+        self.content = base64.b64decode(entry["body"])
+        self.raw = io.BytesIO(self.content)
+        self.elapsed = timedelta(seconds=entry["ttfb"])
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def replay_stream(url):
+    """Archived response of a url, for the code reading responses as streams
+
+    Timed like replay_response (FETCH_REPLAY_TIMING), the body is counted by
+    the caller as it reads it.
+
+    Raises:
+        IOError: The url was never recorded
+
+    Returns:
+        ArchivedResponse: The response
+    """
+    entry = load_entry(url)
+    if settings.FETCH_REPLAY_TIMING == "recorded":
+        time.sleep(entry["ttfb"] + entry["download"])
+        add_stage("download", entry["download"])
+    else:
+        entry = {**entry, "ttfb": 0}
+    return ArchivedResponse(entry)
+
+
+def record_page_source(url, driver, elapsed):
+    save_entry(
+        url,
+        "browser",
+        {
+            "url": url,
+            "page_source": driver.page_source,
+            "load": elapsed,
+            "recorded_at": time.time(),
+        },
+    )
+
+
+class ReplayElement(object):
+    """The parts of a Selenium WebElement the trackers use"""
+
+    def __init__(self, element, base_url):
+        self.element = element
+        self.base_url = base_url
+
+    @property
+    def text(self):
+        return self.element.text_content().strip()
+
+    def get_attribute(self, name):
+        value = self.element.get(name)
+        # Selenium resolves links against the page url
+        if name in ("href", "src") and value is not None:
+            return urljoin(self.base_url, value)
+        return value
+
+
+class ReplayDriver(object):
+    """Stand-in for a Selenium driver, serving an archived page source.
+
+    Used as both the SeleniumDriver object and its driver.
+    """
+
+    def __init__(self, url):
+        entry = load_entry(url, "browser")
+        if settings.FETCH_REPLAY_TIMING == "recorded":
+            time.sleep(entry["load"])
+        self.url = url
+        self.page_source = entry["page_source"]
+        self.tree = html.fromstring(self.page_source)
+
+    @property
+    def driver(self):
+        return self
+
+    def find_elements_by_xpath(self, xpath):
+        return [ReplayElement(e, self.url) for e in self.tree.xpath(xpath)]
+
+    def quit(self):
+        pass
@@ -0,0 +1,210 @@
+import time
+from functools import wraps
+
+import requests
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from .configs import get_config
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Fetch errors that count against the site: unreachable, too slow or cut
+# off. Responses count when the site is failing (5xx) or throttling (429);
+# any other error, e.g. the 404 of a removed product or an XPath that no
+# longer matches, only backs off the tracker itself.
+SITE_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+def is_site_error(error):
+    if isinstance(error, requests.HTTPError):
+        status = getattr(error.response, "status_code", None) or 0
+        return status == 429 or status >= 500
+    return isinstance(error, SITE_ERRORS)
+
+
+def breaker_key(site_id):
+    return f"breaker:site:{site_id}"
+
+
+def probe_key(site_id):
+    return f"breaker:site:{site_id}:probe"
+
+
+def backoff_key(tracker_id):
+    return f"backoff:tracker:{tracker_id}"
+
+
+def get_breaker(site_id):
+    """Current breaker of a site
+
+    Returns:
+        dict: state, failures, opened_at and cooldown
+    """
+    return parse_breaker(get_redis_connection("default").hgetall(breaker_key(site_id)))
+
+
+def get_breakers(site_ids):
+    """get_breaker of many sites, in one Redis round trip
+
+    Returns:
+        dict: {site id: breaker}
+    """
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    for site_id in site_ids:
+        pipe.hgetall(breaker_key(site_id))
+    return dict(zip(site_ids, map(parse_breaker, pipe.execute())))
+
+
+def parse_breaker(data):
+    data = {k.decode(): v.decode() for k, v in data.items()}
+    return {
+        "state": data.get("state", CLOSED),
+        "failures": int(data.get("failures", 0)),
+        "opened_at": float(data.get("opened_at", 0)),
+        "cooldown": int(data.get("cooldown", settings.BREAKER_COOLDOWN)),
+    }
+
+
+def get_breaker_state(breaker, now=None):
+    if breaker["state"] == OPEN:
+        now = now or time.time()
+        if now >= breaker["opened_at"] + breaker["cooldown"]:
+            return HALF_OPEN
+    return breaker["state"]
+
+
+def allow_request(site_id):
+    """Whether a fetch from the site may go ahead.
+
+    Closed: always. Open: never until the cooldown is over, then a single run
+    gets to probe the site (half-open) while the others keep skipping.
+    """
+    breaker = get_breaker(site_id)
+    state = get_breaker_state(breaker)
+    if state == CLOSED:
+        return True
+    if state == OPEN:
+        return False
+    return bool(
+        get_redis_connection("default").set(
+            probe_key(site_id), 1, nx=True, ex=breaker["cooldown"]
+        )
+    )
+
+
+def record_success(site_id):
+    get_redis_connection("default").delete(breaker_key(site_id), probe_key(site_id))
+
+
+def record_failure(site_id):
+    """Count a failed fetch, opening the breaker at the threshold.
+
+    A failed half-open probe reopens it with twice the cooldown.
+    """
+    conn = get_redis_connection("default")
+    breaker = get_breaker(site_id)
+    failures = conn.hincrby(breaker_key(site_id), "failures", 1)
+
+    if get_breaker_state(breaker) == HALF_OPEN:
+        cooldown = min(breaker["cooldown"] * 2, settings.BREAKER_MAX_COOLDOWN)
+    elif failures >= settings.BREAKER_FAILURE_THRESHOLD and breaker["state"] != OPEN:
+        cooldown = settings.BREAKER_COOLDOWN
+    else:
+        return
+
+    conn.hset(
+        breaker_key(site_id),
+        mapping={"state": OPEN, "opened_at": time.time(), "cooldown": cooldown},
+    )
+    conn.delete(probe_key(site_id))
+
+
+def in_backoff(tracker_id):
+    retry_at = get_redis_connection("default").hget(
+        backoff_key(tracker_id), "retry_at"
+    )
+    return retry_at is not None and time.time() < float(retry_at)
+
+
+def record_tracker_failure(tracker_id):
+    """Back the tracker off exponentially: base, 2 * base, 4 * base ... max"""
+    conn = get_redis_connection("default")
+    failures = conn.hincrby(backoff_key(tracker_id), "failures", 1)
+    delay = min(
+        settings.TRACKER_BACKOFF_BASE * 2 ** (failures - 1),
+        settings.TRACKER_BACKOFF_MAX,
+    )
+    conn.hset(backoff_key(tracker_id), "retry_at", time.time() + delay)
+    conn.expire(backoff_key(tracker_id), settings.TRACKER_BACKOFF_MAX * 2)
+
+
+def record_tracker_success(tracker_id):
+    get_redis_connection("default").delete(backoff_key(tracker_id))
+
+
+def should_skip(tracker_id, site_id):
+    """Whether the tracker is backing off or its site breaker is open
+
+    Returns:
+        string: The reason to skip the run, None to run it
+    """
+    try:
+        if in_backoff(tracker_id):
+            return "backing off"
+        if not allow_request(site_id):
+            return "site circuit open"
+    except Exception as e:
+        # Redis unavailable, run unguarded
+        print(type(e).__name__, "checking the circuit breaker")
+    return None
+
+
+def record_result(tracker_id, site_id, error=None):
+    try:
+        if error is None:
+            record_success(site_id)
+            record_tracker_success(tracker_id)
+        else:
+            if is_site_error(error):
+                record_failure(site_id)
+            record_tracker_failure(tracker_id)
+    except Exception as e:
+        print(type(e).__name__, "recording the circuit breaker result")
+
+
+def circuit_breaker(func):
+    """Skip tracker tasks of failing sites and back failing trackers off.
+
+    Skipped runs return without raising, so they do not trigger the error
+    hook; failed runs still raise after being recorded.
+
+    Any run that gets through is recorded, a success if it does not raise:
+    apply it inside single_flight, whose dropped runs return without running
+    and would otherwise reset the failure counts.
+    """
+
+    @wraps(func)
+    def wrapper(id, *args, **kwargs):
+        site_id = get_config(id).site_id
+        reason = should_skip(id, site_id)
+        if reason:
+            print(f"Tracker {id} skipped: {reason}")
+            return
+
+        try:
+            result = func(id, *args, **kwargs)
+        except Exception as e:
+            record_result(id, site_id, e)
+            raise
+
+        record_result(id, site_id)
+        return result
+
+    return wrapper
@@ -0,0 +1,236 @@
+import csv
+import json
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from ..models import AppProduct, AppSite, AppStoreLocation, AppTracker
+from .api_cache import invalidate_trackers
+from .events import publish_tracker_events
+from .schedules import sync_schedules
+
+# Columns of the import/export files, foreign keys by id
+TRACKER_FIELDS = (
+    "id",
+    "site",
+    "product",
+    "location",
+    "name",
+    "t_type",
+    "method",
+    "search_key",
+    "url",
+    "params",
+    "active",
+    "frequency",
+    "repeats",
+    "cron_schedule",
+)
+FOREIGN_KEYS = {"site": AppSite, "product": AppProduct, "location": AppStoreLocation}
+INTEGER_FIELDS = ("id", "site", "product", "location", "frequency", "repeats")
+FORMATS = ("csv", "json")
+
+
+def tracker_row(tracker):
+    row = {}
+    for field in TRACKER_FIELDS:
+        if field in FOREIGN_KEYS:
+            row[field] = getattr(tracker, f"{field}_id")
+        else:
+            row[field] = getattr(tracker, field)
+    return row
+
+
+def export_trackers(trackers, out, fmt="csv"):
+    """Write trackers to a CSV (params as a JSON column) or JSON file
+
+    Returns:
+        int: The number of trackers written
+    """
+    rows = [tracker_row(t) for t in trackers.order_by("id")]
+    if fmt == "json":
+        json.dump(rows, out, indent=2)
+    else:
+        writer = csv.DictWriter(out, TRACKER_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({**row, "params": json.dumps(row["params"])})
+    return len(rows)
+
+
+def read_trackers(f, fmt="csv"):
+    """Rows of a tracker file, as written by export_trackers"""
+    if fmt == "json":
+        return json.load(f)
+    return list(csv.DictReader(f))
+
+
+def clean_value(field, value):
+    # CSV values are strings, JSON ones are typed
+    if value is None or value == "":
+        if field == "params":
+            return AppTracker._meta.get_field("params").get_default()
+        if field == "active":
+            return True
+        return None
+    if field in INTEGER_FIELDS:
+        return int(value)
+    if field == "active" and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y", "t")
+    if field == "params" and isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def clean_row(row):
+    unknown = set(row) - set(TRACKER_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown columns {', '.join(sorted(unknown))}")
+    return {field: clean_value(field, value) for field, value in row.items()}
+
+
+def check_foreign_keys(trackers, errors):
+    # One query per foreign key instead of one per tracker
+    for field, model in FOREIGN_KEYS.items():
+        ids = {getattr(t, f"{field}_id") for _, t in trackers} - {None}
+        found = set(model.objects.filter(id__in=ids).values_list("id", flat=True))
+        for n, tracker in trackers:
+            value = getattr(tracker, f"{field}_id")
+            if value is None and field == "site":
+                errors.append(f"Row {n}: site is required")
+            elif value is not None and value not in found:
+                errors.append(f"Row {n}: {field} {value} does not exist")
+
+
+def trackers_saved(tracker_ids):
+    # What the AppTracker post_save signals do, for trackers saved in bulk
+    publish_tracker_events(tracker_ids, "save")
+    invalidate_trackers(tracker_ids)
+
+
+def created_key(tracker):
+    return (tracker.site_id, tracker.name, tracker.url, tracker.created_at)
+
+
+def set_created_ids(created, last_id):
+    """Set the ids of trackers bulk created on a backend not returning them.
+
+    The new rows are matched by their values, creation time included, not
+    by id order: trackers created meanwhile (e.g. in the admin) also have
+    ids above last_id.
+    """
+    trackers = defaultdict(list)
+    for tracker in created:
+        trackers[created_key(tracker)].append(tracker)
+    rows = AppTracker.objects.filter(
+        id__gt=last_id, created_at__in={t.created_at for t in created}
+    ).order_by("id")
+    for row in rows:
+        matches = trackers.get(created_key(row))
+        if matches:
+            tracker = matches.pop(0)
+            tracker.id = row.id
+            tracker._state.adding = False
+
+
+def import_trackers(rows, site_id=None):
+    """Create/update trackers and their schedules in bulk, in one transaction.
+
+    Rows with an id update that tracker (only the columns present), the
+    others create one. Nothing is written if any row is invalid.
+
+    Args:
+        rows (list[dict]): Rows from read_trackers
+        site_id (int, optional): Site of the rows without one
+
+    Raises:
+        ValidationError: The errors of every invalid row
+
+    Returns:
+        dict: trackers_created/updated and schedules_created/updated/deleted
+    """
+    errors = []
+    cleaned = []
+    for n, row in enumerate(rows, 1):
+        try:
+            row = clean_row(row)
+        except ValueError as e:
+            errors.append(f"Row {n}: {e}")
+            continue
+        if site_id and not row.get("site"):
+            row["site"] = site_id
+        cleaned.append((n, row))
+
+    update_ids = [row["id"] for _, row in cleaned if row.get("id")]
+    existing = AppTracker.objects.in_bulk(update_ids)
+    now = timezone.now()
+    new, changed = [], []
+    update_fields = {"updated_at"}
+    for n, row in cleaned:
+        values = {
+            f"{k}_id" if k in FOREIGN_KEYS else k: v
+            for k, v in row.items()
+            if k != "id"
+        }
+        if row.get("id"):
+            tracker = existing.get(row["id"])
+            if tracker is None:
+                errors.append(f"Row {n}: tracker {row['id']} does not exist")
+                continue
+            for k, v in values.items():
+                setattr(tracker, k, v)
+            tracker.updated_at = now
+            update_fields.update(values)
+            changed.append((n, tracker))
+        else:
+            new.append((n, AppTracker(**values)))
+
+    for n, tracker in new + changed:
+        try:
+            tracker.full_clean(exclude=list(FOREIGN_KEYS), validate_unique=False)
+        except ValidationError as e:
+            for field, messages in e.message_dict.items():
+                errors.append(f"Row {n}: {field}: {' '.join(messages)}")
+    check_foreign_keys(new + changed, errors)
+    if errors:
+        raise ValidationError(errors)
+
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            created = AppTracker.objects.bulk_create(t for _, t in new)
+        else:
+            # bulk_create sets no ids on this backend (SQLite), find them
+            last_id = AppTracker.objects.aggregate(last=Max("id"))["last"] or 0
+            created = AppTracker.objects.bulk_create(t for _, t in new)
+            set_created_ids(created, last_id)
+        updated = [t for _, t in changed]
+        AppTracker.objects.bulk_update(updated, sorted(update_fields))
+        counts = sync_schedules(created + updated)
+
+        ids = [t.id for t in created + updated]
+        transaction.on_commit(lambda: trackers_saved(ids))
+
+    return {
+        "trackers_created": len(created),
+        "trackers_updated": len(updated),
+        **{f"schedules_{k}": v for k, v in counts.items()},
+    }
+
+
+def set_trackers_active(trackers, active):
+    """Activate/deactivate trackers and sync their schedules in one transaction
+
+    Returns:
+        dict: trackers updated and created, updated and deleted schedules
+    """
+    with transaction.atomic():
+        ids = list(trackers.values_list("id", flat=True))
+        updated = AppTracker.objects.filter(id__in=ids).update(
+            active=active, updated_at=timezone.now()
+        )
+        counts = sync_schedules(AppTracker.objects.filter(id__in=ids))
+        transaction.on_commit(lambda: trackers_saved(ids))
+    return {"trackers": updated, **counts}
@@ -0,0 +1,132 @@
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from ..models import AppCategory, AppCategoryClosure
+
+
+def category_subtree(category_id):
+    """Ids of a category and all its descendants, as a subquery.
+
+    Use it as `filter(category__in=category_subtree(id))` to get a whole
+    subtree in one indexed query.
+
+    Args:
+        category_id (int): The id of the root category
+
+    Returns:
+        QuerySet: descendant ids
+    """
+    return AppCategoryClosure.objects.filter(ancestor_id=category_id).values(
+        "descendant_id"
+    )
+
+
+def check_parent(category_id, parent_id):
+    """Reject a parent inside the category's own subtree (a cycle)
+
+    Raises:
+        ValidationError: parent_id is the category or one of its descendants
+    """
+    if not (category_id and parent_id):
+        return
+    if parent_id == category_id or (
+        category_subtree(category_id).filter(descendant_id=parent_id).exists()
+    ):
+        raise ValidationError(
+            {"parent": "A category cannot be moved under itself or a subcategory."}
+        )
+
+
+def move_category(category_id, parent_id):
+    """Attach a (new or moved) category and its subtree under parent_id.
+
+    Does nothing when the closure already has parent_id as direct parent.
+
+    Args:
+        category_id (int): The id of the category
+        parent_id (int): The id of the new parent, None for a root category
+
+    Raises:
+        ValidationError: The parent is in the category's subtree
+    """
+    check_parent(category_id, parent_id)
+    links = AppCategoryClosure.objects
+    current_parent = (
+        links.filter(descendant_id=category_id, depth=1)
+        .values_list("ancestor_id", flat=True)
+        .first()
+    )
+    is_linked = links.filter(ancestor_id=category_id, descendant_id=category_id)
+    if current_parent == parent_id and is_linked.exists():
+        return
+
+    if parent_id and not links.filter(descendant_id=parent_id).exists():
+        # Parent not indexed yet (e.g. closure never built)
+        rebuild_closure()
+        return
+
+    with transaction.atomic():
+        links.get_or_create(
+            ancestor_id=category_id, descendant_id=category_id, defaults={"depth": 0}
+        )
+        subtree = list(
+            links.filter(ancestor_id=category_id).values_list("descendant_id", "depth")
+        )
+        subtree_ids = [id for id, _ in subtree]
+
+        # Detach the subtree from its old ancestors
+        links.filter(descendant_id__in=subtree_ids).exclude(
+            ancestor_id__in=subtree_ids
+        ).delete()
+
+        # Attach it to the new ones
+        if parent_id:
+            ancestors = links.filter(descendant_id=parent_id).values_list(
+                "ancestor_id", "depth"
+            )
+            links.bulk_create(
+                AppCategoryClosure(
+                    ancestor_id=ancestor_id,
+                    descendant_id=descendant_id,
+                    depth=ancestor_depth + descendant_depth + 1,
+                )
+                for ancestor_id, ancestor_depth in ancestors
+                for descendant_id, descendant_depth in subtree
+            )
+
+
+def rebuild_closure(batch_size=1000):
+    """Rebuild the whole closure table from AppCategory.parent
+
+    Returns:
+        int: The number of rows written
+    """
+    children = defaultdict(list)
+    roots = []
+    for id, parent_id in AppCategory.objects.values_list("id", "parent_id"):
+        if parent_id:
+            children[parent_id].append(id)
+        else:
+            roots.append(id)
+
+    rows = []
+    # Walk down from every root carrying the ancestors path
+    stack = [(id, []) for id in roots]
+    while stack:
+        id, path = stack.pop()
+        path = path + [id]
+        for depth, ancestor_id in enumerate(reversed(path)):
+            rows.append(
+                AppCategoryClosure(
+                    ancestor_id=ancestor_id, descendant_id=id, depth=depth
+                )
+            )
+        stack.extend((child, path) for child in children[id])
+
+    with transaction.atomic():
+        AppCategoryClosure.objects.all().delete()
+        AppCategoryClosure.objects.bulk_create(rows, batch_size=batch_size)
+
+    return len(rows)
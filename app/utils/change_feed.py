@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+
+from django_redis import get_redis_connection
+
+from ..constants import CHANGE_FEED_HEARTBEAT
+
+# Redis pub/sub channel for new tracker changes
+CHANGES_CHANNEL = "changes:events"
+
+
+def serialize_change(change):
+    return {
+        "id": change.id,
+        "tracker": change.tracker_id,
+        "price": change.price,
+        "available": change.available,
+        "item_desc": change.item_desc,
+        "item_url": change.item_url,
+        "created_at": change.created_at.isoformat(),
+    }
+
+
+def change_event(change, site_id, product_id):
+    """A change as pushed by the change feed, with what it can be filtered by"""
+    return {**serialize_change(change), "site": site_id, "product": product_id}
+
+
+def publish_change(change):
+    """Push a new change to the change feed streams
+
+    Args:
+        change (AppTrackerChange): The change, once committed
+    """
+    from ..models import AppTracker
+
+    try:
+        site_id, product_id = AppTracker.objects.values_list(
+            "site_id", "product_id"
+        ).get(id=change.tracker_id)
+        get_redis_connection("default").publish(
+            CHANGES_CHANNEL, json.dumps(change_event(change, site_id, product_id))
+        )
+    except Exception as e:
+        # Streams resume from the database, never fail the save on this
+        print(type(e).__name__, "publishing change")
+
+
+class ChangeListener(object):
+    """One Redis subscription per process, fanned out to the change streams.
+
+    The subscription is read by a daemon thread (redis-py pub/sub blocks);
+    each event is handed to the streams on their own event loop with
+    call_soon_threadsafe. When the subscription fails, every stream is
+    closed: events published until it is back are lost, clients reconnect
+    and catch up from the database with their Last-Event-ID.
+    """
+
+    def __init__(self):
+        self.streams = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        # Set while subscribed, streams only read the database after that
+        self.ready = threading.Event()
+
+    def add(self, stream):
+        with self.lock:
+            self.streams.add(stream)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.listen, daemon=True)
+                self.thread.start()
+
+    def remove(self, stream):
+        with self.lock:
+            self.streams.discard(stream)
+
+    def broadcast(self, event):
+        with self.lock:
+            streams = list(self.streams)
+        for stream in streams:
+            if event is None or stream.matches(event):
+                stream.loop.call_soon_threadsafe(stream.push, event)
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = get_redis_connection("default").pubsub(
+                    ignore_subscribe_messages=True
+                )
+                pubsub.subscribe(CHANGES_CHANNEL)
+                # Consume the subscribe confirmation, so we know it is active
+                pubsub.get_message(timeout=CHANGE_FEED_HEARTBEAT)
+                self.ready.set()
+                while True:
+                    message = pubsub.get_message(timeout=CHANGE_FEED_HEARTBEAT)
+                    if message is not None:
+                        self.broadcast(json.loads(message["data"]))
+            except Exception as e:
+                print(type(e).__name__, "reading the change feed")
+            self.ready.clear()
+            # None closes the streams
+            self.broadcast(None)
+            time.sleep(1)
+
+
+listener = ChangeListener()
@@ -0,0 +1,108 @@
+import re
+import threading
+import time
+
+from ..constants import NEW_ITEM_SKIP_WORDS, TRACKER_CONFIG_TTL
+from ..models import AppTracker
+from .events import get_tracker_events, subscribe_tracker_events
+from .feeds import get_site_feed
+
+# Per worker tracker configs: {tracker_id: (loaded_at, TrackerConfig)}
+configs = {}
+# Tracker events subscription of this worker, None until the first lookup
+subscription = {"pubsub": None}
+lock = threading.Lock()
+
+
+class TrackerConfig(object):
+    """Everything a tracker task needs to run, loaded once per worker.
+
+    Holds the tracker fields, its site (url and active feed) and the new item
+    rules compiled from the search key.
+    """
+
+    def __init__(self, tracker, feed=None):
+        self.id = tracker.id
+        self.t_type = tracker.t_type
+        self.name = tracker.get_task_name()
+        self.search_key = tracker.search_key or ""
+        self.url = tracker.url
+        self.method = tracker.method
+        self.params = tracker.params
+        self.site_id = tracker.site_id
+        self.site_url = tracker.site.url
+        self.feed = feed
+
+        # New item rules: the search key must be in the title, the skip words not
+        self.search_re = re.compile(re.escape(self.search_key), re.I)
+        self.skip_re = re.compile(
+            "|".join(re.escape(w) for w in NEW_ITEM_SKIP_WORDS), re.I
+        )
+        if "vespa" in self.search_key:
+            self.alert_token = "SLACK_KEY_VESPA_ALERTS"
+        elif "lambretta" in self.search_key:
+            self.alert_token = "SLACK_KEY_LAMBRETTA_ALERTS"
+        else:
+            self.alert_token = "SLACK_KEY_ALERTS"
+
+    def is_wanted(self, title):
+        """Whether a new item title passes the tracker rules"""
+        return bool(self.search_re.search(title)) and not self.skip_re.search(title)
+
+
+def load_config(tracker_id):
+    tracker = AppTracker.objects.select_related("site", "product__brand").get(
+        id=tracker_id
+    )
+    feed = get_site_feed(tracker.site_id) if tracker.t_type == "new_item" else None
+    return TrackerConfig(tracker, feed)
+
+
+def is_subscribed():
+    """Drop the configs of the trackers saved/deleted since the last lookup.
+
+    Returns:
+        bool: False when the events cannot be read, cached configs may be stale
+    """
+    try:
+        if subscription["pubsub"] is None:
+            subscription["pubsub"] = subscribe_tracker_events()
+            # Events published while unsubscribed are lost
+            configs.clear()
+        for event in get_tracker_events(subscription["pubsub"]):
+            configs.pop(event["id"], None)
+        return True
+    except Exception as e:
+        print(type(e).__name__, "reading the tracker events")
+        subscription["pubsub"] = None
+        return False
+
+
+def get_config(tracker_id):
+    """Config of a tracker, from the worker cache while it is current.
+
+    Tracker (and site/feed) saves publish tracker events which drop the
+    cached config; TRACKER_CONFIG_TTL bounds the age of a config in case an
+    event was missed. Without Redis every lookup hits the database.
+
+    Raises:
+        AppTracker.DoesNotExist: The tracker was deleted
+
+    Returns:
+        TrackerConfig: The tracker config
+    """
+    with lock:
+        subscribed = is_subscribed()
+        cached = configs.get(tracker_id)
+        if (
+            subscribed
+            and cached is not None
+            and time.monotonic() - cached[0] < TRACKER_CONFIG_TTL
+        ):
+            return cached[1]
+
+    config = load_config(tracker_id)
+    if subscribed:
+        with lock:
+            configs[tracker_id] = (time.monotonic(), config)
+    return config
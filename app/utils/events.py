@@ -0,0 +1,57 @@
+import json
+
+from django_redis import get_redis_connection
+
+# Redis pub/sub channel for tracker saves and deletes
+TRACKER_EVENTS_CHANNEL = "trackers:events"
+
+
+def publish_tracker_event(tracker_id, action):
+    """Tell running schedulers/workers that a tracker changed
+
+    Args:
+        tracker_id (int): The id of the tracker
+        action (string): "save" or "delete"
+    """
+    try:
+        get_redis_connection("default").publish(
+            TRACKER_EVENTS_CHANNEL, json.dumps({"id": tracker_id, "action": action})
+        )
+    except Exception as e:
+        # Listeners also reload periodically (TRACKER_CONFIG_TTL,
+        # SCHEDULER_RESYNC_INTERVAL), never fail the save on this
+        print(type(e).__name__, "publishing tracker event")
+
+
+def publish_tracker_events(tracker_ids, action):
+    """publish_tracker_event for many trackers, in one round trip"""
+    try:
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        for tracker_id in tracker_ids:
+            pipe.publish(
+                TRACKER_EVENTS_CHANNEL,
+                json.dumps({"id": tracker_id, "action": action}),
+            )
+        pipe.execute()
+    except Exception as e:
+        print(type(e).__name__, "publishing tracker events")
+
+
+def subscribe_tracker_events():
+    pubsub = get_redis_connection("default").pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(TRACKER_EVENTS_CHANNEL)
+    return pubsub
+
+
+def get_tracker_events(pubsub):
+    """Drain the pending tracker events without blocking
+
+    Returns:
+        list[dict]: id/action events, oldest first
+    """
+    events = []
+    while True:
+        message = pubsub.get_message()
+        if message is None:
+            return events
+        events.append(json.loads(message["data"]))
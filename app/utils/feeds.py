@@ -0,0 +1,345 @@
+import re
+import time
+from datetime import datetime, timezone as dt_timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote_plus
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date as parse_day, parse_datetime
+from lxml import etree
+
+from ..constants import FEED_MAX_ITEMS, HEADERS, REQUEST_TIMEOUT
+from ..models import AppSiteFeed, AppTrackerChange, AppTrackerFeedMark
+from .archive import ArchivedResponse, record_response, replay_stream
+from .stats import add_bytes, add_stage, stage
+
+
+def parse_date(value):
+    """RFC 822 (RSS) or ISO 8601 (Atom, sitemaps, JSON) date, None if invalid"""
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        date = parse_datetime(value)
+        if date is None and parse_day(value):
+            # Sitemap lastmod may be a plain date
+            date = datetime.combine(parse_day(value), datetime.min.time())
+    except ValueError:
+        date = None
+    if date is None:
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def local_name(tag):
+    # "{http://www.w3.org/2005/Atom}entry" -> "entry"
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def get_child_text(element, names):
+    for child in element:
+        if local_name(child.tag) in names:
+            if local_name(child.tag) == "link" and child.get("href"):
+                return child.get("href")
+            return (child.text or "").strip()
+    return None
+
+
+def iter_elements(response):
+    """Elements of an XML response body, as they are read
+
+    Feeds are third-party XML: DTDs, entities and network access are off
+    (no XXE, e.g. an entity reading a local file into an item title).
+    """
+    response.raw.decode_content = True
+    return etree.iterparse(
+        response.raw,
+        events=("end",),
+        resolve_entities=False,
+        no_network=True,
+        load_dtd=False,
+    )
+
+
+def open_feed(url, headers=HEADERS):
+    """Streamed GET of a feed, the body is read while it is parsed.
+
+    Goes through the fetch archive like fetch_page: replayed from it with
+    FETCH_MODE = "replay", downloaded whole and archived with "record".
+
+    Raises:
+        requests.HTTPError: Feed not 200/OK (nor 304/Not Modified)
+        IOError: Not recorded
+
+    Returns:
+        requests.Response: The response (or ArchivedResponse), to use as a
+            context manager
+    """
+    if settings.FETCH_MODE == "replay":
+        response = replay_stream(url)
+    elif settings.FETCH_MODE == "record":
+        start = time.perf_counter()
+        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        entry = record_response(url, response, time.perf_counter() - start)
+        response = ArchivedResponse(entry)
+    else:
+        response = requests.get(
+            url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True
+        )
+    if response.status_code not in (200, 304):
+        response.close()
+        raise requests.HTTPError(
+            f"Feed returned error {response.status_code}", response=response
+        )
+    add_stage("ttfb", response.elapsed.total_seconds())
+    return response
+
+
+class FeedAdapter(object):
+    """Parse a feed response into items, newest first.
+
+    Items are dicts with id, title, link, location and published keys.
+    Adapters read the body incrementally, so iteration can stop as soon as
+    the tracker's high-water mark is reached.
+    """
+
+    newest_first = True
+
+    def __init__(self, params, since=None):
+        self.params = params
+        # Publication date of the tracker's mark, None on the first run
+        self.since = since
+
+    def iter_items(self, response):
+        raise NotImplementedError
+
+
+class RssFeed(FeedAdapter):
+    """RSS 2.0 <item> and Atom <entry> elements"""
+
+    def iter_items(self, response):
+        for _, element in iter_elements(response):
+            if local_name(element.tag) not in ("item", "entry"):
+                continue
+            link = get_child_text(element, ("link",))
+            yield {
+                "id": get_child_text(element, ("guid", "id")) or link,
+                "title": get_child_text(element, ("title",)),
+                "link": link,
+                "location": get_child_text(element, ("location",)),
+                "published": parse_date(
+                    get_child_text(element, ("pubDate", "published", "updated"))
+                ),
+            }
+            element.clear()
+
+
+class SitemapFeed(FeedAdapter):
+    """Sitemap <url> entries, titled after the last path segment of the url.
+
+    Of a sitemap index, only the sitemaps modified (lastmod) after the
+    tracker's mark are downloaded.
+    """
+
+    # Sitemaps are not ordered, every entry is compared with the mark
+    newest_first = False
+
+    def is_modified(self, lastmod):
+        return not (self.since and lastmod and lastmod <= self.since)
+
+    def iter_items(self, response):
+        sitemaps = []
+        for _, element in iter_elements(response):
+            name = local_name(element.tag)
+            if name == "sitemap":
+                lastmod = parse_date(get_child_text(element, ("lastmod",)))
+                if self.is_modified(lastmod):
+                    sitemaps.append(get_child_text(element, ("loc",)))
+                element.clear()
+            elif name == "url":
+                link = get_child_text(element, ("loc",))
+                slug = link.rstrip("/").rsplit("/", 1)[-1] if link else ""
+                yield {
+                    "id": link,
+                    "title": re.sub(r"[-_]+", " ", slug.split("?")[0]),
+                    "link": link,
+                    "location": None,
+                    "published": parse_date(get_child_text(element, ("lastmod",))),
+                }
+                element.clear()
+
+        for url in filter(None, sitemaps):
+            with open_feed(url) as sitemap:
+                if sitemap.status_code != 200:
+                    raise requests.HTTPError(
+                        f"Sitemap returned error {sitemap.status_code}",
+                        response=sitemap,
+                    )
+                yield from self.iter_items(sitemap)
+                add_bytes(sitemap.raw.tell())
+
+
+class JsonFeed(FeedAdapter):
+    """JSON search endpoints, fields located with dotted paths in params"""
+
+    def get_path(self, data, field):
+        path = self.params.get(field)
+        if not path:
+            return None
+        for key in path.split("."):
+            if isinstance(data, list) and key.isdigit():
+                data = data[int(key)] if int(key) < len(data) else None
+            elif isinstance(data, dict):
+                data = data.get(key)
+            else:
+                return None
+        return data
+
+    def iter_items(self, response):
+        data = response.json()
+        items = self.get_path(data, "items") if "items" in self.params else data
+        for item in items or []:
+            id = self.get_path(item, "id")
+            yield {
+                "id": str(id) if id is not None else None,
+                "title": self.get_path(item, "title"),
+                "link": self.get_path(item, "link"),
+                "location": self.get_path(item, "location"),
+                "published": parse_date(self.get_path(item, "published")),
+            }
+
+
+FEED_ADAPTERS = {
+    "rss": RssFeed,
+    "json": JsonFeed,
+    "sitemap": SitemapFeed,
+}
+
+
+def get_site_feed(site_id):
+    return AppSiteFeed.objects.filter(site_id=site_id, active=True).first()
+
+
+def is_seen(item, mark):
+    if mark.last_id and item["id"] == mark.last_id:
+        return True
+    return bool(
+        mark.last_seen_at
+        and item["published"]
+        and item["published"] <= mark.last_seen_at
+    )
+
+
+def drop_saved(items):
+    """Items without a date whose link is already saved as a change
+
+    The mark cannot cover them (sitemap entries without lastmod), they are
+    deduped by link instead, with one query for the whole feed.
+    """
+    links = {
+        item["link"].split("?")[0]
+        for item in items
+        if not item["published"] and item["link"]
+    }
+    if not links:
+        return items
+    saved = set(
+        AppTrackerChange.objects.filter(item_url__in=links).values_list(
+            "item_url", flat=True
+        )
+    )
+    return [
+        item
+        for item in items
+        if item["published"]
+        or not item["link"]
+        or item["link"].split("?")[0] not in saved
+    ]
+
+
+def get_new_feed_items(tracker_id, search_key, feed):
+    """Items of a site feed newer than the tracker's high-water mark.
+
+    On the first run only the newest item is returned (like a scrape). Call
+    update_feed_mark once the items are processed to move the mark.
+
+    Args:
+        tracker_id (int): The id of the tracker
+        search_key (string): The tracker search key, for the feed url
+        feed (AppSiteFeed): The site feed
+
+    Raises:
+        IOError: Feed not 200/OK
+
+    Returns:
+        list: The new items (dicts, newest first, none if the feed answered
+            304/Not Modified) and the AppTrackerFeedMark
+    """
+    mark, _ = AppTrackerFeedMark.objects.get_or_create(tracker_id=tracker_id)
+    first_run = not (mark.last_id or mark.last_seen_at)
+    limit = 1 if first_run else FEED_MAX_ITEMS
+    adapter = FEED_ADAPTERS[feed.kind](
+        feed.params, since=None if first_run else mark.last_seen_at
+    )
+
+    url = feed.url.replace("{search_key}", quote_plus(search_key or ""))
+    headers = dict(HEADERS)
+    if not first_run and settings.FETCH_MODE == "live":
+        # Conditional request, unchanged feeds are not downloaded again
+        # (recordings keep whole bodies)
+        if mark.etag:
+            headers["If-None-Match"] = mark.etag
+        if mark.last_modified:
+            headers["If-Modified-Since"] = mark.last_modified
+
+    with open_feed(url, headers) as response:
+        if response.status_code == 304:
+            return [], mark
+
+        # The body is downloaded while it is parsed
+        items = []
+        with stage("parse"):
+            for item in adapter.iter_items(response):
+                if not first_run and is_seen(item, mark):
+                    if adapter.newest_first:
+                        # Everything after this was seen already, stop reading
+                        break
+                    continue
+                items.append(item)
+                if adapter.newest_first and len(items) >= limit:
+                    break
+        add_bytes(response.raw.tell())
+
+    # Validators of this response, saved with the mark: a feed answering
+    # 304 is never read again, so only once its items are processed
+    validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    if validators != (mark.etag, mark.last_modified):
+        mark.etag, mark.last_modified = validators
+        if not items:
+            mark.save(update_fields=["etag", "last_modified", "updated_at"])
+
+    if not first_run:
+        items = drop_saved(items)
+
+    if not adapter.newest_first:
+        epoch = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+        items.sort(key=lambda i: i["published"] or epoch, reverse=True)
+        items = items[:limit]
+
+    return items, mark
+
+
+def update_feed_mark(mark, items):
+    """Move the high-water mark to the newest processed item"""
+    if items:
+        mark.last_id = items[0]["id"]
+        if items[0]["published"]:
+            mark.last_seen_at = items[0]["published"]
+        mark.save()
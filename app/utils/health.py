@@ -0,0 +1,172 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+from django_q.models import Failure
+from django_redis import get_redis_connection
+
+from ..constants import HEALTH_LIST_SIZE, TRACKER_STALE_RUNS
+from ..models import AppSite, AppTracker
+from .breaker import CLOSED, backoff_key, get_breaker_state, get_breakers
+from .metrics import get_browser_sessions, get_queue_stats
+from .stats import stats_key
+
+
+def get_tracker_counts():
+    """Total and active trackers per type and method, one aggregate query"""
+    return list(
+        AppTracker.objects.values("t_type", "method")
+        .annotate(total=Count("id"), active=Count("id", filter=Q(active=True)))
+        .order_by("t_type", "method")
+    )
+
+
+def get_period(tracker, now):
+    # Seconds between two scheduled runs
+    if tracker.cron_schedule:
+        from cron_converter import Cron
+
+        schedule = Cron(tracker.cron_schedule).schedule(now)
+        first = schedule.next()
+        return (schedule.next() - first).total_seconds()
+    return max(tracker.frequency, 1) * 60
+
+
+def get_stale_trackers(limit=HEALTH_LIST_SIZE):
+    """Active trackers without a run for TRACKER_STALE_RUNS periods.
+
+    The last run of every active tracker is read from the run stats in one
+    round trip (its newest entry only).
+
+    Returns:
+        list[dict]: tracker, last_run (datetime, None if never) and period,
+            the longest overdue first
+    """
+    trackers = list(
+        AppTracker.objects.filter(active=True)
+        .select_related("site")
+        .only("id", "name", "site__name", "frequency", "cron_schedule", "created_at")
+    )
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    for tracker in trackers:
+        pipe.lindex(stats_key(tracker.id), 0)
+
+    now = timezone.localtime()
+    stale = []
+    for tracker, last in zip(trackers, pipe.execute()):
+        try:
+            period = get_period(tracker, now)
+        except Exception as e:
+            # An invalid cron_schedule, leave the tracker out, not the section
+            print(type(e).__name__, f"reading the schedule of tracker {tracker.id}")
+            continue
+        last_run = None
+        since = tracker.created_at
+        if last is not None:
+            last_run = since = datetime.fromtimestamp(
+                json.loads(last)["at"], timezone.utc
+            )
+        overdue = (now - since).total_seconds() / period
+        if overdue >= TRACKER_STALE_RUNS:
+            stale.append(
+                {
+                    "tracker": tracker,
+                    "last_run": last_run,
+                    "period": timedelta(seconds=period),
+                    "overdue": overdue,
+                }
+            )
+    stale.sort(key=lambda s: s["overdue"], reverse=True)
+    return stale[:limit]
+
+
+def get_failing_trackers(limit=HEALTH_LIST_SIZE):
+    """Trackers backing off after failed runs, most failures first
+
+    Returns:
+        list[dict]: tracker, failures and retry_at (datetime)
+    """
+    conn = get_redis_connection("default")
+    keys = list(conn.scan_iter(match=backoff_key("*"), count=1000))
+    pipe = conn.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+
+    backoffs = {}
+    for key, data in zip(keys, pipe.execute()):
+        tracker_id = int(key.decode().rsplit(":", 1)[1])
+        data = {k.decode(): v.decode() for k, v in data.items()}
+        backoffs[tracker_id] = (
+            int(data.get("failures", 0)),
+            float(data.get("retry_at", 0)),
+        )
+
+    trackers = AppTracker.objects.select_related("site").in_bulk(list(backoffs))
+    failing = [
+        {
+            "tracker": trackers[tracker_id],
+            "failures": failures,
+            "retry_at": (
+                datetime.fromtimestamp(retry_at, timezone.utc)
+                if retry_at > time.time()
+                else None
+            ),
+        }
+        for tracker_id, (failures, retry_at) in backoffs.items()
+        if tracker_id in trackers
+    ]
+    failing.sort(key=lambda f: f["failures"], reverse=True)
+    return failing[:limit]
+
+
+def get_open_circuits():
+    """Sites whose circuit breaker is not closed
+
+    Returns:
+        list[dict]: site, state, failures and cooldown
+    """
+    sites = list(AppSite.objects.order_by("name"))
+    breakers = get_breakers([site.id for site in sites])
+    circuits = []
+    for site in sites:
+        breaker = breakers[site.id]
+        state = get_breaker_state(breaker)
+        if state != CLOSED:
+            circuits.append({"site": site, "state": state, **breaker})
+    return circuits
+
+
+def get_recent_failures(limit=HEALTH_LIST_SIZE):
+    # Failed django-q tasks, the tracker id is the group of scheduled runs
+    return list(
+        Failure.objects.order_by("-stopped").only(
+            "id", "name", "func", "group", "stopped", "result"
+        )[:limit]
+    )
+
+
+def get_health():
+    """Everything the tracker health dashboard shows.
+
+    Sections that need Redis are None when it is unavailable.
+    """
+    health = {
+        "counts": get_tracker_counts(),
+        "failures": get_recent_failures(),
+    }
+    sections = {
+        "stale": get_stale_trackers,
+        "failing": get_failing_trackers,
+        "circuits": get_open_circuits,
+        "queues": lambda: sorted(get_queue_stats().items()),
+        "browser_sessions": get_browser_sessions,
+    }
+    for name, get in sections.items():
+        try:
+            health[name] = get()
+        except Exception as e:
+            print(type(e).__name__, f"reading the tracker health ({name})")
+            health[name] = None
+    return health
@@ -1,10 +1,17 @@
+from app.models import AppTracker
 from app.utils.notifications import send_slack_message
 
 
 def notify_error(Task):
     if not Task.success:
+        # Tasks only carry the tracker id
+        tracker_url = (
+            AppTracker.objects.filter(id=Task.args[0])
+            .values_list("url", flat=True)
+            .first()
+        )
         send_slack_message(
-            f"ERROR! (Tracker ID: {Task.args[0]} - {Task.args[4]})",
+            f"ERROR! (Tracker ID: {Task.args[0]} - {tracker_url})",
             Task.result,
             "TestAppBot",
             "SLACK_KEY_ERROR_ALERTS",
@@ -0,0 +1,105 @@
+import time
+from functools import wraps
+from uuid import uuid4
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+# Delete the lease only if it is still ours (it may have expired and been
+# taken by another run)
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def lease_key(tracker_id):
+    return f"trackers:lease:{tracker_id}"
+
+
+def last_run_key(tracker_id):
+    return f"trackers:last_run:{tracker_id}"
+
+
+def acquire_lease(tracker_id, ttl=None):
+    """Take the run lease of a tracker
+
+    Args:
+        tracker_id (int): The id of the tracker
+        ttl (int, optional): Seconds before the lease expires on its own.
+            Defaults to the cluster timeout plus a minute.
+
+    Returns:
+        string: The lease token, None if another run holds the lease
+    """
+    token = uuid4().hex
+    ttl = ttl or settings.Q_CLUSTER["timeout"] + 60
+    if get_redis_connection("default").set(
+        lease_key(tracker_id), token, nx=True, ex=ttl
+    ):
+        return token
+    return None
+
+
+def release_lease(tracker_id, token):
+    conn = get_redis_connection("default")
+    conn.eval(RELEASE_SCRIPT, 1, lease_key(tracker_id), token)
+    # Remember when it last ran for the backlog check
+    conn.set(last_run_key(tracker_id), time.time(), ex=3600)
+
+
+def is_stale_run(tracker_id):
+    """Whether a run should be skipped because the queue is behind.
+
+    When more than TRACKER_BACKLOG_THRESHOLD tasks are waiting, a run of a
+    tracker that completed less than TRACKER_MIN_RUN_INTERVAL seconds ago is
+    a queued duplicate and is skipped. A threshold of 0 disables the check.
+    """
+    if not settings.TRACKER_BACKLOG_THRESHOLD:
+        return False
+
+    from django_q.brokers import get_broker
+
+    if get_broker().queue_size() <= settings.TRACKER_BACKLOG_THRESHOLD:
+        return False
+
+    last_run = get_redis_connection("default").get(last_run_key(tracker_id))
+    return (
+        last_run is not None
+        and time.time() - float(last_run) < settings.TRACKER_MIN_RUN_INTERVAL
+    )
+
+
+def single_flight(func):
+    """Run a tracker task only if no other run of the same tracker is live.
+
+    A run finding a live lease is dropped: the live run is already fetching
+    the same page. If Redis is unavailable the run goes ahead unguarded.
+    """
+
+    @wraps(func)
+    def wrapper(id, *args, **kwargs):
+        try:
+            if is_stale_run(id):
+                print(f"Tracker {id} ran recently and the queue is behind, skipped")
+                return
+            token = acquire_lease(id)
+        except Exception as e:
+            print(type(e).__name__, f"taking the lease of tracker {id}")
+            return func(id, *args, **kwargs)
+
+        if token is None:
+            print(f"Tracker {id} is already running, run dropped")
+            return
+
+        try:
+            return func(id, *args, **kwargs)
+        finally:
+            try:
+                release_lease(id, token)
+            except Exception as e:
+                print(type(e).__name__, f"releasing the lease of tracker {id}")
+
+    return wrapper
@@ -0,0 +1,236 @@
+import time
+from collections import defaultdict
+from uuid import uuid4
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+# Every process (web, django-q workers, run_trackers) updates the same Redis
+# hashes, so the /metrics view reports the whole cluster whoever serves it.
+#
+# metrics:<name> hash fields:
+#   counter/gauge: <labels> -> value
+#   histogram: <labels>|<le> -> observations in that bucket (not cumulative),
+#       <labels>|sum and <labels>|count
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 5e5, 1e6, 5e6, 1e7)
+
+METRICS = {
+    "tracker_runs_total": ("counter", "Tracker runs by type, method and status"),
+    "tracker_run_errors_total": ("counter", "Failed tracker runs by error class"),
+    "tracker_run_duration_seconds": (
+        "histogram",
+        "Tracker run duration",
+        DURATION_BUCKETS,
+    ),
+    "tracker_fetch_duration_seconds": (
+        "histogram",
+        "Page fetch duration (HTTP request or browser load)",
+        DURATION_BUCKETS,
+    ),
+    "tracker_fetch_bytes": ("histogram", "Fetched page size", BYTES_BUCKETS),
+    "notification_send_duration_seconds": (
+        "histogram",
+        "Slack message send duration",
+        DURATION_BUCKETS,
+    ),
+}
+
+BROWSER_SESSIONS_KEY = "metrics:browser_sessions"
+
+
+def metric_key(name):
+    return f"metrics:{name}"
+
+
+def escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def format_labels(labels):
+    return ",".join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items()))
+
+
+def sample(name, labels, value):
+    if labels:
+        return f"{name}{{{labels}}} {float(value)!r}"
+    return f"{name} {float(value)!r}"
+
+
+def inc(name, value=1, pipe=None, **labels):
+    """Increment a counter"""
+    conn = pipe or get_redis_connection("default")
+    conn.hincrbyfloat(metric_key(name), format_labels(labels), value)
+
+
+def observe(name, value, pipe=None, **labels):
+    """Add an observation to a histogram"""
+    conn = pipe or get_redis_connection("default")
+    buckets = METRICS[name][2]
+    le = next((str(b) for b in buckets if value <= b), "+Inf")
+    labels = format_labels(labels)
+    conn.hincrby(metric_key(name), f"{labels}|{le}", 1)
+    conn.hincrbyfloat(metric_key(name), f"{labels}|sum", value)
+    conn.hincrby(metric_key(name), f"{labels}|count", 1)
+
+
+def record_run(stats):
+    """Runs, errors, durations and fetch sizes of a finished tracker run
+
+    Args:
+        stats (RunStats): The stats of the run
+    """
+    try:
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        data = stats.as_dict()
+        labels = {"type": stats.t_type or "", "method": stats.method or ""}
+        status = "error" if stats.error else "ok"
+
+        inc("tracker_runs_total", pipe=pipe, status=status, **labels)
+        if stats.error:
+            inc("tracker_run_errors_total", pipe=pipe, error=stats.error, **labels)
+        observe("tracker_run_duration_seconds", data["total"], pipe=pipe, **labels)
+
+        stages = data["stages"]
+        fetch = stages.get("browser", stages.get("ttfb", 0) + stages.get("download", 0))
+        if fetch:
+            observe(
+                "tracker_fetch_duration_seconds",
+                fetch,
+                pipe=pipe,
+                method=labels["method"],
+            )
+        if data["bytes"]:
+            observe(
+                "tracker_fetch_bytes", data["bytes"], pipe=pipe, method=labels["method"]
+            )
+        pipe.execute()
+    except Exception as e:
+        print(type(e).__name__, "recording the run metrics")
+
+
+def record_notification(seconds, status):
+    try:
+        observe("notification_send_duration_seconds", seconds, status=status)
+    except Exception as e:
+        print(type(e).__name__, "recording the notification metrics")
+
+
+def browser_session_started():
+    """Count a live Selenium session
+
+    Returns:
+        string: The session id to pass to browser_session_ended
+    """
+    session_id = uuid4().hex
+    try:
+        get_redis_connection("default").zadd(
+            BROWSER_SESSIONS_KEY, {session_id: time.time()}
+        )
+    except Exception as e:
+        print(type(e).__name__, "recording the browser session")
+    return session_id
+
+
+def browser_session_ended(session_id):
+    try:
+        get_redis_connection("default").zrem(BROWSER_SESSIONS_KEY, session_id)
+    except Exception as e:
+        print(type(e).__name__, "recording the browser session")
+
+
+def get_browser_sessions():
+    # Sessions of killed workers never end, drop those older than a task
+    conn = get_redis_connection("default")
+    timeout = settings.Q_CLUSTERS["browser"]["timeout"]
+    conn.zremrangebyscore(BROWSER_SESSIONS_KEY, 0, time.time() - timeout)
+    return conn.zcard(BROWSER_SESSIONS_KEY)
+
+
+def get_queue_stats():
+    """Depth and age of the oldest task of every django-q cluster queue
+
+    Returns:
+        dict: cluster pool -> (depth, oldest task age in seconds or None)
+    """
+    from django_q.signing import SignedPackage
+
+    conn = get_redis_connection("default")
+    stats = {}
+    for pool, cluster in settings.Q_CLUSTERS.items():
+        # List of django_q's Redis broker
+        key = f"django_q:{cluster['name']}:q"
+        age = None
+        # Enqueued with RPUSH and taken with BLPOP, the oldest is first
+        oldest = conn.lindex(key, 0)
+        if oldest is not None:
+            try:
+                started = SignedPackage.loads(oldest)["started"]
+                age = max(0, time.time() - started.timestamp())
+            except Exception:
+                pass
+        stats[pool] = (conn.llen(key), age)
+    return stats
+
+
+def render_samples(name, kind, fields, lines):
+    if kind != "histogram":
+        for labels, value in sorted(fields.items()):
+            lines.append(sample(name, labels, value))
+        return
+
+    series = defaultdict(dict)
+    for field, value in fields.items():
+        labels, _, le = field.rpartition("|")
+        series[labels][le] = float(value)
+
+    buckets = [str(b) for b in METRICS[name][2]] + ["+Inf"]
+    for labels, values in sorted(series.items()):
+        sep = "," if labels else ""
+        cumulative = 0
+        for le in buckets:
+            cumulative += values.get(le, 0)
+            bucket = f'{labels}{sep}le="{le}"'
+            lines.append(sample(f"{name}_bucket", bucket, cumulative))
+        lines.append(sample(f"{name}_sum", labels, values.get("sum", 0)))
+        lines.append(sample(f"{name}_count", labels, values.get("count", 0)))
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    conn = get_redis_connection("default")
+    pipe = conn.pipeline(transaction=False)
+    for name in METRICS:
+        pipe.hgetall(metric_key(name))
+
+    lines = []
+    for (name, metric), fields in zip(METRICS.items(), pipe.execute()):
+        kind, help = metric[:2]
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        fields = {k.decode(): v.decode() for k, v in fields.items()}
+        render_samples(name, kind, fields, lines)
+
+    lines.append("# HELP django_q_queue_depth Tasks waiting in the cluster queue")
+    lines.append("# TYPE django_q_queue_depth gauge")
+    queues = get_queue_stats()
+    for pool, (depth, _) in queues.items():
+        lines.append(sample("django_q_queue_depth", f'cluster="{pool}"', depth))
+    lines.append(
+        "# HELP django_q_queue_oldest_age_seconds Age of the oldest queued task"
+    )
+    lines.append("# TYPE django_q_queue_oldest_age_seconds gauge")
+    for pool, (_, age) in queues.items():
+        lines.append(
+            sample("django_q_queue_oldest_age_seconds", f'cluster="{pool}"', age or 0)
+        )
+
+    workers = settings.Q_CLUSTERS["browser"]["workers"]
+    lines.append("# HELP browser_sessions Live Selenium sessions")
+    lines.append("# TYPE browser_sessions gauge")
+    lines.append(sample("browser_sessions", "", get_browser_sessions()))
+    lines.append("# HELP browser_pool_size Browser cluster workers")
+    lines.append("# TYPE browser_pool_size gauge")
+    lines.append(sample("browser_pool_size", "", workers))
+
+    return "\n".join(lines) + "\n"
@@ -1,6 +1,9 @@
 import json
 import requests
 import os
+import time
+from .metrics import record_notification
+from .stats import stage
 
 
 def send_slack_message(title, message, username, token):
@@ -23,10 +26,19 @@ def send_slack_message(title, message, username, token):
             }
         ],
     }
-    response = requests.post(
-        webhook_url,
-        data=json.dumps(slack_data),
-        headers={"Content-Type": "application/json"},
+    start = time.perf_counter()
+    try:
+        with stage("notify"):
+            response = requests.post(
+                webhook_url,
+                data=json.dumps(slack_data),
+                headers={"Content-Type": "application/json"},
+            )
+    except Exception:
+        record_notification(time.perf_counter() - start, "error")
+        raise
+    record_notification(
+        time.perf_counter() - start, "ok" if response.status_code == 200 else "error"
     )
     if response.status_code != 200:
         raise ValueError(
@@ -0,0 +1,203 @@
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Greatest, Least, TruncDate
+from django.utils import timezone
+
+from ..models import (
+    AppPriceRollup,
+    AppProductOffer,
+    AppTracker,
+    AppTrackerChange,
+)
+from .timeseries import ArrayFirst
+
+
+def record_price(tracker_id, price, at=None):
+    """Fold a price change into the tracker's daily rollup.
+
+    The row is created on the first change of the day and then updated in
+    place, so concurrent changes never lose an update.
+
+    Args:
+        tracker_id (int): The id of the tracker
+        price (float): The new price
+        at (datetime, optional): When the change was recorded. Defaults to now.
+    """
+    at = at or timezone.now()
+    day = timezone.localdate(at)
+
+    AppPriceRollup.objects.bulk_create(
+        [
+            AppPriceRollup(
+                tracker_id=tracker_id,
+                day=day,
+                open=price,
+                low=price,
+                high=price,
+                last=price,
+                changes=0,
+                first_at=at,
+                last_at=at,
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    AppPriceRollup.objects.filter(tracker_id=tracker_id, day=day).update(
+        low=Least("low", Value(price)),
+        high=Greatest("high", Value(price)),
+        last=price,
+        last_at=at,
+        changes=F("changes") + 1,
+    )
+
+
+def rebuild_rollups(tracker_ids=None, since=None, batch_size=1000):
+    """Rebuild daily rollups from the raw change log.
+
+    Args:
+        tracker_ids (list[int], optional): Only rebuild these trackers
+        since (date, optional): Only rebuild from this day onwards
+        batch_size (int, optional): Rows per insert. Defaults to 1000.
+
+    Returns:
+        int: The number of rollup rows written
+    """
+    changes = AppTrackerChange.objects.filter(price__isnull=False)
+    rollups = AppPriceRollup.objects.all()
+    if tracker_ids:
+        changes = changes.filter(tracker_id__in=tracker_ids)
+        rollups = rollups.filter(tracker_id__in=tracker_ids)
+    if since:
+        changes = changes.filter(created_at__date__gte=since)
+        rollups = rollups.filter(day__gte=since)
+
+    days = (
+        changes.annotate(day=TruncDate("created_at"))
+        .values("tracker_id", "day")
+        .annotate(
+            open=ArrayFirst(ArrayAgg("price", ordering="created_at")),
+            low=Min("price"),
+            high=Max("price"),
+            last=ArrayFirst(ArrayAgg("price", ordering="-created_at")),
+            changes=Count("id"),
+            first_at=Min("created_at"),
+            last_at=Max("created_at"),
+        )
+        .order_by()
+    )
+
+    with transaction.atomic():
+        rollups.delete()
+        rows = AppPriceRollup.objects.bulk_create(
+            (AppPriceRollup(**day) for day in days.iterator()),
+            batch_size=batch_size,
+        )
+
+    return len(rows)
+
+
+def get_latest_prices(product_id=None):
+    """Latest known price of every product tracker (offer)
+
+    Args:
+        product_id (int, optional): Only the offers of this product
+
+    Returns:
+        QuerySet: One rollup per tracker, the most recent day
+    """
+    rollups = AppPriceRollup.objects.filter(tracker__product__isnull=False)
+    if product_id:
+        rollups = rollups.filter(tracker__product_id=product_id)
+    return rollups.order_by("tracker_id", "-day").distinct("tracker_id")
+
+
+def update_offer(tracker_id, **fields):
+    """Update the product offer of a tracker after a price/availability change.
+
+    Trackers without a product have no offer and are ignored.
+
+    Args:
+        tracker_id (int): The id of the tracker
+        **fields: price and/or available
+    """
+    tracker = (
+        AppTracker.objects.filter(id=tracker_id, product__isnull=False)
+        .values("product_id", "site_id", "location_id")
+        .first()
+    )
+    if tracker:
+        AppProductOffer.objects.update_or_create(
+            tracker_id=tracker_id, defaults={**tracker, **fields}
+        )
+
+
+def get_offers(product_id):
+    """Current offers of a product, cheapest first (unknown prices last)
+
+    Args:
+        product_id (int): The id of the product
+
+    Returns:
+        QuerySet: The offers
+    """
+    return (
+        AppProductOffer.objects.filter(product_id=product_id)
+        .select_related("site", "location")
+        .order_by(F("price").asc(nulls_last=True), "site__name", "location__name")
+    )
+
+
+def get_best_offer(product_id):
+    """Cheapest available (or unknown availability) offer of a product
+
+    Args:
+        product_id (int): The id of the product
+
+    Returns:
+        AppProductOffer: The offer, None if there is no priced offer
+    """
+    return (
+        get_offers(product_id)
+        .filter(price__isnull=False)
+        .exclude(available=False)
+        .first()
+    )
+
+
+def rebuild_offers(tracker_ids=None):
+    """Rebuild the product offers from the latest changes of their trackers.
+
+    The price is the one of the latest priced change, the availability the
+    one of the latest change that recorded it (either can be missing from
+    a change).
+
+    Args:
+        tracker_ids (list[int], optional): Only rebuild these trackers
+
+    Returns:
+        int: The number of offers written
+    """
+    changes = AppTrackerChange.objects.filter(tracker=OuterRef("pk")).order_by("-id")
+    trackers = (
+        AppTracker.objects.filter(product__isnull=False)
+        .annotate(
+            price=Subquery(changes.filter(price__isnull=False).values("price")[:1]),
+            available=Subquery(
+                changes.filter(available__isnull=False).values("available")[:1]
+            ),
+        )
+        .filter(Q(price__isnull=False) | Q(available__isnull=False))
+    )
+    if tracker_ids:
+        trackers = trackers.filter(id__in=tracker_ids)
+
+    count = 0
+    with transaction.atomic():
+        for tracker in trackers.values("id", "price", "available").iterator():
+            update_offer(
+                tracker["id"], price=tracker["price"], available=tracker["available"]
+            )
+            count += 1
+
+    return count
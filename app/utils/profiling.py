@@ -0,0 +1,178 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from ..models import AppTrackerProfile
+
+# Functions/stacks kept in the profile summary
+SUMMARY_SIZE = 30
+
+
+def profile_key(tracker_id):
+    return f"trackers:profile:{tracker_id}"
+
+
+def profile_next_runs(tracker_id, runs):
+    """Profile the next runs of a tracker, whatever the sample rate"""
+    get_redis_connection("default").set(profile_key(tracker_id), runs, ex=86400)
+
+
+def should_profile(tracker_id):
+    try:
+        conn = get_redis_connection("default")
+        if conn.exists(profile_key(tracker_id)):
+            if conn.decr(profile_key(tracker_id)) <= 0:
+                conn.delete(profile_key(tracker_id))
+            return True
+    except Exception as e:
+        print(type(e).__name__, "checking the tracker profiling")
+    return random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+class StackSampler(object):
+    """Low overhead profiler sampling the stack of the calling thread.
+
+    A background thread reads the stack every `interval` seconds; the
+    samples are kept as folded stacks ("outer;inner count"), the input of
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = Counter()
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                filename = os.path.basename(code.co_filename)
+                stack.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        return "\n".join(f"{stack} {n}" for stack, n in self.counts.most_common())
+
+    def summary(self):
+        # Leaf functions by sample count
+        total = sum(self.counts.values()) or 1
+        leaves = Counter()
+        for stack, n in self.counts.items():
+            leaves[stack.rsplit(";", 1)[-1]] += n
+        return "\n".join(
+            f"{n * 100 / total:5.1f}% {leaf}"
+            for leaf, n in leaves.most_common(SUMMARY_SIZE)
+        )
+
+
+def cprofile_data(profile):
+    """Compressed pstats dump and summary of a cProfile run"""
+    profile.create_stats()
+    # Before pstats, it takes the stats away from the profile
+    data = zlib.compress(marshal.dumps(profile.stats))
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream).strip_dirs()
+    stats.sort_stats("cumulative").print_stats(SUMMARY_SIZE)
+    return data, stream.getvalue()
+
+
+def save_profile(tracker_id, profiler, duration, error, summary, data):
+    try:
+        AppTrackerProfile.objects.create(
+            tracker_id=tracker_id,
+            profiler=profiler,
+            duration=duration,
+            error=error,
+            summary=summary,
+            data=data,
+        )
+        # Keep only the latest PROFILE_KEEP profiles of the tracker
+        profiles = AppTrackerProfile.objects.filter(tracker_id=tracker_id)
+        latest = profiles.order_by("-created_at").values("id")[: settings.PROFILE_KEEP]
+        profiles.exclude(id__in=latest).delete()
+    except Exception as e:
+        print(type(e).__name__, "saving the tracker profile")
+
+
+@contextmanager
+def profiling(tracker_id):
+    """Profile the block, in the calling thread, as a run of the tracker.
+
+    PROFILER picks cProfile ("cprofile") or the stack sampler ("sampler").
+    """
+    profiler = settings.PROFILER
+    error = None
+    profile = sampler = None
+    start = time.perf_counter()
+    try:
+        if profiler == "sampler":
+            with StackSampler(settings.PROFILE_SAMPLE_INTERVAL) as sampler:
+                yield
+            return
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active in this process
+            profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        if sampler is not None:
+            data = zlib.compress(sampler.folded().encode())
+            save_profile(tracker_id, profiler, duration, error, sampler.summary(), data)
+        elif profile is not None:
+            data, summary = cprofile_data(profile)
+            save_profile(tracker_id, profiler, duration, error, summary, data)
+
+
+def profiled(func):
+    """Profile sampled runs of a tracker task (see profiling).
+
+    Runs are picked at PROFILE_SAMPLE_RATE, plus the next runs of the
+    trackers set with profile_next_runs.
+    """
+
+    @wraps(func)
+    def wrapper(id, *args, **kwargs):
+        if not should_profile(id):
+            return func(id, *args, **kwargs)
+        with profiling(id):
+            return func(id, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,213 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+
+import requests
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .breaker import record_result, should_skip
+from .configs import get_config
+from .leases import acquire_lease, release_lease
+from .profiling import profiling, should_profile
+from .stats import RunStats, run_stats, save_run_stats, stage
+from .notifications import send_slack_message
+from . import tracker as checks
+
+
+def save_result(tracker, result):
+    """Record a fetched result with the same semantics as the check_* tasks"""
+    if tracker.t_type == "new_item":
+        title, item_url, location = result
+        checks.save_new_item(tracker.id, title, item_url, location)
+    elif tracker.t_type == "change":
+        checks.save_change(tracker.id, tracker.task_name, tracker.url, result)
+    else:
+        checks.save_price_and_availability(
+            tracker.id, tracker.task_name, tracker.url, result
+        )
+
+
+def get_parser(tracker):
+    # The function parsing the tracker's page, and its arguments after it
+    if tracker.t_type == "new_item":
+        return checks.parse_new_items, (tracker.params,)
+    return checks.parse_content, (tracker.params, tracker.url)
+
+
+def has_feed(tracker):
+    # New item trackers read their site feed instead, see check_new_item
+    return tracker.t_type == "new_item" and bool(get_config(tracker.id).feed)
+
+
+def record_failure(tracker, stats, error):
+    print(type(error).__name__, f"in tracker {tracker.id}")
+    stats.error = type(error).__name__
+    record_result(tracker.id, tracker.site_id, error)
+    try:
+        report_error(tracker, error)
+    except Exception as e:
+        print(type(e).__name__, "reporting tracker error")
+
+
+def report_error(tracker, error):
+    # Same alert as the django-q failure hook
+    send_slack_message(
+        f"ERROR! (Tracker ID: {tracker.id} - {tracker.url})",
+        f"{type(error).__name__}: {error}",
+        "TestAppBot",
+        "SLACK_KEY_ERROR_ALERTS",
+    )
+
+
+class TrackerRunner(object):
+    """Run many xpath trackers concurrently in one process.
+
+    Fetches share a single pooled requests Session and at most `concurrency`
+    requests are in flight; pages are parsed in a separate thread or process
+    pool and results are written through the same save_* functions the
+    django-q tasks use. New item trackers of sites with a feed and the runs
+    picked for profiling run whole in a fetch thread instead (run_sync).
+    """
+
+    def __init__(self, concurrency=50, parse_workers=4, parse_processes=False):
+        self.concurrency = concurrency
+        self.loop = None
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=concurrency, pool_maxsize=concurrency
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.fetch_pool = ThreadPoolExecutor(concurrency)
+        if parse_processes:
+            self.parse_pool = ProcessPoolExecutor(parse_workers)
+        else:
+            self.parse_pool = ThreadPoolExecutor(parse_workers)
+
+    def get_semaphore(self):
+        # One semaphore per event loop, shared by concurrent run() calls
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self.semaphore
+
+    def close(self):
+        self.fetch_pool.shutdown()
+        self.parse_pool.shutdown()
+        self.session.close()
+
+    async def run(self, trackers):
+        """Run the trackers once
+
+        Args:
+            trackers (list[AppTracker]): xpath trackers, with task_name set
+
+        Returns:
+            dict: ok/failed/skipped counts and elapsed seconds
+        """
+        start = time.monotonic()
+        results = await asyncio.gather(*(self.run_tracker(t) for t in trackers))
+
+        return {
+            "ok": results.count(True),
+            "failed": results.count(False),
+            "skipped": results.count(None),
+            "elapsed": time.monotonic() - start,
+        }
+
+    async def run_tracker(self, tracker):
+        # Same circuit breaker and single-flight lease as the django-q tasks
+        if await sync_to_async(should_skip)(tracker.id, tracker.site_id):
+            return None
+
+        try:
+            token = await sync_to_async(acquire_lease)(tracker.id)
+        except Exception as e:
+            print(type(e).__name__, f"taking the lease of tracker {tracker.id}")
+            token = ""
+        if token is None:
+            return None
+
+        # Each tracker runs in its own asyncio task, hence its own context
+        stats = RunStats(tracker.t_type, tracker.method)
+        run_stats.set(stats)
+        try:
+            profile = await sync_to_async(should_profile)(tracker.id)
+            try:
+                feed = await sync_to_async(has_feed)(tracker)
+            except Exception as e:
+                await sync_to_async(record_failure)(tracker, stats, e)
+                return False
+            if feed or profile:
+                return await self.run_in_thread(tracker, stats, profile)
+            return await self.fetch_and_save(tracker, stats)
+        finally:
+            await sync_to_async(save_run_stats)(tracker.id, stats)
+            if token:
+                try:
+                    await sync_to_async(release_lease)(tracker.id, token)
+                except Exception as e:
+                    print(type(e).__name__, f"releasing the lease of {tracker.id}")
+
+    async def fetch_and_save(self, tracker, stats):
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.get_semaphore():
+                # Run in a copy of the context so the fetch records its stages
+                page = await loop.run_in_executor(
+                    self.fetch_pool,
+                    contextvars.copy_context().run,
+                    checks.fetch_page,
+                    tracker.url,
+                    self.session,
+                )
+            # Parsing may run in another process, timed as a whole
+            parse, args = get_parser(tracker)
+            with stage("parse"):
+                result = await loop.run_in_executor(
+                    self.parse_pool, parse, page, *args
+                )
+            await sync_to_async(save_result)(tracker, result)
+        except Exception as e:
+            await sync_to_async(record_failure)(tracker, stats, e)
+            return False
+        await sync_to_async(record_result)(tracker.id, tracker.site_id)
+        return True
+
+    async def run_in_thread(self, tracker, stats, profile):
+        """Run the tracker whole in a fetch pool thread, like a django-q task.
+
+        For the new item trackers of sites with a feed, read like
+        check_new_item reads it, and the sampled runs, profiled like the
+        tasks (profilers follow a single thread).
+        """
+        async with self.get_semaphore():
+            return await asyncio.get_running_loop().run_in_executor(
+                self.fetch_pool,
+                contextvars.copy_context().run,
+                self.run_sync,
+                tracker,
+                stats,
+                profile,
+            )
+
+    def run_sync(self, tracker, stats, profile):
+        try:
+            with profiling(tracker.id) if profile else nullcontext():
+                if has_feed(tracker):
+                    checks.check_feed(get_config(tracker.id))
+                else:
+                    page = checks.fetch_page(tracker.url, self.session)
+                    parse, args = get_parser(tracker)
+                    save_result(tracker, parse(page, *args))
+        except Exception as e:
+            record_failure(tracker, stats, e)
+            return False
+        finally:
+            close_old_connections()
+        record_result(tracker.id, tracker.site_id)
+        return True
@@ -0,0 +1,195 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from cron_converter import Cron
+from django.utils import timezone
+
+from ..constants import SCHEDULER_RESYNC_INTERVAL
+from ..models import AppTracker
+from .events import get_tracker_events, subscribe_tracker_events
+
+
+def get_fingerprint(tracker):
+    # The tracker fields, a change reschedules the tracker
+    return [
+        getattr(tracker, field.attname)
+        for field in AppTracker._meta.concrete_fields
+        if field.attname not in ("created_at", "updated_at")
+    ]
+
+
+class TrackerScheduler(object):
+    """Dispatch due xpath trackers to a TrackerRunner without DB polling.
+
+    Active trackers are loaded once; their next run times live in a heap of
+    (due, tracker_id, version) entries. Tracker saves/deletes arrive through
+    the Redis tracker events and bump the version of the tracker, so stale
+    heap entries are skipped when popped instead of being searched for.
+    Every SCHEDULER_RESYNC_INTERVAL, all the trackers are reloaded and
+    compared with the heap, for the events missed (dropped pub/sub messages,
+    bulk updates skipping the signals).
+
+    The schedule is not persisted: after a restart every tracker runs once
+    and then follows its frequency/cron schedule (repeats is not enforced).
+    """
+
+    def __init__(self, runner, batch_size=100, poll=1.0):
+        self.runner = runner
+        self.batch_size = batch_size
+        self.poll = poll
+        self.heap = []
+        self.trackers = {}
+        self.versions = {}
+        self.running = set()
+
+    def get_trackers(self, ids=None):
+        trackers = AppTracker.objects.filter(active=True, method="xpath")
+        if ids is not None:
+            trackers = trackers.filter(id__in=ids)
+        trackers = list(trackers.select_related("site", "product__brand"))
+        for t in trackers:
+            t.task_name = t.get_task_name()
+        return trackers
+
+    def add(self, tracker, due):
+        version = self.versions.get(tracker.id, 0) + 1
+        self.versions[tracker.id] = version
+        self.trackers[tracker.id] = tracker
+        heapq.heappush(self.heap, (due, tracker.id, version))
+
+    def remove(self, tracker_id):
+        self.trackers.pop(tracker_id, None)
+        self.versions[tracker_id] = self.versions.get(tracker_id, 0) + 1
+
+    def load(self):
+        now = time.time()
+        for tracker in self.get_trackers():
+            self.add(tracker, now)
+
+    def update(self, tracker, now):
+        """Run a new or changed tracker soon, keep the schedule of the others
+
+        Events are also published for trackers whose site or site feed
+        changed, those only get the reloaded tracker.
+
+        Returns:
+            bool: Whether the tracker was (re)scheduled
+        """
+        current = self.trackers.get(tracker.id)
+        if current is None or get_fingerprint(current) != get_fingerprint(tracker):
+            self.add(tracker, now)
+            return True
+        self.trackers[tracker.id] = tracker
+        return False
+
+    def refresh(self, tracker_ids):
+        """Reload trackers after save/delete events"""
+        found = {t.id: t for t in self.get_trackers(tracker_ids)}
+        now = time.time()
+        for tracker_id in tracker_ids:
+            if tracker_id in found:
+                self.update(found[tracker_id], now)
+            else:
+                # Deleted, deactivated or no longer xpath
+                self.remove(tracker_id)
+
+    def resync(self):
+        """Reload every tracker, like refresh for the events missed
+
+        Returns:
+            int: The number of trackers added, changed or removed
+        """
+        found = {t.id: t for t in self.get_trackers()}
+        now = time.time()
+        removed = set(self.trackers) - set(found)
+        for tracker_id in removed:
+            self.remove(tracker_id)
+        changed = [self.update(tracker, now) for tracker in found.values()]
+        return len(removed) + sum(changed)
+
+    def next_run(self, tracker, due, now):
+        if tracker.cron_schedule:
+            start = datetime.fromtimestamp(now, timezone.get_current_timezone())
+            return Cron(tracker.cron_schedule).schedule(start).next().timestamp()
+
+        # Fixed rate, skipping the runs missed while behind (no catch up)
+        period = max(tracker.frequency, 1) * 60
+        next_due = due + period
+        if next_due <= now:
+            next_due += ((now - next_due) // period + 1) * period
+        return next_due
+
+    def pop_due(self, now):
+        """Pop the due trackers and schedule their next run
+
+        Returns:
+            list[AppTracker]: At most batch_size trackers to run now
+        """
+        batch = []
+        while self.heap and self.heap[0][0] <= now and len(batch) < self.batch_size:
+            due, tracker_id, version = heapq.heappop(self.heap)
+            if self.versions.get(tracker_id) != version:
+                # Superseded by a newer entry or removed
+                continue
+
+            tracker = self.trackers[tracker_id]
+            heapq.heappush(
+                self.heap, (self.next_run(tracker, due, now), tracker_id, version)
+            )
+            if tracker_id in self.running:
+                # Previous run still in flight, skip this one
+                continue
+            batch.append(tracker)
+
+        return batch
+
+    async def dispatch(self, batch):
+        ids = {t.id for t in batch}
+        self.running |= ids
+        try:
+            await self.runner.run(batch)
+        finally:
+            self.running -= ids
+
+    async def serve(self):
+        """Run forever, dispatching due trackers in batches"""
+        await sync_to_async(self.load)()
+        pubsub = await sync_to_async(subscribe_tracker_events)()
+        resynced = time.monotonic()
+        tasks = set()
+
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = await sync_to_async(subscribe_tracker_events)()
+                    # Events published while unsubscribed are lost
+                    resynced = None
+                events = await sync_to_async(get_tracker_events)(pubsub)
+            except Exception as e:
+                print(type(e).__name__, "reading the tracker events")
+                pubsub, events = None, []
+            if events:
+                await sync_to_async(self.refresh)(list({e["id"] for e in events}))
+            if (
+                resynced is None
+                or time.monotonic() - resynced >= SCHEDULER_RESYNC_INTERVAL
+            ):
+                changed = await sync_to_async(self.resync)()
+                if changed:
+                    print(f"Scheduler resync: {changed} trackers out of date")
+                resynced = time.monotonic()
+
+            batch = self.pop_due(time.time())
+            if batch:
+                task = asyncio.create_task(self.dispatch(batch))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                continue
+
+            wait = self.poll
+            if self.heap:
+                wait = min(wait, max(0, self.heap[0][0] - time.time()))
+            await asyncio.sleep(wait)
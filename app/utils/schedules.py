@@ -0,0 +1,125 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_q.models import Schedule
+
+from ..models import AppTracker
+from .tracker import get_auto_methods
+
+TASK_PREFIX = "app.utils.tracker.check_"
+ERROR_HOOK = "app.utils.hooks.notify_error"
+
+# Kept in line with the tracker. Not repeats: django-q counts it down on every
+# run, it is only set on creation or with reset_repeats
+SCHEDULE_FIELDS = (
+    "func",
+    "hook",
+    "args",
+    "cluster",
+    "schedule_type",
+    "cron",
+    "minutes",
+)
+
+
+def is_queued(tracker):
+    # xpath trackers run by the in-process scheduler have no django-q schedule
+    return tracker.active and not (
+        settings.TRACKER_ENGINE == "scheduler" and tracker.method == "xpath"
+    )
+
+
+def get_schedule_fields(tracker, auto_method=None):
+    """Schedule fields of a tracker (see SCHEDULE_FIELDS)
+
+    Args:
+        tracker (AppTracker): The tracker
+        auto_method (string, optional): The method an "auto" tracker last
+            needed, looked up when not given
+    """
+    fields = {
+        "func": TASK_PREFIX + tracker.t_type,
+        "hook": ERROR_HOOK,
+        # Only the id, workers load the rest with app.utils.configs.get_config
+        "args": repr((tracker.id,)),
+        "cluster": tracker.get_cluster(auto_method),
+    }
+    if tracker.cron_schedule:
+        fields.update(schedule_type=Schedule.CRON, cron=tracker.cron_schedule)
+        fields["minutes"] = None
+    else:
+        fields.update(schedule_type=Schedule.MINUTES, minutes=tracker.frequency)
+        fields["cron"] = None
+    return fields
+
+
+def sync_schedules(trackers=None, reset_repeats=False):
+    """Create, update and delete the django-q schedules of trackers in bulk.
+
+    Active trackers get a schedule named after their id, the others lose it.
+    Everything is written in one transaction with bulk queries, without
+    going through the per-tracker create_task signal.
+
+    Args:
+        trackers (iterable[AppTracker], optional): The trackers to sync.
+            Defaults to all of them, also deleting the tracker schedules left
+            without a tracker and duplicated schedules.
+
+    Returns:
+        dict: created, updated and deleted schedule counts
+    """
+    prune = trackers is None
+    trackers = list(AppTracker.objects.all() if prune else trackers)
+
+    with transaction.atomic():
+        schedules = Schedule.objects.filter(func__startswith=TASK_PREFIX)
+        if not prune:
+            schedules = schedules.filter(name__in=[str(t.id) for t in trackers])
+
+        existing = {}
+        delete = []
+        for schedule in schedules.select_for_update().order_by("id"):
+            if schedule.name in existing:
+                delete.append(schedule.id)
+            else:
+                existing[schedule.name] = schedule
+
+        auto_methods = get_auto_methods([t.id for t in trackers if t.method == "auto"])
+        create = []
+        update = []
+        for tracker in trackers:
+            schedule = existing.pop(str(tracker.id), None)
+            if not is_queued(tracker):
+                if schedule is not None:
+                    delete.append(schedule.id)
+                continue
+
+            fields = get_schedule_fields(tracker, auto_methods.get(tracker.id))
+            if schedule is None:
+                create.append(
+                    Schedule(
+                        name=str(tracker.id),
+                        repeats=tracker.repeats,
+                        next_run=timezone.now(),
+                        **fields,
+                    )
+                )
+                continue
+
+            if reset_repeats:
+                fields["repeats"] = tracker.repeats
+            if any(getattr(schedule, k) != v for k, v in fields.items()):
+                for k, v in fields.items():
+                    setattr(schedule, k, v)
+                update.append(schedule)
+
+        if prune:
+            # Trackers deleted without their schedule
+            delete.extend(s.id for s in existing.values())
+
+        Schedule.objects.bulk_create(create)
+        update_fields = SCHEDULE_FIELDS + (("repeats",) if reset_repeats else ())
+        Schedule.objects.bulk_update(update, update_fields)
+        Schedule.objects.filter(id__in=delete).delete()
+
+    return {"created": len(create), "updated": len(update), "deleted": len(delete)}
@@ -4,6 +4,7 @@ from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import NoSuchElementException
 from webdriver_manager.chrome import ChromeDriverManager
+from .metrics import browser_session_ended, browser_session_started
 
 
 class SeleniumDriver(object):
@@ -21,6 +22,7 @@ class SeleniumDriver(object):
         self.driver = webdriver.Chrome(
             ChromeDriverManager().install(), options=chrome_options
         )
+        self.session_id = browser_session_started()
         try:
             # load cookies for given websites
             cookies = pickle.load(open(self.cookies_file_path, "rb"))
@@ -48,9 +50,12 @@ class SeleniumDriver(object):
             self.driver.close()
 
     def quit(self):
-        self.save_cookies()
-        self.close_all()
-        self.driver.quit()
+        try:
+            self.save_cookies()
+            self.close_all()
+            self.driver.quit()
+        finally:
+            browser_session_ended(self.session_id)
 
 
 def is_fb_logged_in(driver):
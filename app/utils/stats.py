@@ -0,0 +1,197 @@
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django_redis import get_redis_connection
+
+from ..constants import RUN_STATS_SIZE
+from .metrics import record_run
+
+# Stats of the tracker run in progress, None outside of a run
+run_stats = ContextVar("run_stats", default=None)
+
+# Stages recorded per run, in display order:
+#   ttfb: DNS, connect and time to the response headers (requests elapsed)
+#   download: rest of the body
+#   browser: Selenium driver start, login and page load
+#   parse: HTML/structured data/feed parsing
+#   xpath: XPath evaluation
+#   db: every query of the run (overlaps the other stages)
+#   diff: content diffing
+#   notify: Slack messages
+STAGES = ("ttfb", "download", "browser", "parse", "xpath", "db", "diff", "notify")
+
+
+class RunStats(object):
+    """Durations, bytes and fetch method of a single tracker run"""
+
+    def __init__(self, t_type=None, method=None):
+        self.started = time.perf_counter()
+        self.t_type = t_type
+        self.stages = defaultdict(float)
+        self.bytes = 0
+        self.method = method
+        self.error = None
+
+    def as_dict(self):
+        return {
+            "at": time.time(),
+            "total": round(time.perf_counter() - self.started, 4),
+            "stages": {k: round(v, 4) for k, v in self.stages.items()},
+            "bytes": self.bytes,
+            "method": self.method,
+            "error": self.error,
+        }
+
+
+def add_stage(name, seconds):
+    stats = run_stats.get()
+    if stats is not None:
+        stats.stages[name] += seconds
+
+
+def add_bytes(count):
+    stats = run_stats.get()
+    if stats is not None:
+        stats.bytes += count
+
+
+def set_method(method):
+    # The last method set wins, so "auto" runs record the path actually used
+    stats = run_stats.get()
+    if stats is not None:
+        stats.method = method
+
+
+@contextmanager
+def stage(name):
+    """Add the duration of the block to a stage of the current run"""
+    if run_stats.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage(name, time.perf_counter() - start)
+
+
+def time_query(execute, sql, params, many, context):
+    # Database execute wrapper, installed on every connection
+    with stage("db"):
+        return execute(sql, params, many, context)
+
+
+def stats_key(tracker_id):
+    return f"trackers:stats:{tracker_id}"
+
+
+def save_run_stats(tracker_id, stats):
+    """Push the run to the tracker ring buffer of the last RUN_STATS_SIZE runs
+
+    The run is also counted in the cluster metrics.
+    """
+    record_run(stats)
+    try:
+        conn = get_redis_connection("default")
+        pipe = conn.pipeline()
+        pipe.lpush(stats_key(tracker_id), json.dumps(stats.as_dict()))
+        pipe.ltrim(stats_key(tracker_id), 0, RUN_STATS_SIZE - 1)
+        pipe.execute()
+    except Exception as e:
+        print(type(e).__name__, "saving the run stats")
+
+
+def get_run_stats(tracker_id):
+    """Recorded runs of a tracker, newest first"""
+    runs = get_redis_connection("default").lrange(stats_key(tracker_id), 0, -1)
+    return [json.loads(run) for run in runs]
+
+
+def percentile(values, p):
+    # Nearest rank
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))]
+
+
+def rollup_runs(runs):
+    # Percentiles, counts and last run time of recorded runs
+    rollup = {"runs": len(runs), "errors": sum(1 for r in runs if r["error"])}
+    if not runs:
+        return rollup
+
+    rollup["last_run"] = runs[0]["at"]
+
+    series = {"total": [r["total"] for r in runs], "bytes": [r["bytes"] for r in runs]}
+    for name in STAGES:
+        values = [r["stages"][name] for r in runs if name in r["stages"]]
+        if values:
+            series[name] = values
+    for name, values in series.items():
+        rollup[name] = (percentile(values, 50), percentile(values, 95))
+    return rollup
+
+
+def get_many_run_stats(tracker_ids):
+    """get_run_stats of many trackers in one round trip
+
+    Returns:
+        dict: tracker id -> runs, newest first
+    """
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    for tracker_id in tracker_ids:
+        pipe.lrange(stats_key(tracker_id), 0, -1)
+    return {
+        tracker_id: [json.loads(run) for run in runs]
+        for tracker_id, runs in zip(tracker_ids, pipe.execute())
+    }
+
+
+def get_run_percentiles(tracker_id):
+    """p50/p95 of the recorded runs of a tracker
+
+    Returns:
+        dict: (p50, p95) seconds for "total" and every recorded stage, plus
+            "bytes", "runs" and "errors" counts and the "last_run" time
+    """
+    return rollup_runs(get_run_stats(tracker_id))
+
+
+def get_many_run_percentiles(tracker_ids):
+    return {
+        tracker_id: rollup_runs(runs)
+        for tracker_id, runs in get_many_run_stats(tracker_ids).items()
+    }
+
+
+def instrumented(t_type):
+    """Record the stats of every run of a tracker task.
+
+    The stats are saved even if the run fails, with the error class.
+
+    Args:
+        t_type (string): The tracker type the task checks
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(id, *args, **kwargs):
+            stats = RunStats(t_type)
+            token = run_stats.set(stats)
+            try:
+                return func(id, *args, **kwargs)
+            except Exception as e:
+                stats.error = type(e).__name__
+                raise
+            finally:
+                run_stats.reset(token)
+                save_run_stats(id, stats)
+
+        return wrapper
+
+    return decorator
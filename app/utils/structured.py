@@ -0,0 +1,217 @@
+import json
+import re
+from html import unescape
+from urllib.parse import urljoin, urlsplit
+
+from django.conf import settings
+
+# Scanned straight from the page bytes, no DOM is built
+JSON_LD_RE = re.compile(
+    rb"<script[^>]+type=[\"']application/ld\+json[\"'][^>]*>(.*?)</script>",
+    re.I | re.S,
+)
+META_RE = re.compile(rb"<meta\s[^>]*>", re.I)
+# Any tag carrying an itemprop (microdata)
+ITEMPROP_RE = re.compile(rb"<[a-z][^>]*\sitemprop=[^>]*>", re.I)
+ATTR_RE = re.compile(rb"([\w:-]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)')")
+
+IN_STOCK = ("instock", "in stock", "limitedavailability", "onlineonly", "instoreonly")
+OUT_OF_STOCK = ("outofstock", "out of stock", "oos", "soldout", "discontinued")
+
+# Tracker content keys the structured data can fill
+FIELDS = {"price_xpath": "price", "available_xpath": "available"}
+
+
+def get_attrs(tag):
+    return {
+        name.decode().lower(): unescape((double or single).decode("utf-8", "replace"))
+        for name, double, single in ATTR_RE.findall(tag)
+    }
+
+
+def parse_availability(value):
+    """schema.org/OpenGraph availability to a bool, None if unknown"""
+    if not value:
+        return None
+    value = str(value).rsplit("/", 1)[-1].strip().lower()
+    if value in IN_STOCK:
+        return True
+    if value in OUT_OF_STOCK:
+        return False
+    return None
+
+
+def parse_amount(value):
+    try:
+        return float(re.sub(r"[^\d.]", "", str(value)))
+    except ValueError:
+        return None
+
+
+def iter_nodes(data):
+    # Walk every dict of a JSON-LD document (lists, @graph, nested offers)
+    if isinstance(data, list):
+        for item in data:
+            yield from iter_nodes(item)
+    elif isinstance(data, dict):
+        yield data
+        for value in data.values():
+            if isinstance(value, (list, dict)):
+                yield from iter_nodes(value)
+
+
+def has_type(node, types):
+    node_type = node.get("@type")
+    if isinstance(node_type, list):
+        return any(t in types for t in node_type)
+    return node_type in types
+
+
+def normalize_url(url, base):
+    # Scheme, www., query, fragment and trailing slash do not tell pages apart
+    parts = urlsplit(urljoin(base, url.strip()))
+    host = parts.netloc.lower()
+    return host[4:] if host.startswith("www.") else host, parts.path.rstrip("/")
+
+
+def get_product_offers(product):
+    # Offers of a Product, the Offers an AggregateOffer lists (never its
+    # lowPrice/highPrice range)
+    offers = product.get("offers") or []
+    for offer in offers if isinstance(offers, list) else [offers]:
+        if not isinstance(offer, dict):
+            continue
+        if has_type(offer, ("Offer",)):
+            yield offer
+        elif has_type(offer, ("AggregateOffer",)):
+            yield from get_product_offers(offer)
+
+
+def get_json_ld_offer(page, url, currency):
+    """The offer of the JSON-LD Product describing the tracker's page.
+
+    Products of related items and carousels are told apart by their url or
+    @id, which must match the tracker url. Offers in another currency are
+    ignored.
+
+    Returns:
+        dict: price, currency and available, None when no offer matches or
+            the matching ones disagree (e.g. variants)
+    """
+    target = normalize_url(url, url)
+    offers = set()
+    for block in JSON_LD_RE.findall(page):
+        try:
+            data = json.loads(block.decode("utf-8", "replace"))
+        except ValueError:
+            continue
+        for node in iter_nodes(data):
+            if not has_type(node, ("Product",)):
+                continue
+            ids = [node.get("url"), node.get("@id")]
+            if not any(
+                isinstance(id, str) and normalize_url(id, url) == target for id in ids
+            ):
+                continue
+            for offer in get_product_offers(node):
+                price = parse_amount(offer.get("price", ""))
+                offer_currency = str(offer.get("priceCurrency") or currency).upper()
+                if price is None or offer_currency != currency:
+                    continue
+                available = parse_availability(offer.get("availability"))
+                offers.add((price, offer_currency, available))
+    if len(offers) != 1:
+        return None
+    price, currency, available = offers.pop()
+    return {"price": price, "currency": currency, "available": available}
+
+
+def get_meta_offer(page, url, currency):
+    """Offer of the OpenGraph product tags and microdata itemprops
+
+    Ignored when og:url is another page; a field is only used when the page
+    gives it a single value (microdata also marks up related items).
+    """
+    values = {}
+    for tag in META_RE.findall(page) + ITEMPROP_RE.findall(page):
+        attrs = get_attrs(tag)
+        key = attrs.get("property") or attrs.get("itemprop") or attrs.get("name")
+        value = attrs.get("content") or attrs.get("href")
+        if not key or value is None:
+            continue
+        key = key.lower()
+        if key == "og:url":
+            if normalize_url(value, url) != normalize_url(url, url):
+                return None
+        elif key in ("product:price:amount", "og:price:amount", "price"):
+            values.setdefault("price", set()).add(parse_amount(value))
+        elif key in ("product:price:currency", "og:price:currency", "pricecurrency"):
+            values.setdefault("currency", set()).add(value.upper())
+        elif key in ("product:availability", "og:availability", "availability"):
+            values.setdefault("available", set()).add(parse_availability(value))
+
+    offer = {key: found.pop() for key, found in values.items() if len(found) == 1}
+    if offer.get("currency", currency) != currency:
+        return None
+    return offer or None
+
+
+def extract_offer(page, url, currency=None):
+    """Price, currency and availability from the page's structured data.
+
+    The JSON-LD schema.org Offer of the tracked product is used first, then
+    OpenGraph product tags and microdata.
+
+    Args:
+        page (bytes): The raw page
+        url (string): The tracker url, the page's product is matched by it
+        currency (string, optional): ISO code the prices must be in
+            (PRICE_CURRENCY by default)
+
+    Returns:
+        dict: price, currency and available (None when missing), None if the
+            page has no offer data at all
+    """
+    currency = (currency or settings.PRICE_CURRENCY).upper()
+    offer = get_json_ld_offer(page, url, currency) or {}
+    if offer.get("price") is None or offer.get("available") is None:
+        for key, value in (get_meta_offer(page, url, currency) or {}).items():
+            if offer.get(key) is None:
+                offer[key] = value
+    return offer or None
+
+
+def get_structured_content(page, params, url):
+    """Tracker content from structured data, if it covers every XPath.
+
+    Only price/availability trackers qualify. Set "structured_data": false in
+    the tracker params to always use the XPaths, "currency" when the site's
+    prices are not in PRICE_CURRENCY.
+
+    Args:
+        page (bytes): The raw page
+        params (dict): The tracker params
+        url (string): The tracker url
+
+    Returns:
+        dict: The contents as get_content returns them, None to fall back
+            to the XPaths
+    """
+    if params.get("structured_data") is False:
+        return None
+
+    keys = {key for set in params["xpaths"] for key in set}
+    if not keys or not keys.issubset(FIELDS):
+        return None
+
+    offer = extract_offer(page, url, params.get("currency"))
+    if not offer or any(offer.get(FIELDS[key]) is None for key in keys):
+        return None
+
+    content = {}
+    if "price_xpath" in keys:
+        content["price_xpath"] = str(offer["price"])
+    if "available_xpath" in keys:
+        # Same truthiness check_availability applies to the XPath text
+        content["available_xpath"] = "in stock" if offer["available"] else ""
+    return content
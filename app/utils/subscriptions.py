@@ -0,0 +1,192 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+from django_q.tasks import async_task
+from sortedcontainers import SortedList
+
+from ..constants import SUBSCRIPTION_BATCH_SIZE
+from ..models import AppTracker, AppUserSubscription
+from .notifications import send_slack_message
+from .prices import get_best_offer
+
+# Per worker threshold indexes: {(kind, id): (version, ThresholdIndex)}
+indexes = {}
+
+
+class ThresholdIndex(object):
+    """Target prices of the active subscriptions to one tracker or product"""
+
+    def __init__(self, thresholds):
+        # (target_price, subscription_id) pairs, sorted by price
+        self.thresholds = SortedList(thresholds)
+
+    def __len__(self):
+        return len(self.thresholds)
+
+    def crossed(self, old_price, new_price):
+        """Subscriptions whose target price has just been reached.
+
+        A target is crossed when new_price <= target < old_price, found with a
+        range query in O(log n + matches).
+
+        Args:
+            old_price (float): The previous price, None if there was none
+            new_price (float): The new price
+
+        Returns:
+            list[int]: The subscription ids
+        """
+        maximum = (old_price,) if old_price is not None else None
+        return [
+            subscription_id
+            for _, subscription_id in self.thresholds.irange(
+                (new_price,), maximum, inclusive=(True, False)
+            )
+        ]
+
+
+def version_key(kind, id):
+    return f"subscriptions:{kind}:{id}"
+
+
+def invalidate_thresholds(tracker_id=None, product_id=None):
+    """Force every worker to reload the indexes of a tracker/product"""
+    for kind, id in (("tracker", tracker_id), ("product", product_id)):
+        if id:
+            cache.set(version_key(kind, id), uuid4().hex, None)
+
+
+def load_index(kind, id):
+    thresholds = (
+        AppUserSubscription.objects.filter(
+            paused=False, target_price__isnull=False, **{f"{kind}_id": id}
+        )
+        .values_list("target_price", "id")
+        .iterator()
+    )
+    return ThresholdIndex((float(price), sid) for price, sid in thresholds)
+
+
+def get_indexes(tracker_id, product_id):
+    """Threshold indexes of a tracker and its product, reloaded when stale.
+
+    The current versions are read with a single cache round trip; an index is
+    rebuilt from the database only after a subscription change bumped them.
+    """
+    keys = [("tracker", tracker_id)]
+    if product_id:
+        keys.append(("product", product_id))
+
+    versions = cache.get_many([version_key(*key) for key in keys])
+
+    result = []
+    for key in keys:
+        version = versions.get(version_key(*key))
+        if version is None:
+            # Unknown (e.g. evicted): start a new version everyone reloads on
+            version = uuid4().hex
+            cache.add(version_key(*key), version, None)
+            version = cache.get(version_key(*key), version)
+        cached = indexes.get(key)
+        if not cached or cached[0] != version:
+            cached = indexes[key] = (version, load_index(*key))
+        result.append(cached[1])
+
+    return result
+
+
+def get_product_best(tracker_id):
+    """The product of a tracker and the price of its best offer.
+
+    Taken before the offer is updated, to tell whether a change lowered it.
+
+    Args:
+        tracker_id (int): The id of the tracker
+
+    Returns:
+        tuple: The product id and best price, None when unknown
+    """
+    product_id = (
+        AppTracker.objects.filter(id=tracker_id)
+        .values_list("product_id", flat=True)
+        .first()
+    )
+    offer = get_best_offer(product_id) if product_id else None
+    return product_id, offer.price if offer else None
+
+
+def match_subscriptions(tracker_id, old_price, new_price, product=None):
+    """Find the active subscriptions whose target price was just reached
+
+    Tracker targets are compared with the tracker's old and new price,
+    product targets with the product's best offer before and after the
+    change (a cheaper offer elsewhere means the target was reached already).
+
+    Args:
+        tracker_id (int): The id of the tracker
+        old_price (float): The previous price, None if there was none
+        new_price (float): The new price
+        product (tuple, optional): The product id and best price before the
+            change (get_product_best), product targets are skipped without it
+
+    Returns:
+        list[int]: The subscription ids, each once
+    """
+    product_id, old_best = product or (None, None)
+    tracker_index, *product_index = get_indexes(tracker_id, product_id)
+
+    matches = []
+    # Targets are only crossed downwards
+    if new_price is not None and (old_price is None or new_price < old_price):
+        matches.extend(tracker_index.crossed(old_price, new_price))
+
+    if product_id:
+        offer = get_best_offer(product_id)
+        new_best = offer.price if offer else None
+        if new_best is not None and (old_best is None or new_best < old_best):
+            matches.extend(product_index[0].crossed(old_best, new_best))
+
+    # A subscription to both the tracker and its product matches once
+    return list(dict.fromkeys(matches))
+
+
+def fan_out(tracker_id, name, tracker_url, old_price, new_price, product=None):
+    """Queue notifications for every crossed subscription, in batches
+
+    Returns:
+        int: The number of matched subscriptions
+    """
+    matches = match_subscriptions(tracker_id, old_price, new_price, product)
+
+    for i in range(0, len(matches), SUBSCRIPTION_BATCH_SIZE):
+        async_task(
+            "app.utils.subscriptions.notify_subscribers",
+            matches[i : i + SUBSCRIPTION_BATCH_SIZE],
+            name,
+            tracker_url,
+            new_price,
+        )
+
+    return len(matches)
+
+
+def notify_subscribers(subscription_ids, name, tracker_url, price):
+    """Alert the subscribers of a batch of matched subscriptions.
+
+    Profiles have no Slack handle or webhook of their own, so there is no
+    per subscriber delivery: one message naming the subscribers is posted to
+    the shared alerts channel.
+    """
+    # Subscriptions could have been paused since they were matched
+    subscriptions = AppUserSubscription.objects.filter(
+        id__in=subscription_ids, paused=False
+    ).select_related("user")
+
+    users = sorted({s.user.username for s in subscriptions})
+    if users:
+        send_slack_message(
+            f"{name} reached target price ${price}",
+            f"{tracker_url}\nSubscribers: {', '.join(users)}",
+            "TestAppBot",
+            "SLACK_KEY_ALERTS",
+        )
@@ -0,0 +1,255 @@
+from itertools import groupby
+from operator import itemgetter
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import connections
+from django.db.models import Count, FloatField, Func, Max, Min, Sum
+from django.db.models.functions import Trunc
+
+from ..models import AppPriceRollup, AppTrackerChange
+from .categories import category_subtree
+
+INTERVALS = ("hour", "day", "week")
+# Intervals served from the daily rollups instead of the raw change log
+ROLLUP_INTERVALS = ("day", "week")
+
+
+class ArrayFirst(Func):
+    """First element of an aggregated Postgres array"""
+
+    template = "(%(expressions)s)[1]"
+    output_field = FloatField()
+
+
+def fold_buckets(rows):
+    """Fold rows sorted by tracker, bucket and time into one bucket each.
+
+    Portable version of the SQL aggregation, for databases without ordered
+    array aggregates (SQLite in the tests).
+
+    Args:
+        rows (iterable[dict]): tracker_id, bucket, open, low, high, last and
+            changes of each row
+
+    Returns:
+        list[dict]: The buckets, in the same order
+    """
+    buckets = []
+    for (tracker_id, bucket), group in groupby(
+        rows, key=itemgetter("tracker_id", "bucket")
+    ):
+        group = list(group)
+        buckets.append(
+            {
+                "tracker_id": tracker_id,
+                "bucket": bucket,
+                "open": group[0]["open"],
+                "low": min(r["low"] for r in group),
+                "high": max(r["high"] for r in group),
+                "last": group[-1]["last"],
+                "changes": sum(r["changes"] for r in group),
+            }
+        )
+    return buckets
+
+
+def has_array_agg(queryset):
+    return connections[queryset.db].vendor == "postgresql"
+
+
+def get_price_buckets(changes, interval):
+    """Aggregate price changes into open/low/high/last buckets per tracker.
+
+    Price rows are sparse (one per change), so buckets without a change are
+    omitted: the price carries over from the previous bucket's last value.
+    Each tracker (offer) has its own buckets, so open and last never mix the
+    prices of different sites.
+
+    Args:
+        changes (QuerySet): AppTrackerChange rows to aggregate
+        interval (string): One of INTERVALS
+
+    Returns:
+        list[dict]: tracker_id, bucket, open, low, high, last and changes,
+            by tracker then oldest first
+    """
+    changes = changes.filter(price__isnull=False).annotate(
+        bucket=Trunc("created_at", interval)
+    )
+    if not has_array_agg(changes):
+        rows = changes.values("tracker_id", "bucket", "price").order_by(
+            "tracker_id", "bucket", "created_at", "id"
+        )
+        return fold_buckets(
+            {
+                "tracker_id": row["tracker_id"],
+                "bucket": row["bucket"],
+                "open": row["price"],
+                "low": row["price"],
+                "high": row["price"],
+                "last": row["price"],
+                "changes": 1,
+            }
+            for row in rows
+        )
+    return list(
+        changes.values("tracker_id", "bucket")
+        .annotate(
+            open=ArrayFirst(ArrayAgg("price", ordering="created_at")),
+            low=Min("price"),
+            high=Max("price"),
+            last=ArrayFirst(ArrayAgg("price", ordering="-created_at")),
+            changes=Count("id"),
+        )
+        .order_by("tracker_id", "bucket")
+    )
+
+
+def get_rollup_buckets(rollups, interval):
+    """Aggregate daily rollups into day or week buckets per tracker.
+
+    Args:
+        rollups (QuerySet): AppPriceRollup rows to aggregate
+        interval (string): One of ROLLUP_INTERVALS
+
+    Returns:
+        list[dict]: tracker_id, bucket, open, low, high, last and changes,
+            by tracker then oldest first
+    """
+    rollups = rollups.annotate(bucket=Trunc("day", interval))
+    if not has_array_agg(rollups):
+        return fold_buckets(
+            rollups.values(
+                "tracker_id", "bucket", "open", "low", "high", "last", "changes"
+            ).order_by("tracker_id", "bucket", "day")
+        )
+    return list(
+        rollups.values("tracker_id", "bucket")
+        .annotate(
+            open=ArrayFirst(ArrayAgg("open", ordering="first_at")),
+            low=Min("low"),
+            high=Max("high"),
+            last=ArrayFirst(ArrayAgg("last", ordering="-last_at")),
+            changes=Sum("changes"),
+        )
+        .order_by("tracker_id", "bucket")
+    )
+
+
+def bucket_x(bucket):
+    # Daily/weekly buckets are dates, hourly ones datetimes
+    if hasattr(bucket, "timestamp"):
+        return bucket.timestamp()
+    return bucket.toordinal() * 86400
+
+
+def lttb(rows, threshold, x, y):
+    """Downsample rows with Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last row and, for every bucket in between, the row
+    forming the largest triangle with the previously kept row and the average
+    of the next bucket, so peaks and drops survive the reduction.
+
+    Args:
+        rows (list): Rows sorted by x
+        threshold (int): Maximum number of rows to return
+        x (callable): Returns the numeric x value of a row
+        y (callable): Returns the numeric y value of a row
+
+    Returns:
+        list: At most threshold rows
+    """
+    n = len(rows)
+    if threshold >= n or threshold < 3:
+        return rows
+
+    sampled = [rows[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+
+        # Average point of the next bucket (the last row for the final bucket)
+        next_start = end
+        next_end = min(int((i + 2) * every) + 1, n)
+        if next_end <= next_start:
+            avg_x, avg_y = x(rows[-1]), y(rows[-1])
+        else:
+            bucket = rows[next_start:next_end]
+            avg_x = sum(x(r) for r in bucket) / len(bucket)
+            avg_y = sum(y(r) for r in bucket) / len(bucket)
+
+        ax, ay = x(rows[a]), y(rows[a])
+        best, best_area = start, -1
+        for j in range(start, end):
+            area = abs(
+                (ax - avg_x) * (y(rows[j]) - ay) - (ax - x(rows[j])) * (avg_y - ay)
+            )
+            if area > best_area:
+                best, best_area = j, area
+
+        sampled.append(rows[best])
+        a = best
+
+    sampled.append(rows[-1])
+    return sampled
+
+
+def get_price_series(changes, rollups, interval="day", points=None):
+    """Build a chart-ready price series, optionally reduced to a point budget.
+
+    Day and week buckets are read from the rollups, hourly ones from the
+    raw change log. Product and category series hold the buckets of every
+    tracker (offer), the point budget applies to each of them.
+
+    Args:
+        changes (QuerySet): AppTrackerChange rows to aggregate
+        rollups (QuerySet): The matching AppPriceRollup rows
+        interval (string, optional): One of INTERVALS. Defaults to "day".
+        points (int, optional): Maximum number of buckets per tracker
+
+    Returns:
+        list[dict]: The buckets
+    """
+    if interval in ROLLUP_INTERVALS:
+        buckets = get_rollup_buckets(rollups, interval)
+    else:
+        buckets = get_price_buckets(changes, interval)
+    if points:
+        buckets = [
+            bucket
+            for _, series in groupby(buckets, key=itemgetter("tracker_id"))
+            for bucket in lttb(
+                list(series),
+                points,
+                x=lambda b: bucket_x(b["bucket"]),
+                y=lambda b: b["last"],
+            )
+        ]
+    return buckets
+
+
+def tracker_price_sources(tracker_id):
+    return (
+        AppTrackerChange.objects.filter(tracker_id=tracker_id),
+        AppPriceRollup.objects.filter(tracker_id=tracker_id),
+    )
+
+
+def product_price_sources(product_id):
+    # All offers for the product, across sites and locations
+    return (
+        AppTrackerChange.objects.filter(tracker__product_id=product_id),
+        AppPriceRollup.objects.filter(tracker__product_id=product_id),
+    )
+
+
+def category_price_sources(category_id):
+    # All product offers in the category and its subcategories
+    subtree = category_subtree(category_id)
+    return (
+        AppTrackerChange.objects.filter(tracker__product__category__in=subtree),
+        AppPriceRollup.objects.filter(tracker__product__category__in=subtree),
+    )
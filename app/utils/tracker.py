@@ -1,14 +1,73 @@
 import requests
 import os
+import time
 import json
 from re import sub
 from decimal import Decimal
 from .notifications import send_slack_message
-from ..models import AppTrackerChange, AppSite
-from ..constants import HEADERS, TRACKER_TYPES, TRACKER_METHODS
-from .selenium_driver import SeleniumDriver, is_fb_logged_in, fb_login
+from .prices import record_price, update_offer
+from .subscriptions import fan_out, get_product_best
+from .leases import single_flight
+from .breaker import circuit_breaker
+from .structured import get_structured_content
+from .stats import add_bytes, add_stage, instrumented, set_method, stage
+from .profiling import profiled
+from .configs import get_config
+from .feeds import get_new_feed_items, update_feed_mark
+from .archive import (
+    ReplayDriver,
+    record_page_source,
+    record_response,
+    replay_response,
+)
+from ..models import AppTracker, AppTrackerChange
+from ..constants import (
+    AUTO_METHOD_TTL,
+    HEADERS,
+    REQUEST_TIMEOUT,
+    TRACKER_TYPES,
+    TRACKER_METHODS,
+)
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from lxml import html
-from lxml.html.diff import htmldiff
+
+
+def fetch_page(tracker_url, session=requests):
+    """Retrieve a page body
+
+    Args:
+        tracker_url (string): The tracker url
+        session (object, optional): requests or a shared requests Session
+
+    Raises:
+        requests.HTTPError: Page not 200/OK (an IOError)
+
+    Returns:
+        bytes: The page content
+    """
+    if settings.FETCH_MODE == "replay":
+        return replay_response(tracker_url)
+
+    start = time.perf_counter()
+    page = session.get(tracker_url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
+    elapsed = time.perf_counter() - start
+    # requests' elapsed stops at the response headers, the rest is the download
+    ttfb = page.elapsed.total_seconds()
+    add_stage("ttfb", ttfb)
+    add_stage("download", max(0, elapsed - ttfb))
+    add_bytes(len(page.content))
+
+    if settings.FETCH_MODE == "record":
+        record_response(tracker_url, page, elapsed)
+
+    if page.status_code != 200:
+        raise requests.HTTPError(
+            f"Call returned error {page.status_code}", response=page
+        )
+    else:
+        return page.content
 
 
 def get_lxml_page(tracker_url):
@@ -23,13 +82,10 @@ def get_lxml_page(tracker_url):
     Returns:
         Object: lxml page tree
     """
-    page = requests.get(tracker_url, headers=HEADERS)
-
-    if page.status_code != 200:
-        raise IOError(f"Call returned error {page.status_code}")
-    else:
-        tree = html.fromstring(page.content)
-        return tree
+    set_method("xpath")
+    page = fetch_page(tracker_url)
+    with stage("parse"):
+        return html.fromstring(page)
 
 
 def get_selenium_page(tracker_url):
@@ -41,19 +97,32 @@ def get_selenium_page(tracker_url):
     Returns:
         list [object]: selenium_object and driver with page
     """
-    try:
-        selenium_object = SeleniumDriver()
-        driver = selenium_object.driver
+    set_method("selenium")
+    if settings.FETCH_MODE == "replay":
+        with stage("browser"):
+            driver = ReplayDriver(tracker_url)
+        return driver, driver
 
-        if is_fb_logged_in(driver):
-            print("Already logged in")
-        else:
-            print("Not logged in. Login")
-            fb_login(driver, os.environ.get("FB_USER"), os.environ.get("FB_PWD"))
-
-        driver.get(tracker_url)
-        driver.implicitly_wait(5)
+    # Selenium and webdriver_manager load only in processes running browsers
+    from .selenium_driver import SeleniumDriver, is_fb_logged_in, fb_login
 
+    try:
+        with stage("browser"):
+            selenium_object = SeleniumDriver()
+            driver = selenium_object.driver
+
+            if is_fb_logged_in(driver):
+                print("Already logged in")
+            else:
+                print("Not logged in. Login")
+                fb_login(driver, os.environ.get("FB_USER"), os.environ.get("FB_PWD"))
+
+            start = time.perf_counter()
+            driver.get(tracker_url)
+            driver.implicitly_wait(5)
+
+        if settings.FETCH_MODE == "record":
+            record_page_source(tracker_url, driver, time.perf_counter() - start)
         return selenium_object, driver
     except Exception as e:
         e_type = type(e).__name__
@@ -73,25 +142,37 @@ def get_lxml_new_items(id, tracker_url, params):
         list[string]: title, item_url, location
     """
 
-    tree = get_lxml_page(tracker_url)
+    return get_tree_new_items(get_lxml_page(tracker_url), params)
 
+
+def get_tree_new_items(tree, params):
+    """Extract first title, location and link params from an lxml tree
+
+    Args:
+        tree (object): The lxml page tree
+        params (list[dict]): A list of xpaths (can change)
+
+    Returns:
+        list[string]: title, item_url, location
+    """
     title = item_url = location = None
 
-    for set in params["xpaths"]:
-        t = tree.xpath(set["title_xpath"])
-
-        if len(t) != 0:
-            title = t[0].text_content()
-        if set["link_xpath"] != "":
-            u = tree.xpath(set["link_xpath"])
-            if len(u) != 0:
-                item_url = u[0].get("href")
-        if set["location_xpath"] != "":
-            l = tree.xpath(set["location_xpath"])
-            if len(l) != 0:
-                location = l[0].text_content()
-        if title and item_url and location:
-            break
+    with stage("xpath"):
+        for set in params["xpaths"]:
+            t = tree.xpath(set["title_xpath"])
+
+            if len(t) != 0:
+                title = t[0].text_content()
+            if set["link_xpath"] != "":
+                u = tree.xpath(set["link_xpath"])
+                if len(u) != 0:
+                    item_url = u[0].get("href")
+            if set["location_xpath"] != "":
+                l = tree.xpath(set["location_xpath"])
+                if len(l) != 0:
+                    location = l[0].text_content()
+            if title and item_url and location:
+                break
 
     return title, item_url, location
 
@@ -111,67 +192,216 @@ def get_selenium_new_items(id, tracker_url, params):
     selenium_object, driver = get_selenium_page(tracker_url)
     title = item_url = location = None
 
-    for set in params["xpaths"]:
-        t = driver.find_elements_by_xpath(set["title_xpath"])
-        if len(t) != 0:
-            title = t[0].text
-        if set["link_xpath"] != "":
-            u = driver.find_elements_by_xpath(set["link_xpath"])
-            if len(u) != 0:
-                item_url = u[0].get_attribute("href")
-        if set["location_xpath"] != "":
-            l = driver.find_elements_by_xpath(set["location_xpath"])
-            if len(l) != 0:
-                location = l[0].text
-        if title and item_url and location:
-            break
+    with stage("xpath"):
+        for set in params["xpaths"]:
+            t = driver.find_elements_by_xpath(set["title_xpath"])
+            if len(t) != 0:
+                title = t[0].text
+            if set["link_xpath"] != "":
+                u = driver.find_elements_by_xpath(set["link_xpath"])
+                if len(u) != 0:
+                    item_url = u[0].get_attribute("href")
+            if set["location_xpath"] != "":
+                l = driver.find_elements_by_xpath(set["location_xpath"])
+                if len(l) != 0:
+                    location = l[0].text
+            if title and item_url and location:
+                break
 
     selenium_object.quit()
 
     return title, item_url, location
 
 
-def get_content(tracker_url, tracker_method, params):
+def auto_method_key(id):
+    return f"trackers:auto_method:{id}"
+
+
+def get_auto_method(id):
+    """Fetch method an "auto" tracker should start with
+
+    Returns:
+        string: "selenium" if it needed a browser within AUTO_METHOD_TTL,
+            otherwise "xpath" (also used to re-probe)
+    """
+    try:
+        return cache.get(auto_method_key(id)) or "xpath"
+    except Exception as e:
+        print(type(e).__name__, "reading the auto method")
+        return "xpath"
+
+
+def get_auto_methods(ids):
+    """get_auto_method of many trackers, in one cache round trip
+
+    Returns:
+        dict: {tracker id: method}, "xpath" when unknown
+    """
+    try:
+        methods = cache.get_many([auto_method_key(id) for id in ids])
+    except Exception as e:
+        print(type(e).__name__, "reading the auto methods")
+        methods = {}
+    return {id: methods.get(auto_method_key(id)) or "xpath" for id in ids}
+
+
+def set_auto_method(id, method):
+    # Remember the path used, the selenium one only until the next re-probe
+    try:
+        previous = cache.get(auto_method_key(id))
+        cache.set(auto_method_key(id), method, AUTO_METHOD_TTL)
+    except Exception as e:
+        print(type(e).__name__, "saving the auto method")
+        return
+    print(f"Tracker {id} fetched with {method}")
+
+    if previous != method:
+        from .schedules import sync_schedules
+
+        # Route the next runs to the cluster of the method (browser runs
+        # must not start Chrome in the light workers)
+        sync_schedules(AppTracker.objects.filter(id=id))
+
+
+def get_auto_new_items(id, tracker_url, params):
+    """Get new items with lxml, escalating to Selenium when no title resolves
+
+    Args:
+        id (int): The id of the tracker
+        tracker_url (string): The tracker url
+        params (list[dict]): A list of xpaths (can change)
+
+    Returns:
+        list[string]: title, item_url, location
+    """
+    if get_auto_method(id) == "xpath":
+        items = get_lxml_new_items(id, tracker_url, params)
+        if items[0] is not None:
+            set_auto_method(id, "xpath")
+            return items
+        print(f"Tracker {id} XPaths not in the page, escalating")
+
+    items = get_selenium_new_items(id, tracker_url, params)
+    set_auto_method(id, "selenium")
+    return items
+
+
+def get_content(tracker_url, tracker_method, params, tracker_id=None):
     """Get content for multiple items.
 
+    The "auto" method tries the lxml path first and escalates to Selenium
+    when one of the XPaths does not resolve.
+
     Args:
         tracker_url (str): The tracker url.
         tracker_method (str): The tracker method.
         items_params (list[dict]): the list of items params.
+        tracker_id (int, optional): The tracker id, required by "auto".
 
     Returns:
         list: The contents.
     """
 
+    if tracker_method == "auto":
+        if get_auto_method(tracker_id) == "xpath":
+            try:
+                content = get_content(tracker_url, "xpath", params)
+            except IndexError:
+                print(f"Tracker {tracker_id} XPaths not in the page, escalating")
+            else:
+                set_auto_method(tracker_id, "xpath")
+                return content
+
+        content = get_content(tracker_url, "selenium", params)
+        set_auto_method(tracker_id, "selenium")
+        return content
+
     content = dict()
     # For each xpath found add it to the content dict (the last found will always be the final value)
     if tracker_method == "xpath":
-        tree = get_lxml_page(tracker_url)
-        for set in params["xpaths"]:
-            for xpath in set:
-                content[xpath] = tree.xpath(set[xpath])[0].text_content()
+        set_method("xpath")
+        content = parse_content(fetch_page(tracker_url), params, tracker_url)
     else:
         selenium_object, driver = get_selenium_page(tracker_url)
+        with stage("xpath"):
+            for set in params["xpaths"]:
+                for xpath in set:
+                    content[xpath] = driver.find_elements_by_xpath(set[xpath])[0].text
+
+        selenium_object.quit()
+
+    return content
+
+
+def get_tree_content(tree, params):
+    """Get content for multiple items from an lxml tree.
+
+    Args:
+        tree (object): The lxml page tree
+        params (list[dict]): A list of xpaths
+
+    Returns:
+        dict: The contents.
+    """
+    content = dict()
+    with stage("xpath"):
         for set in params["xpaths"]:
             for xpath in set:
-                content[xpath] = driver.find_elements_by_xpath(set[xpath])[0].text
+                content[xpath] = tree.xpath(set[xpath])[0].text_content()
 
-        selenium_object.quit()
+    return content
 
+
+def parse_content(page, params, tracker_url):
+    """Get content from a raw page, from its structured data when possible.
+
+    Also the picklable entry point for parser pools.
+
+    Args:
+        page (bytes): The raw page
+        params (list[dict]): A list of xpaths
+        tracker_url (str): The tracker url, matched by the structured data
+
+    Returns:
+        dict: The contents.
+    """
+    with stage("parse"):
+        content = get_structured_content(page, params, tracker_url)
+        if content is None:
+            tree = html.fromstring(page)
+    if content is None:
+        content = get_tree_content(tree, params)
     return content
 
 
-def check_change(
-    id,
-    name,
-    search_key,
-    site_id,
-    tracker_url,
-    tracker_method,
-    params,
-):
-    content = get_content(tracker_url, tracker_method, params)
+def parse_new_items(page, params):
+    # Picklable entry point for parser pools
+    with stage("parse"):
+        tree = html.fromstring(page)
+    return get_tree_new_items(tree, params)
+
+
+def parse_price(text):
+    return float(Decimal(sub(r"[^\d.]", "", text)))
 
+
+def get_current_change(id):
+    return AppTrackerChange.objects.filter(tracker_id=id).order_by("id").last()
+
+
+# Tasks get the tracker id, schedules created before also pass its old config
+# (legacy_args), ignored for the current one
+@single_flight
+@circuit_breaker
+@instrumented("change")
+@profiled
+def check_change(id, *legacy_args):
+    tracker = get_config(id)
+    content = get_content(tracker.url, tracker.method, tracker.params, id)
+    save_change(id, tracker.name, tracker.url, content)
+
+
+def save_change(id, name, tracker_url, content):
     changes = None
 
     if AppTrackerChange.objects.filter(tracker_id=id).exists():
@@ -179,7 +409,10 @@ def check_change(
             AppTrackerChange.objects.filter(tracker_id=id).order_by("id").reverse()[0]
         )
         if current.changed_content != content["content_xpath"]:
-            changes = htmldiff(current.changed_content, content["content_xpath"])
+            from lxml.html.diff import htmldiff
+
+            with stage("diff"):
+                changes = htmldiff(current.changed_content, content["content_xpath"])
 
     else:
         changes = content["content_xpath"]
@@ -197,18 +430,18 @@ def check_change(
         )
 
 
-def check_price(
-    id,
-    name,
-    search_key,
-    site_id,
-    tracker_url,
-    tracker_method,
-    params,
-):
+@single_flight
+@circuit_breaker
+@instrumented("price")
+@profiled
+def check_price(id, *legacy_args):
+    tracker = get_config(id)
+    content = get_content(tracker.url, tracker.method, tracker.params, id)
+    save_price(id, tracker.name, tracker.url, content)
 
-    content = get_content(tracker_url, tracker_method, params)
-    content_price = float(Decimal(sub(r"[^\d.]", "", content["price_xpath"])))
+
+def save_price(id, name, tracker_url, content):
+    content_price = parse_price(content["price_xpath"])
 
     price_change = None
 
@@ -234,21 +467,29 @@ def check_price(
             "TestAppBot",
             "SLACK_KEY_ALERTS",
         )
-        t = AppTrackerChange(tracker_id=id, price=price_change)
-        t.save()
-
-
-def check_availability(
-    id,
-    name,
-    search_key,
-    site_id,
-    tracker_url,
-    tracker_method,
-    params,
-):
-
-    content = get_content(tracker_url, tracker_method, params)
+        # Best offer before this one changes, for the product targets
+        product = get_product_best(id)
+        # The change, its rollup and the offer are saved together
+        with transaction.atomic():
+            t = AppTrackerChange(tracker_id=id, price=price_change)
+            t.save()
+            record_price(id, price_change, t.created_at)
+            update_offer(id, price=price_change)
+        old_price = current.price if current else None
+        fan_out(id, name, tracker_url, old_price, price_change, product)
+
+
+@single_flight
+@circuit_breaker
+@instrumented("availability")
+@profiled
+def check_availability(id, *legacy_args):
+    tracker = get_config(id)
+    content = get_content(tracker.url, tracker.method, tracker.params, id)
+    save_availability(id, tracker.name, tracker.url, content)
+
+
+def save_availability(id, name, tracker_url, content):
     is_available = True if content["available_xpath"] else False
     avail_change = None
 
@@ -277,25 +518,116 @@ def check_availability(
                 "TestAppBot",
                 "SLACK_KEY_ALERTS",
             )
-        t = AppTrackerChange(tracker_id=id, available=avail_change)
-        t.save()
 
+    # The change and the offer are saved together
+    with transaction.atomic():
+        if avail_change:
+            t = AppTrackerChange(tracker_id=id, available=avail_change)
+            t.save()
+        if avail_change is not None:
+            update_offer(id, available=avail_change)
 
-def check_new_item(
-    id,
-    name,
-    search_key,
-    site_id,
-    tracker_url,
-    tracker_method,
-    params,
-):
-    site = AppSite.objects.get(id=site_id)
 
-    if tracker_method == "xpath":
-        title, item_url, location = get_lxml_new_items(id, tracker_url, params)
+@single_flight
+@circuit_breaker
+@instrumented("price_and_avail")
+@profiled
+def check_price_and_avail(id, *legacy_args):
+    tracker = get_config(id)
+    content = get_content(tracker.url, tracker.method, tracker.params, id)
+    save_price_and_availability(id, tracker.name, tracker.url, content)
+
+
+def save_price_and_availability(id, name, tracker_url, content):
+    """Record price and availability together in a single change row.
+
+    Both are compared with the latest row, so a price change is not mistaken
+    for an availability change (or vice versa).
+    """
+    price = parse_price(content["price_xpath"])
+    # Unknown without an availability XPath, the offer keeps its availability
+    is_available = None
+    if "available_xpath" in content:
+        is_available = bool(content["available_xpath"])
+
+    current = get_current_change(id)
+    old_price = current.price if current else None
+
+    if current and current.price == price and is_available in (None, current.available):
+        return
+
+    if price != old_price:
+        previously = f" (Previously ${old_price})" if current else ""
+        send_slack_message(
+            f"{name} price change",
+            f"New price: ${price}{previously}\n{tracker_url}",
+            "TestAppBot",
+            "SLACK_KEY_ALERTS",
+        )
+    became_available = is_available and not (current and current.available)
+    if became_available:
+        send_slack_message(
+            f"{name} is avalable!",
+            tracker_url,
+            "TestAppBot",
+            "SLACK_KEY_ALERTS",
+        )
+
+    # Best offer before this one changes, for the product targets
+    product = get_product_best(id)
+    # The change, its rollup and the offer are saved together
+    with transaction.atomic():
+        t = AppTrackerChange(tracker_id=id, price=price, available=is_available)
+        t.save()
+        if is_available is None:
+            update_offer(id, price=price)
+        else:
+            update_offer(id, price=price, available=is_available)
+        if price != old_price:
+            record_price(id, price, t.created_at)
+    if price != old_price or became_available:
+        # An offer back in stock can be the product's new best offer
+        fan_out(id, name, tracker_url, old_price, price, product)
+
+
+@single_flight
+@circuit_breaker
+@instrumented("new_item")
+@profiled
+def check_new_item(id, *legacy_args):
+    tracker = get_config(id)
+    if tracker.feed:
+        # Lightweight feed instead of the listing page
+        check_feed(tracker)
+        return
+
+    if tracker.method == "xpath":
+        get_new_items = get_lxml_new_items
+    elif tracker.method == "auto":
+        get_new_items = get_auto_new_items
     else:
-        title, item_url, location = get_selenium_new_items(id, tracker_url, params)
+        get_new_items = get_selenium_new_items
+    title, item_url, location = get_new_items(id, tracker.url, tracker.params)
+
+    save_new_item(id, title, item_url, location)
+
+
+def check_feed(tracker):
+    """Save the new items of the tracker's site feed, oldest first
+
+    Args:
+        tracker (TrackerConfig): A new item tracker with a feed
+    """
+    set_method("feed")
+    items, mark = get_new_feed_items(tracker.id, tracker.search_key, tracker.feed)
+    for item in reversed(items):
+        if item["title"]:
+            save_new_item(tracker.id, item["title"], item["link"], item["location"])
+    update_feed_mark(mark, items)
+
+
+def save_new_item(id, title, item_url, location):
+    tracker = get_config(id)
 
     if title == None:
         raise ValueError(
@@ -307,21 +639,16 @@ def check_new_item(
         item_url = item_url.split("?")[0]
 
     # SKIP RULES
-    skip = False
     # Also search word must be in the title since places like
     # Facebook marketplace list other stuff
-    matches = ["wanted", "looking for", "anyone got"]
-    if search_key.lower() not in title.lower() or any(
-        x in title.lower() for x in matches
-    ):
-        skip = True
+    skip = not tracker.is_wanted(title)
 
     save = False
 
     if not skip:
         # If site url is not in item_url, prepend it
-        if item_url and site.url not in item_url:
-            item_url = site.url + item_url
+        if item_url and tracker.site_url not in item_url:
+            item_url = tracker.site_url + item_url
 
         # Change to
         if not AppTrackerChange.objects.filter(item_url=item_url).exists():
@@ -330,16 +657,9 @@ def check_new_item(
     if save:
         t = AppTrackerChange(tracker_id=id, item_desc=title, item_url=item_url)
         t.save()
-        if "vespa" in search_key:
-            token = "SLACK_KEY_VESPA_ALERTS"
-        elif "lambretta" in search_key:
-            token = "SLACK_KEY_LAMBRETTA_ALERTS"
-        else:
-            token = "SLACK_KEY_ALERTS"
-
         send_slack_message(
-            f"New {name} item!",
+            f"New {tracker.name} item!",
             f"{title} just become available in {location} - {item_url}",
             "TestAppBot",
-            token,
+            tracker.alert_token,
         )
@@ -1,17 +1,292 @@
 # views.py
-from rest_framework import viewsets
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
 
-from .serializers import SiteSerializer, PageSerializer, PageChangeSerializer
-from .models import Site, Page, PageChange
+from .constants import API_CHANGES_LIMIT
+from .models import AppCategory, AppProduct, AppSite, AppTracker, AppTrackerChange
+from .utils.api_cache import (
+    CHANGES,
+    SITES,
+    TRACKERS,
+    cached_response,
+    tracker_key,
+    version_key,
+)
+from .utils.change_feed import serialize_change
+from .utils.metrics import render_metrics
+from .utils.prices import get_offers
+from .utils.timeseries import (
+    INTERVALS,
+    category_price_sources,
+    get_price_series,
+    product_price_sources,
+    tracker_price_sources,
+)
 
-class SiteViewSet(viewsets.ModelViewSet):
-    queryset = Site.objects.all().order_by('site_id')
-    serializer_class = SiteSerializer
 
-class PageViewSet(viewsets.ModelViewSet):
-    queryset = Page.objects.all().order_by('page_id')
-    serializer_class = PageSerializer
+def serialize_buckets(buckets):
+    return [
+        {
+            "tracker": b["tracker_id"],
+            "time": b["bucket"].isoformat(),
+            "open": b["open"],
+            "low": b["low"],
+            "high": b["high"],
+            "last": b["last"],
+            "changes": b["changes"],
+        }
+        for b in buckets
+    ]
 
-class PageChangeViewSet(viewsets.ModelViewSet):
-    queryset = PageChange.objects.all().order_by('created_at')
-    serializer_class = PageChangeSerializer
\ No newline at end of file
+
+def price_series_response(request, changes, rollups, **extra):
+    """Filter changes/rollups by the request params and return the bucketed series
+
+    Query params:
+        interval: hour, day or week (default day)
+        since/until: ISO datetimes bounding the series (whole days for
+            day/week intervals)
+        points: maximum number of buckets per tracker (LTTB downsampling)
+    """
+    interval = request.GET.get("interval", "day")
+    if interval not in INTERVALS:
+        return JsonResponse(
+            {"error": f"interval must be one of {', '.join(INTERVALS)}"}, status=400
+        )
+
+    try:
+        points = int(request.GET.get("points", 0))
+    except ValueError:
+        return JsonResponse({"error": "points must be an integer"}, status=400)
+
+    for param, op in (("since", "gte"), ("until", "lt")):
+        if param in request.GET:
+            value = parse_datetime(request.GET[param])
+            if value is None:
+                return JsonResponse(
+                    {"error": f"{param} must be an ISO datetime"}, status=400
+                )
+            changes = changes.filter(**{f"created_at__{op}": value})
+            rollups = rollups.filter(**{f"day__{op}": value.date()})
+
+    buckets = get_price_series(changes, rollups, interval, points)
+
+    return JsonResponse(
+        {**extra, "interval": interval, "buckets": serialize_buckets(buckets)}
+    )
+
+
+@require_GET
+def tracker_prices(request, tracker_id):
+    tracker = get_object_or_404(AppTracker, id=tracker_id)
+    return price_series_response(
+        request, *tracker_price_sources(tracker.id), tracker=tracker.id
+    )
+
+
+@require_GET
+def product_prices(request, product_id):
+    product = get_object_or_404(AppProduct, id=product_id)
+    return price_series_response(
+        request, *product_price_sources(product.id), product=product.id
+    )
+
+
+@require_GET
+def category_prices(request, category_id):
+    """Price series of every product in a category and its subcategories"""
+    category = get_object_or_404(AppCategory, id=category_id)
+    return price_series_response(
+        request, *category_price_sources(category.id), category=category.id
+    )
+
+
+def serialize_offer(offer):
+    return {
+        "tracker": offer.tracker_id,
+        "site": offer.site.name,
+        "location": offer.location.name if offer.location else None,
+        "price": offer.price,
+        "available": offer.available,
+        "updated_at": offer.updated_at.isoformat(),
+    }
+
+
+@require_GET
+def product_offers(request, product_id):
+    """Current offers of a product across sites/locations, cheapest first"""
+    product = get_object_or_404(AppProduct, id=product_id)
+    offers = [serialize_offer(o) for o in get_offers(product.id)]
+    best = next(
+        (o for o in offers if o["price"] is not None and o["available"] is not False),
+        None,
+    )
+    return JsonResponse({"product": product.id, "best": best, "offers": offers})
+
+
+def serialize_site(site):
+    return {
+        "id": site.id,
+        "name": site.name,
+        "url": site.url,
+        "country": site.country.code or None,
+        "description": site.description,
+    }
+
+
+def serialize_tracker(tracker):
+    return {
+        "id": tracker.id,
+        "name": tracker.name,
+        "type": tracker.t_type,
+        "method": tracker.method,
+        "site": {"id": tracker.site_id, "name": tracker.site.name},
+        "product": tracker.product_id,
+        "search_key": tracker.search_key,
+        "url": tracker.url,
+        "active": tracker.active,
+        "frequency": tracker.frequency,
+        "cron_schedule": tracker.cron_schedule,
+        "created_at": tracker.created_at.isoformat(),
+        "updated_at": tracker.updated_at.isoformat(),
+    }
+
+
+def int_params(request, name):
+    """Integer query params (a param can be repeated)
+
+    Raises:
+        ValueError: A value is not an integer
+    """
+    return [int(value) for value in request.GET.getlist(name)]
+
+
+@require_GET
+@cached_response(lambda request: [version_key(SITES)])
+def site_list(request):
+    return JsonResponse(
+        {"sites": [serialize_site(s) for s in AppSite.objects.order_by("id")]}
+    )
+
+
+@require_GET
+@cached_response(lambda request, site_id: [version_key(SITES)])
+def site_detail(request, site_id):
+    return JsonResponse(serialize_site(get_object_or_404(AppSite, id=site_id)))
+
+
+@require_GET
+@cached_response(lambda request: [version_key(TRACKERS), version_key(SITES)])
+def tracker_list(request):
+    """Trackers, optionally filtered
+
+    Query params:
+        site: site id (can be repeated)
+        type: tracker type
+        active: 1 or 0
+    """
+    trackers = AppTracker.objects.select_related("site").order_by("id")
+    try:
+        if "site" in request.GET:
+            trackers = trackers.filter(site_id__in=int_params(request, "site"))
+    except ValueError:
+        return JsonResponse({"error": "site must be an integer"}, status=400)
+    if "type" in request.GET:
+        trackers = trackers.filter(t_type=request.GET["type"])
+    if "active" in request.GET:
+        trackers = trackers.filter(active=request.GET["active"] == "1")
+    return JsonResponse({"trackers": [serialize_tracker(t) for t in trackers]})
+
+
+@require_GET
+@cached_response(
+    lambda request, tracker_id: [tracker_key(tracker_id), version_key(SITES)]
+)
+def tracker_detail(request, tracker_id):
+    trackers = AppTracker.objects.select_related("site")
+    tracker = get_object_or_404(trackers, id=tracker_id)
+    return JsonResponse(serialize_tracker(tracker))
+
+
+def get_change_keys(request, tracker_id=None):
+    # Changes of given trackers only depend on their versions
+    try:
+        tracker_ids = [tracker_id] if tracker_id else int_params(request, "tracker")
+    except ValueError:
+        tracker_ids = []
+    if tracker_ids and "site" not in request.GET:
+        return [tracker_key(id) for id in sorted(set(tracker_ids))]
+    return [version_key(CHANGES)]
+
+
+def changes_response(request, changes, **extra):
+    """Latest changes, newest first (oldest first after a since_id)
+
+    Query params:
+        since_id: only the changes after this change id, oldest first so the
+            last one is the next cursor (polling)
+        limit: maximum number of changes, 1 to API_CHANGES_LIMIT (default)
+    """
+    try:
+        limit = min(int(request.GET.get("limit", API_CHANGES_LIMIT)), API_CHANGES_LIMIT)
+        if "since_id" in request.GET:
+            changes = changes.filter(id__gt=int(request.GET["since_id"]))
+    except ValueError:
+        return JsonResponse(
+            {"error": "since_id and limit must be integers"}, status=400
+        )
+    if limit < 1:
+        return JsonResponse(
+            {"error": f"limit must be between 1 and {API_CHANGES_LIMIT}"}, status=400
+        )
+
+    # Newest first would skip the older ones when more than limit are new
+    order = "id" if "since_id" in request.GET else "-id"
+    changes = changes.defer("changed_content", "changes").order_by(order)[:limit]
+    return JsonResponse({**extra, "changes": [serialize_change(c) for c in changes]})
+
+
+@require_GET
+@cached_response(get_change_keys)
+def change_list(request):
+    """Latest changes of every tracker, see changes_response
+
+    Query params:
+        tracker: tracker id (can be repeated)
+        site: site id (can be repeated)
+    """
+    changes = AppTrackerChange.objects.all()
+    try:
+        if "tracker" in request.GET:
+            changes = changes.filter(tracker_id__in=int_params(request, "tracker"))
+        if "site" in request.GET:
+            changes = changes.filter(tracker__site_id__in=int_params(request, "site"))
+    except ValueError:
+        return JsonResponse({"error": "tracker and site must be integers"}, status=400)
+    return changes_response(request, changes)
+
+
+@require_GET
+@cached_response(get_change_keys)
+def tracker_changes(request, tracker_id):
+    tracker = get_object_or_404(AppTracker, id=tracker_id)
+    return changes_response(
+        request, AppTrackerChange.objects.filter(tracker=tracker), tracker=tracker.id
+    )
+
+
+@require_GET
+def metrics(request):
+    """Cluster metrics in the Prometheus text format
+
+    Requires "Authorization: Bearer <METRICS_TOKEN>" when METRICS_TOKEN is set.
+    """
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse(status=401)
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shoptrio_be.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Needs the apps loaded by get_asgi_application
+from app.stream import CHANGE_STREAM_PATH, change_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # The change feed streams stay open, they are served without Django
+    if scope["type"] == "http" and scope["path"] == CHANGE_STREAM_PATH:
+        return await change_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -149,11 +149,81 @@ CACHES = {
     }
 }
 
-Q_CLUSTER = {
-    "name": "Shoptrio_beRedis",
-    "workers": 4,
-    "timeout": 600,
-    "retry": 660,
-    "django_redis": "default",
-    "catch_up": False,
+# One django-q cluster (queue + worker pool) per tracker weight, so browser
+# trackers never hold up the cheap xpath ones. create_task routes each
+# tracker's schedule to a cluster by method (see TRACKER_CLUSTERS); start one
+# qcluster per pool with Q_CLUSTER_POOL=light|browser python manage.py qcluster
+Q_CLUSTERS = {
+    "light": {
+        "name": "Shoptrio_beRedis",
+        "workers": 8,
+        "timeout": 120,
+        "retry": 180,
+        "max_rss": 250000,
+        "django_redis": "default",
+        "catch_up": False,
+    },
+    "browser": {
+        "name": "Shoptrio_beBrowser",
+        "workers": 2,
+        "timeout": 600,
+        "retry": 660,
+        "recycle": 50,
+        "max_rss": 1500000,
+        "django_redis": "default",
+        "catch_up": False,
+    },
+}
+
+Q_CLUSTER = Q_CLUSTERS[os.getenv("Q_CLUSTER_POOL", "light")]
+
+# Tracker method -> Q_CLUSTERS pool. "auto" trackers go to the pool of the
+# method they last needed, and move when it changes (set_auto_method)
+TRACKER_CLUSTERS = {
+    "xpath": "light",
+    "selenium": "browser",
 }
+
+# "django_q" runs every tracker as a django-q scheduled task, "scheduler" runs
+# xpath trackers with the in-process scheduler (manage.py run_trackers --schedule)
+TRACKER_ENGINE = os.getenv("TRACKER_ENGINE", "django_q")
+
+# Skip a tracker run when more than this many tasks are queued and the same
+# tracker completed less than TRACKER_MIN_RUN_INTERVAL seconds ago (0 = off)
+TRACKER_BACKLOG_THRESHOLD = int(os.getenv("TRACKER_BACKLOG_THRESHOLD", 100))
+TRACKER_MIN_RUN_INTERVAL = int(os.getenv("TRACKER_MIN_RUN_INTERVAL", 30))
+
+# Per-site circuit breaker: open after this many consecutive fetch failures,
+# skip the site for the cooldown (doubling after each failed probe)
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_COOLDOWN = int(os.getenv("BREAKER_COOLDOWN", 60))
+BREAKER_MAX_COOLDOWN = int(os.getenv("BREAKER_MAX_COOLDOWN", 3600))
+
+# Per-tracker exponential backoff after failed runs (seconds)
+TRACKER_BACKOFF_BASE = int(os.getenv("TRACKER_BACKOFF_BASE", 60))
+TRACKER_BACKOFF_MAX = int(os.getenv("TRACKER_BACKOFF_MAX", 3600))
+
+# Page and feed fetches: "live", "record" (live, also saving every response to
+# FETCH_ARCHIVE_DIR) or "replay" (served from FETCH_ARCHIVE_DIR, no network)
+FETCH_MODE = os.getenv("FETCH_MODE", "live")
+FETCH_ARCHIVE_DIR = os.getenv(
+    "FETCH_ARCHIVE_DIR", os.path.join(BASE_DIR, "fetch_archive")
+)
+# Replays return at once ("fast") or take the recorded time ("recorded")
+FETCH_REPLAY_TIMING = os.getenv("FETCH_REPLAY_TIMING", "fast")
+
+# Profile this fraction of the tracker runs (0 to 1), plus the next runs of
+# the trackers picked in the admin. "sampler" samples the stack every
+# PROFILE_SAMPLE_INTERVAL seconds, "cprofile" traces every call (slower)
+PROFILER = os.getenv("PROFILER", "sampler")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+# Profiles kept per tracker
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 20))
+
+# Currency of the tracked prices: structured data offers in another one are
+# ignored (a tracker's "currency" param overrides it)
+PRICE_CURRENCY = os.getenv("PRICE_CURRENCY", "AUD")
+
+# Bearer token required by /metrics (unset: open, e.g. behind the firewall)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
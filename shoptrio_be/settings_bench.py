@@ -0,0 +1,47 @@
+"""Settings of the offline tracker benchmark
+
+    python manage.py benchmark_trackers --settings=shoptrio_be.settings_bench
+
+Only a local Redis is needed: the benchmark creates (and drops) its own
+database and never reaches the tracked sites or Slack.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+BENCHMARK = True
+
+# SQLite by default, BENCH_DB_NAME to benchmark on a local PostgreSQL
+if os.getenv("BENCH_DB_NAME"):
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("BENCH_DB_NAME"),
+            "USER": os.getenv("DB_USER"),
+            "PASSWORD": os.getenv("DB_PWD"),
+            "HOST": os.getenv("BENCH_DB_HOST", "localhost"),
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(BASE_DIR, "benchmark.sqlite3"),
+            # A file, the runs use several threads (SQLite serialises the
+            # writes, use PostgreSQL to benchmark several workers)
+            "TEST": {"NAME": os.path.join(BASE_DIR, "test_benchmark.sqlite3")},
+        }
+    }
+
+# The app tables are created from the models (see app.benchmark.suite)
+MIGRATION_MODULES = {"app": None}
+
+# Own Redis database, cleared before each benchmark
+CACHES["default"]["LOCATION"] = os.getenv(
+    "BENCH_REDIS_URL", "redis://127.0.0.1:6379/15"
+)
+
+# Every run is measured: none is skipped as a queued duplicate, by an open
+# circuit breaker or while backing off after an error
+TRACKER_BACKLOG_THRESHOLD = 0
+BREAKER_FAILURE_THRESHOLD = 10 ** 9
+TRACKER_BACKOFF_BASE = 0
@@ -0,0 +1,25 @@
+"""Settings of the test suite
+
+    python manage.py test app --settings=shoptrio_be.settings_test
+
+Only a local Redis is needed (TEST_REDIS_URL): the tests run on a
+throwaway SQLite database and never reach the tracked sites or Slack.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+SECRET_KEY = SECRET_KEY or "test"
+
+DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
+
+# The app tables are created from the models (see app.tests.runner)
+MIGRATION_MODULES = {"app": None}
+TEST_RUNNER = "app.tests.runner.TestRunner"
+
+# Own Redis database, flushed by the tests that use it
+CACHES["default"]["LOCATION"] = os.getenv(
+    "TEST_REDIS_URL", "redis://127.0.0.1:6379/14"
+)
+
+# Tasks run in the calling process
+Q_CLUSTER = {**Q_CLUSTER, "sync": True}